@@ -0,0 +1,369 @@
+"""Latency, throughput and memory of every dataset and algorithm endpoint, with baselines to catch regressions
+
+The whole FastAPI app runs in-process against a local mongod or a mongomock stand-in seeded with synthetic fixtures.
+Endpoints whose optional frameworks (NLTK stopwords, XGBoost, MiniSom, Keras, PyTorch) are missing are skipped.
+Exits with code 1 when a route does not record exactly one "endpoint" span per request.
+
+>>> Launch from CL: python fastapi-server/benchmarks/endpoints.py --mongomock [--requests 20] [--only regression]
+>>> Store a baseline: python fastapi-server/benchmarks/endpoints.py --mongomock --save-baseline local
+>>> Compare with it: python fastapi-server/benchmarks/endpoints.py --mongomock --compare local [--threshold 0.25]
+"""
+
+import argparse
+import functools
+import importlib.util
+import json
+import os
+import platform
+import re
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from common import database, models, neighbors, snapshot, telemetry
+
+import fixtures
+
+BASELINES_DIR : str = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+ML : str = '/machine-learning'
+DL : str = '/deep-learning'
+
+# ? (name, HTTP method, path, requirements) in execution order: "check-sentence" needs the NLP models, "/frauds" the SOM
+ENDPOINTS : list =\
+[
+    ('regression/info', 'GET', f'{ML}/regression/info', []),
+    ('regression/dataset', 'GET', f'{ML}/regression/dataset?column=1', []),
+    ('regression/linear-regression', 'GET', f'{ML}/regression/linear-regression?column=1', []),
+    ('regression/polynomial-regression', 'GET', f'{ML}/regression/polynomial-regression?column=1&degree=4', []),
+    ('regression/support-vector-regression', 'GET', f'{ML}/regression/support-vector-regression?column=1', []),
+    ('regression/decision-tree-regression', 'GET', f'{ML}/regression/decision-tree-regression?column=1', []),
+    ('regression/random-forest-regression', 'GET', f'{ML}/regression/random-forest-regression?column=1&estimators=10', []),
+    ('regression/polynomial-regression/sweep', 'GET', f'{ML}/regression/polynomial-regression/sweep?column=1&max_degree=10', []),
+    ('regression/leaderboard', 'GET', f'{ML}/regression/leaderboard?column=1&degree=4&estimators=10', []),
+    ('regression/overview', 'GET', f'{ML}/regression/overview?degree=4', []),
+    ('regression/forecast', 'GET', f'{ML}/regression/forecast?column=1&regressor=polynomial-regression&degree=4&' + '&'.join(f'years={year}' for year in range(2025, 2125)), []),
+    ('classification/dataset', 'GET', f'{ML}/classification/dataset?method=2', []),
+    ('classification/logistic-regression', 'GET', f'{ML}/classification/logistic-regression?method=2', []),
+    ('classification/k-nearest-neighbors', 'GET', f'{ML}/classification/k-nearest-neighbors?method=2&neighbors=5', []),
+    ('classification/support-vector-classification', 'GET', f'{ML}/classification/support-vector-classification?method=2&kernel=3', []),
+    ('classification/naive-bayes', 'GET', f'{ML}/classification/naive-bayes?method=2', []),
+    ('classification/decision-tree-classification', 'GET', f'{ML}/classification/decision-tree-classification?method=2', []),
+    ('classification/random-forest-classification', 'GET', f'{ML}/classification/random-forest-classification?method=2&estimators=10', []),
+    ('clustering/dataset', 'GET', f'{ML}/clustering/dataset', []),
+    ('clustering/k-means-clustering', 'GET', f'{ML}/clustering/k-means-clustering?clusters=3', []),
+    ('clustering/hierarchical-clustering', 'GET', f'{ML}/clustering/hierarchical-clustering?clusters=3', []),
+    ('association-rule-learning/dataset', 'GET', f'{ML}/association-rule-learning/dataset', []),
+    ('association-rule-learning/apriori-rules', 'GET', f'{ML}/association-rule-learning/apriori-rules?largest=5', []),
+    ('association-rule-learning/eclat-rules', 'GET', f'{ML}/association-rule-learning/eclat-rules?largest=5', []),
+    ('reinforcement-learning/dataset', 'GET', f'{ML}/reinforcement-learning/dataset', []),
+    ('reinforcement-learning/upper-confidence-bound', 'GET', f'{ML}/reinforcement-learning/upper-confidence-bound', []),
+    ('reinforcement-learning/thompson-sampling', 'GET', f'{ML}/reinforcement-learning/thompson-sampling', []),
+    ('natural-language-processing/dataset', 'GET', f'{ML}/natural-language-processing/dataset', [ 'stopwords' ]),
+    ('natural-language-processing/logistic-regression', 'GET', f'{ML}/natural-language-processing/logistic-regression', [ 'stopwords' ]),
+    ('natural-language-processing/k-nearest-neighbors', 'GET', f'{ML}/natural-language-processing/k-nearest-neighbors', [ 'stopwords' ]),
+    ('natural-language-processing/support-vector-classification', 'GET', f'{ML}/natural-language-processing/support-vector-classification', [ 'stopwords' ]),
+    ('natural-language-processing/naive-bayes', 'GET', f'{ML}/natural-language-processing/naive-bayes', [ 'stopwords' ]),
+    ('natural-language-processing/decision-tree-classification', 'GET', f'{ML}/natural-language-processing/decision-tree-classification', [ 'stopwords' ]),
+    ('natural-language-processing/random-forest-classification', 'GET', f'{ML}/natural-language-processing/random-forest-classification', [ 'stopwords' ]),
+    ('natural-language-processing/x-g-boost-classification', 'GET', f'{ML}/natural-language-processing/x-g-boost-classification', [ 'stopwords', 'xgboost' ]),
+    ('natural-language-processing/check-sentence', 'PUT', f'{ML}/natural-language-processing/check-sentence/I love this day', [ 'stopwords', 'xgboost' ]),
+    ('self-organizing-map/dataset', 'GET', f'{DL}/self-organizing-map/dataset', []),
+    ('self-organizing-map/model', 'GET', f'{DL}/self-organizing-map/model', [ 'minisom', 'matplotlib' ]),
+    ('self-organizing-map/frauds', 'GET', f'{DL}/self-organizing-map/frauds?level=50', [ 'minisom', 'matplotlib' ]),
+    ('self-organizing-map/neural-network', 'GET', f'{DL}/self-organizing-map/neural-network', [ 'minisom', 'matplotlib', 'keras' ]),
+    ('restricted-boltzmann-machine/dataset', 'GET', f'{DL}/restricted-boltzmann-machine/dataset', [ 'torch' ]),
+    ('restricted-boltzmann-machine/metrics', 'GET', f'{DL}/restricted-boltzmann-machine/metrics', [ 'torch' ]),
+    ('stacked-autoencoder/dataset', 'GET', f'{DL}/stacked-autoencoder/dataset', [ 'torch' ]),
+    ('stacked-autoencoder/metrics', 'GET', f'{DL}/stacked-autoencoder/metrics', [ 'torch' ])
+]
+
+# --- Utility
+
+@functools.cache
+def available(requirement : str) -> bool:
+    """Check if an optional requirement is installed
+
+    Args:
+        requirement (str): Package name, or "stopwords" for the NLTK corpus
+
+    Returns:
+        bool: True if usable
+    """
+
+    if requirement != 'stopwords': return importlib.util.find_spec(requirement) is not None
+
+    if importlib.util.find_spec('nltk') is None: return False
+
+    try:
+
+        from nltk.corpus import stopwords
+
+        stopwords.words('english')
+
+        return True
+
+    except LookupError:
+
+        return False
+
+def rss_mb() -> float:
+    """Current resident memory of this process (Linux only, 0 elsewhere)"""
+
+    try:
+
+        with open('/proc/self/status', 'r') as file:
+
+            for line in file:
+
+                if line.startswith('VmRSS:'): return int(line.split()[1]) / 1024.0
+
+    except OSError:
+
+        pass
+
+    return 0.0
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process"""
+
+    peak : int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0
+
+def prepare_deep_learning(directory : str) -> None:
+    """Redirect the SOM image and the RBM/SAE models to a temporary folder and train one small model of each
+
+    "/metrics" only evaluates saved models, so there must be at least one.
+
+    Args:
+        directory (str): Temporary folder
+    """
+
+    from routers.deep_learning import self_organizing_map
+
+    self_organizing_map.IMG_DIR_DIR = directory
+
+    if not available('torch'): return
+
+    from routers.deep_learning import restricted_boltzmann_machine, stacked_autoencoder
+
+    for module, params in ((restricted_boltzmann_machine, dict(batch_size=50, epochs=1)), (stacked_autoencoder, dict(epochs=1))):
+
+        module.MODELS_DIR = os.path.join(directory, module.__name__.split('.')[-1])
+
+        module.train_model(**params)
+
+def measure(client, method : str, path : str, requests : int, warmup : int) -> dict:
+    """Time one endpoint
+
+    Args:
+        client (TestClient): Client of the app
+        method (str): HTTP method
+        path (str): Path and query
+        requests (int): Timed requests
+        warmup (int): Untimed requests after the first (cold) one
+
+    Returns:
+        dict: Cold latency, percentiles and mean (ms), throughput (requests/s) and memory (MB)
+    """
+
+    start : float = time.perf_counter()
+
+    response = client.request(method, path)
+
+    cold : float = (time.perf_counter() - start) * 1000.0
+
+    if response.status_code >= 400: return { 'status': response.status_code, 'error': response.text[:300] }
+
+    for _ in range(warmup): client.request(method, path)
+
+    timings : list = []
+
+    for _ in range(requests):
+
+        start = time.perf_counter()
+
+        client.request(method, path)
+
+        timings.append((time.perf_counter() - start) * 1000.0)
+
+    return\
+    {
+        'status': response.status_code,
+        'cold_ms': round(cold, 3),
+        'p50_ms': round(float(np.percentile(timings, 50)), 3),
+        'p95_ms': round(float(np.percentile(timings, 95)), 3),
+        'p99_ms': round(float(np.percentile(timings, 99)), 3),
+        'mean_ms': round(float(np.mean(timings)), 3),
+        'throughput_rps': round(len(timings) / (sum(timings) / 1000.0), 2),
+        'response_kb': round(len(response.content) / 1024.0, 1),
+        'rss_mb': round(rss_mb(), 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1)
+    }
+
+def compare(report : dict, baseline : dict, threshold : float) -> list:
+    """Find the endpoints slower than the baseline
+
+    Args:
+        report (dict): Current report
+        baseline (dict): Baseline report
+        threshold (float): Allowed relative increase (e.g. 0.25 = +25 %)
+
+    Returns:
+        list: Regressions { endpoint, metric, baseline, current, ratio }
+    """
+
+    regressions : list = []
+
+    for name, current in report['endpoints'].items():
+
+        previous : dict = baseline['endpoints'].get(name, {})
+
+        for metric in ('p50_ms', 'p95_ms', 'peak_rss_mb'):
+
+            if metric not in current or not previous.get(metric): continue
+
+            ratio : float = current[metric] / previous[metric]
+
+            if ratio > 1.0 + threshold: regressions.append({ 'endpoint': name, 'metric': metric, 'baseline': previous[metric], 'current': current[metric], 'ratio': round(ratio, 2) })
+
+    return regressions
+
+def span_mismatches() -> list:
+    """Find the routes whose "endpoint" span was not recorded exactly once per request (e.g. an endpoint wrapped twice)
+
+    Returns:
+        list: Mismatches { route, requests, endpoint_spans }
+    """
+
+    requests : dict = dict()
+
+    for key, count in telemetry.request_seconds.counts().items():
+
+        route : str = dict(key)['route']
+
+        requests[route] = requests.get(route, 0) + count
+
+    spans : dict = { dict(key)['route']: count for key, count in telemetry.stage_seconds.counts().items() if dict(key)['stage'] == telemetry.Stage.Endpoint }
+
+    return [ { 'route': route, 'requests': count, 'endpoint_spans': spans.get(route, 0) } for route, count in sorted(requests.items()) if spans.get(route, 0) != count ]
+
+# --- Main
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument('--mongomock', action='store_true', help='Use an in-process mongomock stand-in instead of the mongod of MONGO_URI')
+    parser.add_argument('--seed', action='store_true', help='Seed the empty collections of the mongod with the fixtures (always done with --mongomock)')
+    parser.add_argument('--scale', type=int, default=1, help='Fixture size multiplier')
+    parser.add_argument('--requests', type=int, default=20, help='Timed requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=1, help='Untimed requests per endpoint after the cold one')
+    parser.add_argument('--only', type=str, default='', help='Regular expression selecting the endpoints by name')
+    parser.add_argument('--output', type=str, default='', help='Write the JSON report to this file instead of stdout')
+    parser.add_argument('--save-baseline', type=str, default='', help='Store the report as baselines/<name>.json')
+    parser.add_argument('--compare', type=str, default='', help='Compare with baselines/<name>.json and exit with code 1 on regressions')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed relative slowdown before flagging a regression')
+
+    args = parser.parse_args()
+
+    if args.mongomock:
+
+        import mongomock
+
+        database.pymongo.MongoClient = functools.partial(mongomock.MongoClient, _store=mongomock.store.ServerStore()) # ? Clients share the same in-memory data
+
+    if args.mongomock or args.seed: print(f'Seeded: {fixtures.seed(database.get_database(), scale=args.scale)}', file=sys.stderr)
+
+    workspace : tempfile.TemporaryDirectory = tempfile.TemporaryDirectory(prefix='learningai-benchmark-')
+
+    snapshot.SNAPSHOT_DIR = os.path.join(workspace.name, 'cache') # ? Start from cold snapshots, never touch the server cache
+
+    models.registry.directory       = os.path.join(workspace.name, 'models') # ? Cold fitted models too, never touch the server models
+    neighbors.registry.directory    = snapshot.SNAPSHOT_DIR
+
+    from fastapi.testclient import TestClient
+
+    import main
+
+    prepare_deep_learning(workspace.name)
+
+    report : dict =\
+    {
+        'meta':
+        {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'mongo': 'mongomock' if args.mongomock else database.MONGO_URI,
+            'scale': args.scale,
+            'requests': args.requests,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')
+        },
+        'endpoints': {}
+    }
+
+    with TestClient(main.app) as client:
+
+        for name, method, path, requirements in ENDPOINTS:
+
+            if args.only and not re.search(args.only, name): continue
+
+            missing : list = [ requirement for requirement in requirements if not available(requirement) ]
+
+            if missing:
+
+                report['endpoints'][name] = { 'skipped': f'missing {", ".join(missing)}' }
+
+                continue
+
+            report['endpoints'][name] = result = measure(client, method, path, args.requests, args.warmup)
+
+            summary : str = f'p50 {result["p50_ms"]:9.2f} ms  p95 {result["p95_ms"]:9.2f} ms  p99 {result["p99_ms"]:9.2f} ms  {result["throughput_rps"]:8.1f} req/s' if 'p50_ms' in result else f'HTTP {result["status"]}'
+
+            print(f'{name:<58} {summary}', file=sys.stderr)
+
+    report['peak_rss_mb'] = round(peak_rss_mb(), 1)
+
+    report['span_mismatches'] = mismatches = span_mismatches()
+
+    for mismatch in mismatches: print(f'SPAN MISMATCH {mismatch["route"]}: {mismatch["requests"]} requests, {mismatch["endpoint_spans"]} endpoint spans', file=sys.stderr)
+
+    workspace.cleanup()
+
+    database.close_client()
+
+    # * Output
+
+    output : str = json.dumps(report, indent=4)
+
+    if args.output:
+
+        with open(args.output, 'w') as file: file.write(output)
+
+    else:
+
+        print(output)
+
+    if args.save_baseline:
+
+        os.makedirs(BASELINES_DIR, exist_ok=True)
+
+        with open(os.path.join(BASELINES_DIR, f'{args.save_baseline}.json'), 'w') as file: file.write(output)
+
+    if args.compare:
+
+        with open(os.path.join(BASELINES_DIR, f'{args.compare}.json'), 'r') as file: baseline : dict = json.load(file)
+
+        regressions : list = compare(report, baseline, args.threshold)
+
+        for regression in regressions: print(f'REGRESSION {regression["endpoint"]} {regression["metric"]}: {regression["baseline"]} -> {regression["current"]} (x{regression["ratio"]})', file=sys.stderr)
+
+        if regressions: sys.exit(1)
+
+    if mismatches: sys.exit(1)
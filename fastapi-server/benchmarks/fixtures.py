@@ -0,0 +1,187 @@
+"""Synthetic documents for every "LearningAI" collection, shaped like the real datasets used by the routers
+
+>>> Used by the benchmarks: fixtures.seed(database.get_database(), scale=1)
+"""
+
+import datetime as dt
+import numpy as np
+
+from common.database import CollectionName
+
+WORDS : dict =\
+{
+    'positive': [ 'love', 'great', 'happy', 'awesome', 'good', 'nice', 'enjoy', 'best', 'fun', 'wonderful' ],
+    'negative': [ 'hate', 'bad', 'sad', 'awful', 'worst', 'angry', 'boring', 'terrible', 'not', 'poor' ],
+    'neutral': [ 'today', 'work', 'home', 'going', 'time', 'day', 'week', 'call', 'read', 'watch' ]
+}
+
+BASKETS : list =\
+[
+    [ 'mineral water', 'eggs', 'spaghetti' ], [ 'burgers', 'meatballs', 'eggs' ], [ 'chutney' ], [ 'turkey', 'avocado' ],
+    [ 'mineral water', 'milk', 'energy bar', 'whole wheat rice', 'green tea' ], [ 'low fat yogurt' ], [ 'whole wheat pasta', 'french fries' ],
+    [ 'soup', 'light cream', 'shallot' ], [ 'frozen vegetables', 'spaghetti', 'green tea' ], [ 'french fries', 'eggs' ]
+]
+
+# --- Utility
+
+def carbon_emissions(rng : np.random.Generator, scale : int) -> list:
+
+    documents : list = []
+
+    for column in range(1, 4 * scale + 1):
+
+        trend : float = rng.uniform(50.0, 500.0)
+
+        for year in range(1973, 2024):
+
+            for month in list(range(1, 13)) + [ 13 ]: # ? Month 13 = annual total
+
+                value : float = trend + (year - 1973) * rng.uniform(-2.0, 4.0) + rng.normal(0.0, 5.0)
+
+                documents.append({ 'MSN': f'CO2{column:02d}', 'YYYYMM': f'{year}{month:02d}', 'Value': float(value), 'Column_Order': column, 'Description': f'Carbon Dioxide Emissions {column}', 'Unit': 'Million Metric Tons of Carbon Dioxide' })
+
+    return documents
+
+def credit_card_applications(rng : np.random.Generator, scale : int) -> list:
+
+    documents : list = []
+
+    for index in range(690 * scale):
+
+        document : dict = { 'CustomerID': 15_000_000 + index }
+
+        for feature in range(1, 15): document[f'A{feature}'] = float(rng.integers(0, 2)) if feature in (1, 8, 9, 11, 12) else float(rng.uniform(0.0, 100.0))
+
+        document['Class'] = int(rng.integers(0, 2))
+
+        documents.append(document)
+
+    return documents
+
+def market_basket_optimisation(rng : np.random.Generator, scale : int) -> list:
+
+    documents : list = []
+
+    for _ in range(1500 * scale):
+
+        basket : list = BASKETS[rng.integers(0, len(BASKETS))]
+
+        documents.append({ f'Item{index}': (basket[index - 1] if index <= len(basket) else None) for index in range(1, 21) })
+
+    return documents
+
+def movies(rng : np.random.Generator, scale : int, users : int, movies : int) -> tuple:
+
+    training : list = []
+    test : list = []
+
+    for user in range(1, users * scale + 1):
+
+        for movie in rng.choice(np.arange(1, movies + 1), size=30, replace=False):
+
+            document : dict = { 'User': int(user), 'Movie': int(movie), 'Rating': int(rng.integers(1, 6)), 'Timestamp': int(rng.integers(874_724_710, 893_286_638)) }
+
+            (test if rng.random() < 0.2 else training).append(document)
+
+    return training, test
+
+def nflx(rng : np.random.Generator, scale : int) -> list:
+
+    documents : list = []
+
+    price : float = 300.0
+
+    day : dt.datetime = dt.datetime(2023, 1, 1) - dt.timedelta(days=1000 * scale)
+
+    while day < dt.datetime(2023, 3, 1):
+
+        if day.weekday() < 5:
+
+            price = max(10.0, price + rng.normal(0.0, 5.0))
+
+            documents.append({ 'Date': day, 'Open': price, 'High': price * 1.02, 'Low': price * 0.98, 'Close': price + rng.normal(0.0, 2.0), 'Adj Close': price, 'Volume': int(rng.integers(1_000_000, 10_000_000)) })
+
+        day += dt.timedelta(days=1)
+
+    return documents
+
+def penguins(rng : np.random.Generator, scale : int) -> list:
+
+    return [ { 'culmen_length_mm': float(rng.uniform(32.0, 60.0)), 'culmen_depth_mm': float(rng.uniform(13.0, 22.0)), 'flipper_length_mm': float(rng.integers(170, 232)), 'body_mass_g': float(rng.integers(2700, 6300)), 'sex': str(rng.choice([ 'MALE', 'FEMALE' ])) } for _ in range(340 * scale) ]
+
+def retailers(rng : np.random.Generator, scale : int) -> list:
+
+    rates : np.ndarray = rng.uniform(0.05, 0.3, size=10)
+
+    return [ { f'Retailer{index + 1:02d}': int(rng.random() < rate) for index, rate in enumerate(rates) } for _ in range(10_000 * scale) ]
+
+def sentiment_analysis(rng : np.random.Generator, scale : int) -> list:
+
+    documents : list = []
+
+    for _ in range(1000 * scale):
+
+        sentiment : str = str(rng.choice(list(WORDS)))
+
+        words : list = list(rng.choice(WORDS[sentiment], size=6)) + list(rng.choice(WORDS['neutral'], size=3))
+
+        documents.append({ 'Year': 2023, 'Month': int(rng.integers(1, 13)), 'Day': int(rng.integers(1, 29)), 'Time of Tweet': str(rng.choice([ 'morning', 'noon', 'night' ])),
+                           'text': ' '.join(rng.permutation(words)), 'sentiment': sentiment, 'Platform': str(rng.choice([ 'Twitter', 'Facebook', 'Instagram' ])) })
+
+    return documents
+
+def songs(rng : np.random.Generator, scale : int) -> list:
+
+    return [ { 'duration_ms': int(rng.integers(90_000, 400_000)), 'danceability': float(rng.random()), 'energy': float(rng.random()), 'loudness': float(rng.uniform(-30.0, 0.0)),
+               'speechiness': float(rng.random()), 'acousticness': float(rng.random()), 'tempo': float(rng.uniform(60.0, 200.0)), 'genre': str(rng.choice([ 'pop', 'rock', 'jazz', 'rap', 'edm' ])),
+               'popularity': int(rng.integers(0, 100)) } for _ in range(1000 * scale) ]
+
+def titanic(rng : np.random.Generator, scale : int) -> list:
+
+    return [ { 'Passengerid': index + 1, 'Age': float(rng.integers(1, 80)), 'Fare': float(rng.uniform(5.0, 250.0)), 'Sex': int(rng.integers(0, 2)), 'Sibsp': int(rng.integers(0, 4)),
+               'Parch': int(rng.integers(0, 3)), 'Pclass': int(rng.integers(1, 4)), 'Embarked': int(rng.integers(0, 3)), 'Survived': int(rng.integers(0, 2)) } for index in range(1300 * scale) ]
+
+def seed(database, scale : int = 1, random_state : int = 0) -> dict:
+    """Insert the synthetic documents in every empty collection (existing data is never touched)
+
+    Args:
+        database (Database): MongoDB database
+        scale (int, optional): Size multiplier. Defaults to 1.
+        random_state (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        dict: Number of inserted documents per collection
+    """
+
+    rng : np.random.Generator = np.random.default_rng(random_state)
+
+    movies_training, movies_test = movies(rng, scale, users=200, movies=300)
+
+    collections : dict =\
+    {
+        CollectionName.CarbonEmissions: carbon_emissions(rng, scale),
+        CollectionName.CreditCardApplications: credit_card_applications(rng, scale),
+        CollectionName.MarketBasketOptimisation: market_basket_optimisation(rng, scale),
+        CollectionName.MoviesTest: movies_test,
+        CollectionName.MoviesTraining: movies_training,
+        CollectionName.Nflx: nflx(rng, scale),
+        CollectionName.Penguins: penguins(rng, scale),
+        CollectionName.Retailers: retailers(rng, scale),
+        CollectionName.SentimentAnalysis: sentiment_analysis(rng, scale),
+        CollectionName.Songs: songs(rng, scale),
+        CollectionName.Titanic: titanic(rng, scale)
+    }
+
+    inserted : dict = dict()
+
+    for name, documents in collections.items():
+
+        collection = database.get_collection(str(name))
+
+        if collection.estimated_document_count() > 0: continue
+
+        collection.insert_many(documents)
+
+        inserted[str(name)] = len(documents)
+
+    return inserted
@@ -0,0 +1,118 @@
+"""Fit time and peak memory of the exact RBF kernel PCA versus the Nystroem approximation on scaled-up Titanic-like data
+
+>>> Launch from CL: python fastapi-server/benchmarks/kernel_pca.py [--sizes 712 2848 5696 11392 45568] [--budgets 16 64] [--exact-max 6000]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from common import kernels
+from sklearn.decomposition import KernelPCA
+from sklearn.preprocessing import StandardScaler
+
+# --- Utility
+
+def passengers(rng : np.random.Generator, size : int) -> np.ndarray:
+    """Synthetic passengers encoded as the classification dataset (one-hot categories, then Age and Fare), scaled
+
+    Args:
+        rng (np.random.Generator): Random generator
+        size (int): Number of rows
+
+    Returns:
+        np.ndarray: size x 22 scaled features
+    """
+
+    categories : list = [ rng.integers(0, 2, size), rng.integers(0, 7, size), rng.integers(0, 7, size), rng.integers(1, 4, size), rng.integers(0, 3, size) ]
+
+    onehot : list = [ (values[:, None] == np.unique(values)[None, :]).astype('float64') for values in categories ]
+
+    age     : np.ndarray = np.clip(rng.normal(30.0, 14.0, size), 0.0, 80.0).round()
+    fare    : np.ndarray = rng.lognormal(2.9, 1.0, size)
+
+    return StandardScaler().fit_transform(np.column_stack([ *onehot, age, fare ]))
+
+def measure(factory, X : np.ndarray) -> dict:
+    """Fit and transform once, tracking the Python heap (NumPy buffers included)
+
+    Args:
+        factory (Callable[[], Any]): Function returning the unfitted transformer
+        X (np.ndarray): Training inputs
+
+    Returns:
+        dict: { fit_ms, peak_mb, values }
+    """
+
+    tracemalloc.start()
+
+    start : float = time.perf_counter()
+
+    values : np.ndarray = factory().fit_transform(X)
+
+    fit_time : float = time.perf_counter() - start
+
+    _, peak = tracemalloc.get_traced_memory()
+
+    tracemalloc.stop()
+
+    return { 'fit_ms': fit_time * 1000.0, 'peak_mb': peak / 2 ** 20, 'values': values }
+
+def agreement(approximate : np.ndarray, exact : np.ndarray) -> float:
+    """Share of the exact components explained by a linear map of the approximate ones (components agree up to sign and rotation)
+
+    Args:
+        approximate (np.ndarray): Approximate components
+        exact (np.ndarray): Exact components
+
+    Returns:
+        float: R² of the least squares map (1 = same subspace)
+    """
+
+    A : np.ndarray = np.column_stack([ approximate, np.ones(approximate.shape[0]) ])
+
+    residuals : np.ndarray = exact - A @ np.linalg.lstsq(A, exact, rcond=None)[0]
+
+    return float(1.0 - np.sum(residuals ** 2) / np.sum((exact - exact.mean(axis=0)) ** 2))
+
+# --- Main
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__)
+
+    parser.add_argument('--sizes', type=int, nargs='+', default=[ 712, 2848, 5696, 11392, 45568 ], help='Training rows (712 today, then x4, x8, x16, x64)')
+    parser.add_argument('--budgets', type=int, nargs='+', default=[ 16, 64 ], help='Memory budgets of the approximate mode in MB (exact method when the kernel fits)')
+    parser.add_argument('--exact-max', type=int, default=6000, help='Largest size fitted with the exact method (N x N kernel)')
+
+    args = parser.parse_args()
+
+    rng : np.random.Generator = np.random.default_rng(42)
+
+    print(f'{"rows":>7} {"mode":<18} {"landmarks":>9} {"fit ms":>10} {"peak MB":>9} {"r2 vs exact":>12}')
+
+    for size in args.sizes:
+
+        X : np.ndarray = passengers(rng, size)
+
+        exact : dict | None = None
+
+        if size <= args.exact_max:
+
+            exact = measure(lambda: KernelPCA(n_components=2, kernel='rbf'), X)
+
+            print(f'{size:>7} {"exact":<18} {size:>9} {exact["fit_ms"]:>10.1f} {exact["peak_mb"]:>9.1f} {1.0:>12.4f}')
+
+        for budget in args.budgets:
+
+            approximate : dict = measure(lambda: kernels.approximate_kernel_pca(*X.shape, n_components=2, budget_mb=budget), X)
+
+            score : str = f'{agreement(approximate["values"], exact["values"]):>12.4f}' if exact is not None else f'{"-":>12}'
+
+            print(f'{size:>7} {f"approximate {budget} MB":<18} {kernels.landmarks(size, budget):>9} {approximate["fit_ms"]:>10.1f} {approximate["peak_mb"]:>9.1f} {score}')
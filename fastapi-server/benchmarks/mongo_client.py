@@ -0,0 +1,123 @@
+"""Latency of a "carbon_emissions" read with a new MongoClient per call versus the shared pooled client
+
+>>> Launch from CL: python fastapi-server/benchmarks/mongo_client.py [--mongomock] [--requests 200]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pymongo
+
+from common import database
+from common.database import CollectionName
+
+# --- Utility
+
+def seed(collection) -> None:
+    """Fill an empty "carbon_emissions" collection with synthetic documents
+
+    Args:
+        collection (Collection): MongoDB collection
+    """
+
+    if collection.estimated_document_count() > 0: return
+
+    documents : list = []
+
+    for column in range(1, 10):
+
+        for year in range(1973, 2024):
+
+            documents.append({ 'Column_Order': column, 'YYYYMM': f'{year}13', 'Value': float(year * column), 'Description': f'Column {column}' })
+
+    collection.insert_many(documents)
+
+def query(collection) -> list:
+    """Same query used by the regression "/dataset" endpoint
+
+    Args:
+        collection (Collection): MongoDB collection
+
+    Returns:
+        list: Documents
+    """
+
+    cursor = collection.find({ 'Column_Order': { '$eq': 1 }, 'YYYYMM': { '$regex': '13$' } })
+
+    documents : list = list(cursor)
+
+    cursor.close()
+
+    return documents
+
+def per_call_client() -> list:
+    """Previous behaviour: handshake, query and close on every request"""
+
+    mongo_client = database.pymongo.MongoClient(host=database.MONGO_URI)
+
+    documents : list = query(mongo_client.get_database(database.MONGO_DATABASE).get_collection(str(CollectionName.CarbonEmissions)))
+
+    mongo_client.close()
+
+    return documents
+
+def pooled_client() -> list:
+    """Current behaviour: reuse the process-wide pooled client"""
+
+    return query(database.get_collection(CollectionName.CarbonEmissions))
+
+def measure(function, requests : int) -> dict:
+    """Time the given function
+
+    Args:
+        function (callable): Function to time
+        requests (int): Number of calls
+
+    Returns:
+        dict: Latency percentiles in milliseconds
+    """
+
+    timings : list = []
+
+    for _ in range(requests):
+
+        start : float = time.perf_counter()
+
+        function()
+
+        timings.append((time.perf_counter() - start) * 1000.0)
+
+    return { 'p50': float(np.percentile(timings, 50)), 'p95': float(np.percentile(timings, 95)), 'mean': float(np.mean(timings)) }
+
+# --- Main
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__)
+
+    parser.add_argument('--requests', type=int, default=200, help='Number of requests per mode')
+    parser.add_argument('--mongomock', action='store_true', help='Use an in-process mongomock stand-in instead of a local mongod')
+
+    args = parser.parse_args()
+
+    if args.mongomock:
+
+        import functools
+        import mongomock
+
+        database.pymongo.MongoClient = functools.partial(mongomock.MongoClient, _store=mongomock.store.ServerStore()) # ? Clients share the same in-memory data
+
+    seed(database.get_collection(CollectionName.CarbonEmissions))
+
+    for name, function in (('per-call client', per_call_client), ('pooled client', pooled_client)):
+
+        result : dict = measure(function, args.requests)
+
+        print(f'{name:<16} p50 {result["p50"]:8.3f} ms   p95 {result["p95"]:8.3f} ms   mean {result["mean"]:8.3f} ms')
+
+    database.close_client()
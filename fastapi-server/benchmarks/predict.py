@@ -0,0 +1,137 @@
+"""Throughput and latency of single-passenger classification predictions under concurrency, micro-batched or not
+
+The classification router runs in-process against a mongomock stand-in seeded with the synthetic fixtures.
+
+>>> Launch from CL: python fastapi-server/benchmarks/predict.py [--concurrency 1 4 16 64] [--requests 50] [--classifier random-forest-classification]
+"""
+
+import argparse
+import concurrent.futures
+import functools
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from common import batching, database, models, snapshot
+
+import fixtures
+
+PASSENGER : dict = { 'Age': 30, 'Fare': 20.0, 'Sex': 1, 'Sibsp': 0, 'Parch': 0, 'Pclass': 1, 'Embarked': 2 }
+
+# --- Utility
+
+class DirectPredictor:
+    """Stand-in of the micro-batcher predicting every request on its own"""
+
+    def __init__(self, predict) -> None:
+
+        self._predict = predict
+
+    def predict(self, model, rows : list) -> list:
+
+        return list(self._predict(model, rows))
+
+def measure(client, path : str, concurrency : int, requests : int) -> dict:
+    """Send single-passenger requests from concurrent clients
+
+    Args:
+        client (TestClient): Client of the router
+        path (str): Path and query
+        concurrency (int): Concurrent clients
+        requests (int): Requests per client
+
+    Returns:
+        dict: { rps, p50_ms, p95_ms }
+    """
+
+    def run(worker : int) -> list:
+
+        timings : list = []
+
+        for index in range(requests):
+
+            start : float = time.perf_counter()
+
+            client.post(path, json=dict(PASSENGER, Age=(worker + index) % 80))
+
+            timings.append((time.perf_counter() - start) * 1000.0)
+
+        return timings
+
+    start : float = time.perf_counter()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor: timings : list = [ timing for result in executor.map(run, range(concurrency)) for timing in result ]
+
+    elapsed : float = time.perf_counter() - start
+
+    return { 'rps': len(timings) / elapsed, 'p50_ms': float(np.percentile(timings, 50)), 'p95_ms': float(np.percentile(timings, 95)) }
+
+# --- Main
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[ 1, 4, 16, 64 ], help='Concurrent clients')
+    parser.add_argument('--requests', type=int, default=50, help='Requests per client')
+    parser.add_argument('--classifier', type=str, default='random-forest-classification', help='Classification algorithm')
+    parser.add_argument('--method', type=int, default=2, help='Dimensionality reduction method')
+
+    args = parser.parse_args()
+
+    import mongomock
+
+    database.pymongo.MongoClient = functools.partial(mongomock.MongoClient, _store=mongomock.store.ServerStore())
+
+    fixtures.seed(database.get_database())
+
+    workspace : tempfile.TemporaryDirectory = tempfile.TemporaryDirectory(prefix='learningai-benchmark-')
+
+    snapshot.SNAPSHOT_DIR   = os.path.join(workspace.name, 'cache')
+    models.registry         = models.ModelRegistry(directory=os.path.join(workspace.name, 'models')) # ? Never touch the server models
+
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from routers.machine_learning import classification
+
+    app : FastAPI = FastAPI()
+
+    app.include_router(classification.router)
+
+    client : TestClient = TestClient(app)
+
+    path : str = f'/machine-learning/classification/predict?classifier={args.classifier}&method={args.method}'
+
+    client.post(path, json=PASSENGER) # ? Fit the model once
+
+    # ? Count the vectorized calls to get the mean batch size
+
+    calls : list = [ 0, 0 ]
+
+    lock : threading.Lock = threading.Lock()
+
+    def counted(model, rows : list):
+
+        with lock: calls[0] += 1; calls[1] += len(rows)
+
+        return classification.predict_rows(model, rows)
+
+    print(f'{"clients":>7} {"mode":<12} {"req/s":>9} {"p50 ms":>8} {"p95 ms":>8} {"rows/batch":>10}')
+
+    for concurrency in args.concurrency:
+
+        for mode, predictor in (('direct', DirectPredictor(counted)), ('micro-batch', batching.MicroBatcher('benchmark', counted))):
+
+            classification.batcher = predictor
+
+            calls[0], calls[1] = 0, 0
+
+            result : dict = measure(client, path, concurrency, args.requests)
+
+            print(f'{concurrency:>7} {mode:<12} {result["rps"]:>9.1f} {result["p50_ms"]:>8.2f} {result["p95_ms"]:>8.2f} {calls[1] / max(calls[0], 1):>10.2f}')
@@ -0,0 +1,145 @@
+"""Server cold start: import time and memory of "main" with lazy frameworks versus eager imports, plus a "/docs" probe
+
+>>> Launch from CL: python fastapi-server/benchmarks/startup.py [--port 8765]
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+SERVER_DIR : str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES : list = [ 'tensorflow', 'keras', 'torch', 'xgboost', 'minisom', 'matplotlib.pyplot', 'nltk' ]
+
+# --- Utility
+
+def import_profile(statement : str) -> dict:
+    """Run the given import statement in a fresh interpreter with "-X importtime"
+
+    Args:
+        statement (str): Python import statement
+
+    Returns:
+        dict: Wall time (s), cumulative import time of "main" (ms), peak RSS (MB) and heaviest packages
+    """
+
+    code : str = f'{statement}\nimport resource, sys\nprint(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, file=sys.stdout)'
+
+    start : float = time.perf_counter()
+
+    process = subprocess.run([ sys.executable, '-X', 'importtime', '-c', code ], cwd=SERVER_DIR, capture_output=True, text=True, check=True)
+
+    wall : float = time.perf_counter() - start
+
+    cumulative : dict = dict()
+
+    for line in process.stderr.splitlines():
+
+        if not line.startswith('import time:') or 'cumulative' in line: continue
+
+        _, us, package = line.removeprefix('import time:').split('|')
+
+        cumulative[package.strip()] = int(us) / 1000.0
+
+    top_level : dict = { name: value for name, value in cumulative.items() if '.' not in name }
+
+    return\
+    {
+        'wall_s': round(wall, 3),
+        'main_ms': round(cumulative.get('main', 0.0), 1),
+        'peak_rss_mb': round(int(process.stdout.strip().splitlines()[-1]) / 1024.0, 1),
+        'heaviest': dict(sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:8])
+    }
+
+def rss_mb(pid : int) -> float:
+    """Resident memory of a process (Linux only)
+
+    Args:
+        pid (int): Process id
+
+    Returns:
+        float: RSS in MB (0 if unavailable)
+    """
+
+    try:
+
+        with open(f'/proc/{pid}/status', 'r') as file:
+
+            for line in file:
+
+                if line.startswith('VmRSS:'): return int(line.split()[1]) / 1024.0
+
+    except OSError:
+
+        pass
+
+    return 0.0
+
+def docs_probe(port : int, timeout : float = 120.0) -> dict:
+    """Start the server and wait until "/docs" answers
+
+    Args:
+        port (int): Server port
+        timeout (float, optional): Maximum wait in seconds. Defaults to 120.
+
+    Returns:
+        dict: Time to first "/docs" response (s), number of OpenAPI paths and server RSS (MB)
+    """
+
+    start : float = time.perf_counter()
+
+    server = subprocess.Popen([ sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(port), '--log-level', 'warning' ], cwd=SERVER_DIR)
+
+    try:
+
+        while time.perf_counter() - start < timeout:
+
+            try:
+
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/docs', timeout=1) as response:
+
+                    if response.status == 200: break
+
+            except OSError:
+
+                time.sleep(0.05)
+
+        ready : float = time.perf_counter() - start
+
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/openapi.json', timeout=5) as response:
+
+            paths : int = len(json.load(response)['paths'])
+
+        return { 'docs_ready_s': round(ready, 3), 'openapi_paths': paths, 'server_rss_mb': round(rss_mb(server.pid), 1) }
+
+    finally:
+
+        server.terminate()
+
+        server.wait()
+
+# --- Main
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__)
+
+    parser.add_argument('--port', type=int, default=8765, help='Port used by the "/docs" probe')
+
+    args = parser.parse_args()
+
+    installed : list = [ name for name in HEAVY_MODULES if importlib.util.find_spec(name.split('.')[0]) is not None ]
+
+    report : dict =\
+    {
+        'lazy': import_profile('import main'),
+        'eager': import_profile('import main\n' + '\n'.join(f'import {name}' for name in installed)), # ? Previous behaviour: all frameworks at startup
+        'docs': docs_probe(args.port)
+    }
+
+    print(json.dumps(report, indent=4))
@@ -0,0 +1,104 @@
+"""Accuracy and latency of the exact RBF support vector regression versus the Nystroem approximation as the series grows
+
+>>> Launch from CL: python fastapi-server/benchmarks/svr.py [--sizes 600 2400 9600 19200] [--components 50 100 200]
+"""
+
+import argparse
+import os
+import sys
+import time
+import types
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from common import datasets
+from routers.machine_learning.regression import RegressorType, fit_regressor
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.metrics import r2_score
+from sklearn.model_selection import train_test_split
+
+# --- Utility
+
+def series(rng : np.random.Generator, size : int) -> datasets.DatasetHandle:
+    """Synthetic monthly emission series with a trend, a seasonality and noise, split as the regression datasets
+
+    Args:
+        rng (np.random.Generator): Random generator
+        size (int): Number of rows
+
+    Returns:
+        datasets.DatasetHandle: Prepared dataset
+    """
+
+    months : np.ndarray = np.arange(size)
+
+    X : np.ndarray = ((1973 + months // 12) * 100 + months % 12 + 1).reshape(-1, 1)
+
+    trend : np.ndarray = 20.0 * np.sin(3.0 * np.pi * months / size) # ? Same shape whatever the length
+
+    y : np.ndarray = (100.0 + trend + 2.0 * np.sin(2.0 * np.pi * months / 12.0) + rng.normal(0.0, 1.0, size)).reshape(-1, 1)
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    return datasets.DatasetHandle(key=('svr-benchmark', size), version='', values=types.MappingProxyType(dict(X=X, X_train=X_train, X_test=X_test, y=y, y_train=y_train, y_test=y_test)))
+
+def measure(handle : datasets.DatasetHandle, components : int) -> dict:
+    """Fit on the training split and predict the whole series
+
+    Args:
+        handle (datasets.DatasetHandle): Prepared dataset
+        components (int): Nystroem components (0 = exact)
+
+    Returns:
+        dict: { fit_ms, predict_ms, r2, values }
+    """
+
+    start : float = time.perf_counter()
+
+    model = fit_regressor(RegressorType.SupportVector, handle, components=components)
+
+    fit_time : float = time.perf_counter() - start
+
+    start = time.perf_counter()
+
+    values : np.ndarray = np.ravel(model.predict(handle.X))
+
+    predict_time : float = time.perf_counter() - start
+
+    return { 'fit_ms': fit_time * 1000.0, 'predict_ms': predict_time * 1000.0, 'r2': float(r2_score(handle.y_test.ravel(), np.ravel(model.predict(handle.X_test)))), 'values': values }
+
+# --- Main
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__)
+
+    parser.add_argument('--sizes', type=int, nargs='+', default=[ 600, 2400, 9600, 19200 ], help='Series lengths (51 annual rows today, ~600 monthly rows)')
+    parser.add_argument('--components', type=int, nargs='+', default=[ 50, 100, 200 ], help='Nystroem components of the approximate mode')
+
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore', ConvergenceWarning)
+
+    rng : np.random.Generator = np.random.default_rng(42)
+
+    print(f'{"rows":>7} {"mode":<16} {"fit ms":>10} {"predict ms":>11} {"test r2":>8} {"rmse vs exact":>14}')
+
+    for size in args.sizes:
+
+        handle : datasets.DatasetHandle = series(rng, size)
+
+        exact : dict = measure(handle, 0)
+
+        print(f'{size:>7} {"exact":<16} {exact["fit_ms"]:>10.1f} {exact["predict_ms"]:>11.1f} {exact["r2"]:>8.4f} {0.0:>14.4f}')
+
+        for components in args.components:
+
+            approximate : dict = measure(handle, components)
+
+            deviation : float = float(np.sqrt(np.mean((approximate['values'] - exact['values']) ** 2)))
+
+            print(f'{size:>7} {f"nystroem {components}":<16} {approximate["fit_ms"]:>10.1f} {approximate["predict_ms"]:>11.1f} {approximate["r2"]:>8.4f} {deviation:>14.4f}')
@@ -0,0 +1,141 @@
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import os
+import threading
+
+from common import telemetry
+from concurrent.futures import Future
+from typing import Any, Callable
+
+# --- Params
+
+BATCH_MAX_SIZE : int = int(os.environ.get('BATCH_MAX_SIZE', '256'))
+
+BATCH_MAX_WAIT_MS : float = float(os.environ.get('BATCH_MAX_WAIT_MS', '0')) # ? Extra wait for more rows (0 = only the rows queued while the previous batch ran)
+
+class MicroBatcher:
+    """Coalesce the rows of concurrent requests into one vectorized prediction per model
+
+    The first request of a batch is its leader: it waits for the previous batch of the batcher to finish (and up to
+    BATCH_MAX_WAIT_MS more), takes every row queued meanwhile and predicts them for all. A lone request is predicted
+    at once, batches grow with the load.
+    """
+
+    def __init__(self, name : str, predict : Callable[[Any, list], Any], max_size : int = BATCH_MAX_SIZE, max_wait_ms : float = BATCH_MAX_WAIT_MS) -> None:
+        """Constructor
+
+        Args:
+            name (str): Batcher name (telemetry label)
+            predict (Callable[[Any, list], Any]): Function returning one prediction per row of a list for the given model
+            max_size (int, optional): Rows that end the wait of the leader. Defaults to BATCH_MAX_SIZE.
+            max_wait_ms (float, optional): Longest wait of the leader for more rows. Defaults to BATCH_MAX_WAIT_MS.
+        """
+
+        self.name           : str       = name
+        self.max_size       : int       = max_size
+        self.max_wait_ms    : float     = max_wait_ms
+
+        self._predict : Callable[[Any, list], Any] = predict
+
+        self._pending   : list  = [] # ? (model, rows, future) queued for the next batch
+        self._rows      : int   = 0
+
+        self._lock      : threading.Lock        = threading.Lock()
+        self._full      : threading.Condition   = threading.Condition(self._lock)
+        self._running   : threading.Lock        = threading.Lock() # ? One batch at a time, the next one fills meanwhile
+
+    def predict(self, model : Any, rows : list) -> list:
+        """Predictions of the given rows, computed together with the rows of the concurrent requests
+
+        Args:
+            model (Any): Fitted model (rows of the same model are predicted together)
+            rows (list): Input rows
+
+        Returns:
+            list: One prediction per row
+        """
+
+        future : Future = Future()
+
+        with self._lock:
+
+            self._pending.append((model, rows, future))
+
+            self._rows += len(rows)
+
+            leader : bool = len(self._pending) == 1
+
+            if self._rows >= self.max_size: self._full.notify()
+
+        if leader:
+
+            with self._running:
+
+                with self._lock:
+
+                    if self.max_wait_ms > 0 and self._rows < self.max_size: self._full.wait_for(lambda: self._rows >= self.max_size, timeout=self.max_wait_ms / 1000.0)
+
+                    batch, self._pending, self._rows = self._pending, [], 0
+
+                self._run(batch)
+
+        return future.result()
+
+    def _run(self, batch : list) -> None:
+        """Predict a batch, one call per model
+
+        Args:
+            batch (list): (model, rows, future) of the coalesced requests
+        """
+
+        groups : dict = dict()
+
+        for model, rows, future in batch: groups.setdefault(id(model), []).append((model, rows, future))
+
+        for group in groups.values():
+
+            model : Any = group[0][0]
+
+            rows : list = [ row for _, request_rows, _ in group for row in request_rows ]
+
+            telemetry.event('micro_batch', batch=self.name)
+
+            telemetry.events_total.increment(len(rows), event='micro_batch_rows', batch=self.name)
+
+            try:
+
+                with telemetry.span(telemetry.Stage.Predict): predictions = list(self._predict(model, rows))
+
+            except Exception as error:
+
+                if len(group) > 1: self._run_each(group) # ? Only the faulty requests fail
+                else: group[0][2].set_exception(error)
+
+                continue
+
+            start : int = 0
+
+            for _, request_rows, future in group:
+
+                future.set_result(predictions[start:start + len(request_rows)])
+
+                start += len(request_rows)
+
+    def _run_each(self, group : list) -> None:
+        """Predict the requests of a failed group one by one
+
+        Args:
+            group (list): (model, rows, future) of the same model
+        """
+
+        for model, rows, future in group:
+
+            try:
+
+                future.set_result(list(self._predict(model, rows)))
+
+            except Exception as error:
+
+                future.set_exception(error)
@@ -0,0 +1,127 @@
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import os
+import pymongo
+import threading
+
+from enum import StrEnum
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+# --- Params
+
+MONGO_URI : str = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+
+MONGO_DATABASE : str = os.environ.get('MONGO_DATABASE', 'LearningAI')
+
+MONGO_MAX_POOL_SIZE : int = int(os.environ.get('MONGO_MAX_POOL_SIZE', '50'))
+
+MONGO_MIN_POOL_SIZE : int = int(os.environ.get('MONGO_MIN_POOL_SIZE', '0'))
+
+MONGO_SERVER_SELECTION_TIMEOUT_MS : int = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+
+MONGO_CONNECT_TIMEOUT_MS : int = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+
+MONGO_SOCKET_TIMEOUT_MS : int = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', '30000'))
+
+class CollectionName(StrEnum):
+
+    CarbonEmissions             = 'carbon_emissions'
+    CarbonEmissionsAnnual       = 'carbon_emissions_annual' # ? Materialized view (see common/views.py)
+    CreditCardApplications      = 'credit_card_applications'
+    MarketBasketOptimisation    = 'market_basket_optimisation'
+    MoviesTest                  = 'movies_test'
+    MoviesTraining              = 'movies_training'
+    Nflx                        = 'nflx'
+    Penguins                    = 'penguins'
+    Retailers                   = 'retailers'
+    SentimentAnalysis           = 'sentiment_analysis'
+    Songs                       = 'songs'
+    Titanic                     = 'titanic'
+
+INDEXES : dict =\
+{
+    CollectionName.CarbonEmissions: [ [ ('Column_Order', pymongo.ASCENDING), ('YYYYMM', pymongo.ASCENDING) ] ],
+    CollectionName.CarbonEmissionsAnnual: [ [ ('Column_Order', pymongo.ASCENDING), ('YYYYMM', pymongo.ASCENDING) ] ]
+}
+
+_client : pymongo.MongoClient = None
+
+_client_pid : int = 0
+
+_lock : threading.Lock = threading.Lock()
+
+# --- Utility
+
+def get_client() -> pymongo.MongoClient:
+    """Return the process-wide MongoDB client, creating it on first use
+
+    The client owns a connection pool shared by every router. A new client is created after a fork since
+    PyMongo clients are not fork-safe.
+
+    Returns:
+        pymongo.MongoClient: Pooled client
+    """
+
+    global _client
+    global _client_pid
+
+    if _client is not None and _client_pid == os.getpid(): return _client
+
+    with _lock:
+
+        if _client is None or _client_pid != os.getpid():
+
+            _client = pymongo.MongoClient(host=MONGO_URI,
+                                          maxPoolSize=MONGO_MAX_POOL_SIZE,
+                                          minPoolSize=MONGO_MIN_POOL_SIZE,
+                                          serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                                          connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+                                          socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS)
+
+            _client_pid = os.getpid()
+
+    return _client
+
+def close_client() -> None:
+    """Close the process-wide MongoDB client and its connection pool"""
+
+    global _client
+
+    with _lock:
+
+        if _client is not None and _client_pid == os.getpid(): _client.close()
+
+        _client = None
+
+def get_database() -> Database:
+    """Return the "LearningAI" database
+
+    Returns:
+        Database: MongoDB database
+    """
+
+    return get_client().get_database(MONGO_DATABASE)
+
+def get_collection(name : CollectionName) -> Collection:
+    """Return the given collection of the "LearningAI" database
+
+    Args:
+        name (CollectionName): Collection name
+
+    Returns:
+        Collection: MongoDB collection
+    """
+
+    return get_database().get_collection(str(name))
+
+def ensure_indexes() -> None:
+    """Create the missing indexes of INDEXES (existing indexes are left untouched)"""
+
+    for name, indexes in INDEXES.items():
+
+        collection : Collection = get_collection(name)
+
+        for keys in indexes: collection.create_index(keys)
@@ -0,0 +1,141 @@
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import collections
+import dataclasses
+import numpy as np
+import os
+import threading
+import types
+
+from common import telemetry
+from typing import Callable
+
+# --- Params
+
+DATASET_CACHE_SIZE : int = int(os.environ.get('DATASET_CACHE_SIZE', '16'))
+
+@dataclasses.dataclass(frozen=True)
+class DatasetHandle:
+    """Immutable prepared dataset, identified by the collection version and the preprocessing parameters
+
+    Values are read as attributes (e.g. "handle.X_train"). NumPy arrays are read-only, so handles can be shared
+    by concurrent requests without copies.
+    """
+
+    key     : tuple
+    version : str
+    values  : types.MappingProxyType
+
+    # >>> Override
+    def __getattr__(self, name : str):
+
+        try:
+
+            return self.values[name]
+
+        except KeyError:
+
+            raise AttributeError(name) from None
+
+class DatasetCache:
+    """Bounded LRU of dataset handles"""
+
+    def __init__(self, max_size : int = DATASET_CACHE_SIZE) -> None:
+        """Constructor
+
+        Args:
+            max_size (int, optional): Maximum number of handles. Defaults to DATASET_CACHE_SIZE.
+        """
+
+        self.max_size : int = max_size
+
+        self._handles : collections.OrderedDict = collections.OrderedDict()
+
+        self._building : dict = dict()
+
+        self._lock : threading.Lock = threading.Lock()
+
+    def get(self, key : tuple, version : str, builder : Callable[[], dict]) -> DatasetHandle:
+        """Return the handle for the given key, building it once if missing
+
+        Concurrent requests for the same missing key wait for a single build.
+
+        Args:
+            key (tuple): Dataset name and preprocessing parameters
+            version (str): Collection version (fingerprint)
+            builder (Callable[[], dict]): Function preparing the dataset values
+
+        Returns:
+            DatasetHandle: Prepared dataset
+        """
+
+        full_key : tuple = (*key, version)
+
+        with self._lock:
+
+            if full_key in self._handles:
+
+                self._handles.move_to_end(full_key)
+
+                telemetry.event('dataset_cache_hit', dataset=key[0])
+
+                return self._handles[full_key]
+
+            build_lock : threading.Lock = self._building.setdefault(full_key, threading.Lock())
+
+        with build_lock:
+
+            with self._lock:
+
+                if full_key in self._handles: return self._handles[full_key]
+
+            telemetry.event('dataset_cache_miss', dataset=key[0])
+
+            try:
+
+                with telemetry.span(telemetry.Stage.Preprocess): values : dict = builder()
+
+                handle : DatasetHandle = DatasetHandle(key=key, version=version, values=types.MappingProxyType(freeze(values)))
+
+                with self._lock:
+
+                    self._handles[full_key] = handle
+
+                    while len(self._handles) > self.max_size: self._handles.popitem(last=False)
+
+            finally:
+
+                with self._lock: self._building.pop(full_key, None) # ? A failed build is retried by the next request
+
+        return handle
+
+    def clear(self) -> None:
+        """Remove all handles"""
+
+        with self._lock: self._handles.clear()
+
+    def __len__(self) -> int:
+
+        return len(self._handles)
+
+cache : DatasetCache = DatasetCache()
+
+# --- Utility
+
+def freeze(values : dict) -> dict:
+    """Make the NumPy arrays of a prepared dataset read-only
+
+    Args:
+        values (dict): Prepared dataset values
+
+    Returns:
+        dict: Same values
+    """
+
+    for value in values.values():
+
+        if isinstance(value, np.ndarray): value.setflags(write=False)
+
+    return values
@@ -0,0 +1,169 @@
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import collections
+import copy
+import numpy as np
+import os
+import threading
+
+from common import telemetry
+from sklearn.model_selection import StratifiedKFold
+from typing import Callable
+
+# --- Params
+
+FOREST_CACHE_SIZE : int = int(os.environ.get('FOREST_CACHE_SIZE', '64')) # ? The NLP grid search alone keeps 3 criteria x 10 folds
+
+FOREST_N_JOBS : int = int(os.environ.get('FOREST_N_JOBS', '-1'))
+
+class ForestCache:
+    """Bounded LRU of fitted random forests, grown with "warm_start" when more trees are requested
+
+    Scikit-learn draws the seeds of the trees in order from "random_state", so a forest grown from 100 to 150 trees
+    is the same as a forest of 150 trees fitted from scratch, and its first 50 trees are the same as a forest of 50.
+    """
+
+    def __init__(self, max_size : int = FOREST_CACHE_SIZE) -> None:
+        """Constructor
+
+        Args:
+            max_size (int, optional): Maximum number of forests. Defaults to FOREST_CACHE_SIZE.
+        """
+
+        self.max_size : int = max_size
+
+        self._forests : collections.OrderedDict = collections.OrderedDict()
+
+        self._locks : dict = dict()
+
+        self._lock : threading.Lock = threading.Lock()
+
+    def fit(self, key : tuple, version : str, factory : Callable, X : np.ndarray, y : np.ndarray, estimators : int):
+        """Forest with the given number of trees, only fitting the trees missing from the cached one
+
+        Args:
+            key (tuple): Dataset name and forest parameters (the same key must always come with the same X and y)
+            version (str): Dataset version
+            factory (Callable): Function creating the unfitted forest (fixed "random_state")
+            X (np.ndarray): Training inputs
+            y (np.ndarray): Training targets
+            estimators (int): Number of trees
+
+        Returns:
+            RandomForestClassifier | RandomForestRegressor: Fitted forest (a copy sharing the trees, safe to use while the cached one grows)
+        """
+
+        full_key : tuple = (*key, version)
+
+        with self._lock: forest_lock : threading.Lock = self._locks.setdefault(full_key, threading.Lock())
+
+        with forest_lock:
+
+            with self._lock:
+
+                forest = self._forests.get(full_key)
+
+                if forest is not None: self._forests.move_to_end(full_key)
+
+            trees : int = len(forest.estimators_) if forest is not None else 0
+
+            if trees < estimators:
+
+                telemetry.event('forest_cache_miss' if forest is None else 'forest_cache_grow', forest=key[0])
+
+                if forest is None: forest = factory().set_params(warm_start=True, n_jobs=FOREST_N_JOBS)
+
+                forest.set_params(n_estimators=estimators)
+
+                with telemetry.span(telemetry.Stage.Fit): forest.fit(X, y) # ? Only the missing trees are trained
+
+            else:
+
+                telemetry.event('forest_cache_hit', forest=key[0])
+
+            view = prefix(forest, estimators)
+
+            with self._lock:
+
+                self._forests[full_key] = forest
+
+                while len(self._forests) > self.max_size:
+
+                    evicted, _ = self._forests.popitem(last=False)
+
+                    self._locks.pop(evicted, None)
+
+        return view
+
+    def clear(self) -> None:
+        """Remove all forests"""
+
+        with self._lock: self._forests.clear()
+
+    def __len__(self) -> int:
+
+        return len(self._forests)
+
+cache : ForestCache = ForestCache()
+
+# --- Utility
+
+def prefix(forest, estimators : int):
+    """Forest made of the first trees of a fitted forest
+
+    Args:
+        forest (RandomForestClassifier | RandomForestRegressor): Fitted forest
+        estimators (int): Number of trees
+
+    Returns:
+        RandomForestClassifier | RandomForestRegressor: Shallow copy with its own list of trees
+    """
+
+    view = copy.copy(forest)
+
+    view.estimators_    = forest.estimators_[:estimators]
+    view.n_estimators   = estimators
+    view.warm_start     = False
+
+    return view
+
+def grid_search(key : tuple, version : str, factory : Callable[[str], object], X : np.ndarray, y : np.ndarray, criteria : list, sizes : list, cv : int = 10) -> dict:
+    """Cross validated accuracy of forest classifiers for every (criterion, number of trees)
+
+    Same folds and scores as GridSearchCV / cross_val_score with an integer "cv", but a single forest per
+    (criterion, fold) is grown through all the sizes instead of refitting one forest per candidate.
+
+    Args:
+        key (tuple): Dataset name
+        version (str): Dataset version
+        factory (Callable[[str], object]): Function creating the unfitted forest for a criterion
+        X (np.ndarray): Training inputs
+        y (np.ndarray): Training targets
+        criteria (list): Split criteria
+        sizes (list): Numbers of trees
+        cv (int, optional): Number of folds. Defaults to 10.
+
+    Returns:
+        dict: { (criterion, trees): [fold accuracies] } in GridSearchCV candidate order
+    """
+
+    folds : list = list(StratifiedKFold(n_splits=cv).split(X, y))
+
+    scores : dict = { (criterion, trees): [] for criterion in criteria for trees in sorted(sizes) }
+
+    for criterion in criteria:
+
+        for fold, (train, test) in enumerate(folds):
+
+            X_train, y_train = X[train], y[train]
+            X_test, y_test   = X[test], y[test]
+
+            for trees in sorted(sizes):
+
+                forest = cache.fit((*key, criterion, fold), version, lambda: factory(criterion), X_train, y_train, trees)
+
+                scores[(criterion, trees)].append(float(forest.score(X_test, y_test)))
+
+    return scores
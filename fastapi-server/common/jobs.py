@@ -0,0 +1,479 @@
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import collections
+import dataclasses
+import heapq
+import inspect
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+import uuid
+
+from enum import StrEnum
+from typing import Any, Callable
+
+# --- Params
+
+JOBS_MAX_WORKERS : int = int(os.environ.get('JOBS_MAX_WORKERS', '1'))
+
+JOBS_MAX_QUEUED : int = int(os.environ.get('JOBS_MAX_QUEUED', '16'))
+
+JOBS_HISTORY_SIZE : int = int(os.environ.get('JOBS_HISTORY_SIZE', '100'))
+
+JOBS_CANCEL_GRACE_S : float = float(os.environ.get('JOBS_CANCEL_GRACE_S', '30'))
+
+class JobStatus(StrEnum):
+
+    Queued      = 'queued'
+    Running     = 'running'
+    Finished    = 'finished'
+    Failed      = 'failed'
+    Cancelled   = 'cancelled'
+
+class UnknownJobError(KeyError):
+    """No task registered with the given kind"""
+
+class QueueFullError(RuntimeError):
+    """Too many queued jobs"""
+
+class JobCancelled(Exception):
+    """Raised inside a worker when its job has been cancelled"""
+
+@dataclasses.dataclass
+class Job:
+    """Training job: parameters, scheduling state and progress reported by the worker process"""
+
+    id          : str
+    kind        : str
+    params      : dict
+    priority    : int
+    created     : float
+    status      : JobStatus     = JobStatus.Queued
+    started     : float | None  = None
+    finished    : float | None  = None
+    progress    : dict          = dataclasses.field(default_factory=dict)
+    result      : Any           = None
+    error       : str | None    = None
+
+    _cancel     : Any = dataclasses.field(default=None, repr=False)
+    _process    : Any = dataclasses.field(default=None, repr=False)
+
+    @property
+    def done(self) -> bool:
+
+        return self.status in (JobStatus.Finished, JobStatus.Failed, JobStatus.Cancelled)
+
+    def to_dict(self) -> dict:
+        """Public view of the job
+
+        Returns:
+            dict: Job fields without the process handles
+        """
+
+        return\
+        {
+            'id': self.id,
+            'kind': self.kind,
+            'params': self.params,
+            'priority': self.priority,
+            'status': str(self.status),
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'progress': dict(self.progress),
+            'result': self.result,
+            'error': self.error
+        }
+
+class JobContext:
+    """Handle given to the task running in the worker process (progress reports and cancellation checks)"""
+
+    def __init__(self, connection = None, cancel = None) -> None:
+        """Constructor
+
+        Args:
+            connection (Connection, optional): Pipe end towards the scheduler. Defaults to None (no job).
+            cancel (Event, optional): Cancellation flag set by the scheduler. Defaults to None (no job).
+        """
+
+        self._connection = connection
+
+        self._cancel = cancel
+
+    def report(self, **progress) -> None:
+        """Send progress values (e.g. epoch_count, loss) to the scheduler
+
+        Args:
+            progress (dict): Progress values (JSON serializable)
+        """
+
+        if self._connection is not None: self._connection.send(('progress', progress))
+
+    def cancelled(self) -> bool:
+        """Check if the job has been cancelled
+
+        Returns:
+            bool: True if cancelled
+        """
+
+        return self._cancel is not None and self._cancel.is_set()
+
+    def check(self) -> None:
+        """Raise JobCancelled if the job has been cancelled"""
+
+        if self.cancelled(): raise JobCancelled()
+
+_tasks : dict = dict()
+
+_context : JobContext = JobContext() # ? Replaced in the worker process by the one of the running job
+
+# --- Utility
+
+def task(kind : str) -> Callable:
+    """Register a function as a job task
+
+    The function must be defined at module level: worker processes are spawned and import it by name.
+
+    Args:
+        kind (str): Task name (e.g. "artificial-neural-network")
+
+    Returns:
+        Callable: Decorator returning the function unchanged
+    """
+
+    def decorator(function : Callable) -> Callable:
+
+        _tasks[kind] = function
+
+        return function
+
+    return decorator
+
+def context() -> JobContext:
+    """Context of the job running in this process
+
+    Returns:
+        JobContext: Job context (a no-op context if the task is called directly)
+    """
+
+    return _context
+
+def _run(function : Callable, params : dict, connection, cancel) -> None:
+    """Worker process entry point
+
+    Args:
+        function (Callable): Task
+        params (dict): Task keyword arguments
+        connection (Connection): Pipe end towards the scheduler
+        cancel (Event): Cancellation flag
+    """
+
+    global _context
+
+    _context = JobContext(connection, cancel)
+
+    try:
+
+        result : Any = function(**params)
+
+        connection.send(('cancelled', None) if cancel.is_set() else ('finished', result))
+
+    except JobCancelled:
+
+        connection.send(('cancelled', None))
+
+    except BaseException:
+
+        connection.send(('failed', traceback.format_exc()))
+
+    finally:
+
+        connection.close()
+
+class Scheduler:
+    """Priority queue of training jobs executed by a bounded number of worker processes
+
+    Each job runs in its own spawned process, so training never holds the GIL of the server. Higher priorities
+    start first, equal priorities in submission order.
+    """
+
+    def __init__(self, max_workers : int = JOBS_MAX_WORKERS, max_queued : int = JOBS_MAX_QUEUED, history_size : int = JOBS_HISTORY_SIZE) -> None:
+        """Constructor
+
+        Args:
+            max_workers (int, optional): Maximum number of jobs running at once. Defaults to JOBS_MAX_WORKERS.
+            max_queued (int, optional): Maximum number of waiting jobs. Defaults to JOBS_MAX_QUEUED.
+            history_size (int, optional): Number of completed jobs kept for listing. Defaults to JOBS_HISTORY_SIZE.
+        """
+
+        self.max_workers    : int = max(1, max_workers)
+        self.max_queued     : int = max_queued
+        self.history_size   : int = history_size
+
+        self._context = multiprocessing.get_context('spawn') # ? TensorFlow and PyTorch are not fork-safe
+
+        self._jobs : collections.OrderedDict = collections.OrderedDict()
+
+        self._queue : list = []
+
+        self._counter = itertools.count()
+
+        self._running : int = 0
+
+        self._lock : threading.RLock = threading.RLock()
+
+    def submit(self, kind : str, params : dict | None = None, priority : int = 0) -> Job:
+        """Queue a job
+
+        Args:
+            kind (str): Registered task name
+            params (dict | None, optional): Task keyword arguments. Defaults to None.
+            priority (int, optional): Higher runs first. Defaults to 0.
+
+        Raises:
+            UnknownJobError: No task with this name
+            TypeError: Parameters not accepted by the task
+            QueueFullError: Too many queued jobs
+
+        Returns:
+            Job: Queued job
+        """
+
+        if kind not in _tasks: raise UnknownJobError(kind)
+
+        params = dict(params or {})
+
+        inspect.signature(_tasks[kind]).bind(**params)
+
+        with self._lock:
+
+            if sum(1 for job in self._jobs.values() if job.status == JobStatus.Queued) >= self.max_queued: raise QueueFullError(f'{self.max_queued} jobs already queued')
+
+            job : Job = Job(id=uuid.uuid4().hex, kind=kind, params=params, priority=priority, created=time.time())
+
+            self._jobs[job.id] = job
+
+            heapq.heappush(self._queue, (-priority, next(self._counter), job))
+
+            self._dispatch()
+
+        return job
+
+    def get(self, job_id : str) -> Job | None:
+
+        return self._jobs.get(job_id)
+
+    def jobs(self, kind : str | None = None, status : JobStatus | None = None) -> list:
+        """List jobs, most recent first
+
+        Args:
+            kind (str | None, optional): Filter by task name. Defaults to None.
+            status (JobStatus | None, optional): Filter by status. Defaults to None.
+
+        Returns:
+            list: Jobs
+        """
+
+        with self._lock: jobs : list = list(self._jobs.values())
+
+        return [ job for job in reversed(jobs) if (kind is None or job.kind == kind) and (status is None or job.status == status) ]
+
+    def latest(self, kind : str) -> Job | None:
+        """Most recently submitted job of the given task
+
+        Args:
+            kind (str): Task name
+
+        Returns:
+            Job | None: Job or None
+        """
+
+        return next(iter(self.jobs(kind)), None)
+
+    def latest_finished(self, kind : str) -> Job | None:
+        """Most recently submitted job of the given task that finished successfully
+
+        Args:
+            kind (str): Task name
+
+        Returns:
+            Job | None: Job or None
+        """
+
+        return next(iter(self.jobs(kind, JobStatus.Finished)), None)
+
+    def cancel(self, job_id : str) -> Job | None:
+        """Cancel a job: a queued job is dropped, a running one is asked to stop and killed after a grace period
+
+        Args:
+            job_id (str): Job id
+
+        Returns:
+            Job | None: Job or None if unknown
+        """
+
+        with self._lock:
+
+            job : Job = self._jobs.get(job_id)
+
+            if job is None or job.done: return job
+
+            if job.status == JobStatus.Queued:
+
+                job.status      = JobStatus.Cancelled
+                job.finished    = time.time()
+
+                return job
+
+            job._cancel.set()
+
+            process = job._process
+
+        timer : threading.Timer = threading.Timer(JOBS_CANCEL_GRACE_S, lambda: process.is_alive() and process.terminate())
+
+        timer.daemon = True
+
+        timer.start()
+
+        return job
+
+    def shutdown(self) -> None:
+        """Cancel queued jobs and stop the running ones"""
+
+        with self._lock:
+
+            running : list = []
+
+            for job in self._jobs.values():
+
+                if job.status == JobStatus.Queued:
+
+                    job.status      = JobStatus.Cancelled
+                    job.finished    = time.time()
+
+                elif job.status == JobStatus.Running:
+
+                    job._cancel.set()
+
+                    running.append(job._process)
+
+        for process in running:
+
+            process.join(timeout=5)
+
+            if process.is_alive(): process.terminate()
+
+    def _dispatch(self) -> None:
+        """Start queued jobs while worker slots are free (called with the lock held)"""
+
+        while self._running < self.max_workers and self._queue:
+
+            _, _, job = heapq.heappop(self._queue)
+
+            if job.status != JobStatus.Queued: continue # ? Cancelled while waiting
+
+            receiver, sender = self._context.Pipe(duplex=False)
+
+            job._cancel = self._context.Event()
+
+            job._process = self._context.Process(target=_run, args=(_tasks[job.kind], job.params, sender, job._cancel), name=f'job-{job.kind}', daemon=True)
+
+            job._process.start()
+
+            sender.close() # ? Only the worker keeps the sending end, so the receiver sees EOF when it exits
+
+            job.status  = JobStatus.Running
+            job.started = time.time()
+
+            self._running += 1
+
+            threading.Thread(target=self._monitor, args=(job, receiver), name=f'job-monitor-{job.id}', daemon=True).start()
+
+    def _monitor(self, job : Job, receiver) -> None:
+        """Collect progress and outcome of a running job, then free its worker slot
+
+        Args:
+            job (Job): Running job
+            receiver (Connection): Pipe end receiving the worker messages
+        """
+
+        outcome : tuple = None
+
+        while outcome is None:
+
+            try:
+
+                message, value = receiver.recv()
+
+            except (EOFError, OSError):
+
+                break
+
+            if message == 'progress': job.progress.update(value)
+            else: outcome = (message, value)
+
+        receiver.close()
+
+        job._process.join()
+
+        with self._lock:
+
+            if outcome is None and job._cancel.is_set(): outcome = ('cancelled', None)
+            if outcome is None: outcome = ('failed', f'Worker exited with code {job._process.exitcode}')
+
+            message, value = outcome
+
+            job.status      = JobStatus(message)
+            job.finished    = time.time()
+
+            if job.status == JobStatus.Finished: job.result = value
+            if job.status == JobStatus.Failed: job.error = value
+
+            job._process = None
+
+            self._running -= 1
+
+            self._forget()
+
+            self._dispatch()
+
+    def _forget(self) -> None:
+        """Drop the oldest completed jobs beyond the history size (called with the lock held)"""
+
+        done : list = [ job_id for job_id, job in self._jobs.items() if job.done ]
+
+        for job_id in done[: max(0, len(done) - self.history_size)]: del self._jobs[job_id]
+
+scheduler : Scheduler = Scheduler()
+
+def training_status(kind : str, **defaults) -> dict:
+    """Training status of the latest job of a task, in the format of the routers "/status" endpoints
+
+    Args:
+        kind (str): Task name
+        defaults (dict): Default values of extra progress fields (e.g. loss)
+
+    Returns:
+        dict: { stopped, trained, epoch_count, epochs, ...progress }
+    """
+
+    job : Job = scheduler.latest(kind)
+
+    status : dict = dict(stopped=False, trained=False, epoch_count=1, epochs=1, **defaults)
+
+    if job is None: return status
+
+    status.update({ key: value for key, value in job.progress.items() if key in status })
+
+    status['epochs']    = job.params.get('epochs', status['epochs'])
+    status['stopped']   = job.status in (JobStatus.Cancelled, JobStatus.Failed)
+    status['trained']   = job.status == JobStatus.Finished
+
+    if job.done: status['epoch_count'] = 1
+
+    return status
@@ -0,0 +1,264 @@
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import collections
+import numpy as np
+import os
+import threading
+
+from common import telemetry
+from joblib import Parallel, delayed
+from sklearn.decomposition import PCA, KernelPCA
+from sklearn.kernel_approximation import Nystroem
+from sklearn.metrics.pairwise import pairwise_kernels
+from sklearn.model_selection import StratifiedKFold
+from sklearn.pipeline import Pipeline
+from sklearn.svm import SVC
+
+# --- Params
+
+KERNEL_PCA_BUDGET_MB : int = int(os.environ.get('KERNEL_PCA_BUDGET_MB', '64'))
+
+GRAM_CACHE_SIZE : int = int(os.environ.get('GRAM_CACHE_SIZE', '16')) # ? N x N float64 each (1.3 MB for the Titanic training split)
+
+GRAM_N_JOBS : int = int(os.environ.get('GRAM_N_JOBS', '-1'))
+
+class GramCache:
+    """Bounded LRU of kernel matrices of training sets, shared by every SVC fitted on them whatever its C"""
+
+    def __init__(self, max_size : int = GRAM_CACHE_SIZE) -> None:
+        """Constructor
+
+        Args:
+            max_size (int, optional): Maximum number of matrices. Defaults to GRAM_CACHE_SIZE.
+        """
+
+        self.max_size : int = max_size
+
+        self._matrices : collections.OrderedDict = collections.OrderedDict()
+
+        self._locks : dict = dict()
+
+        self._lock : threading.Lock = threading.Lock()
+
+    def get(self, key : tuple, version : str, X : np.ndarray, kernel : str = 'rbf', gamma : float | None = None) -> np.ndarray:
+        """Kernel matrix of a training set, computed once per (dataset version, kernel, gamma)
+
+        Args:
+            key (tuple): Dataset name and preprocessing parameters (the same key must always come with the same X)
+            version (str): Dataset version
+            X (np.ndarray): Training inputs
+            kernel (str, optional): SVC kernel name (not "precomputed"). Defaults to 'rbf'.
+            gamma (float | None, optional): Kernel coefficient (ignored by the linear kernel). Defaults to None.
+
+        Returns:
+            np.ndarray: N x N read-only kernel matrix (shared, never modify it)
+        """
+
+        full_key : tuple = (*key, kernel, gamma, version)
+
+        with self._lock: matrix_lock : threading.Lock = self._locks.setdefault(full_key, threading.Lock())
+
+        with matrix_lock:
+
+            with self._lock:
+
+                matrix : np.ndarray | None = self._matrices.get(full_key)
+
+                if matrix is not None: self._matrices.move_to_end(full_key)
+
+            if matrix is None:
+
+                telemetry.event('gram_cache_miss', kernel=kernel)
+
+                with telemetry.span(telemetry.Stage.Preprocess): matrix = pairwise_kernels(X, metric=kernel, **kernel_params(kernel, gamma))
+
+                matrix.flags.writeable = False
+
+            else:
+
+                telemetry.event('gram_cache_hit', kernel=kernel)
+
+            with self._lock:
+
+                self._matrices[full_key] = matrix
+
+                while len(self._matrices) > self.max_size:
+
+                    evicted, _ = self._matrices.popitem(last=False)
+
+                    self._locks.pop(evicted, None)
+
+        return matrix
+
+    def clear(self) -> None:
+        """Remove all matrices"""
+
+        with self._lock: self._matrices.clear()
+
+    def __len__(self) -> int:
+
+        return len(self._matrices)
+
+cache : GramCache = GramCache()
+
+class KernelSVC:
+    """Support vector classifier fitted on a cached kernel matrix (SVC(kernel='precomputed')), predicting from the
+    kernel of the new rows against the training rows
+
+    With gamma=None the coefficient is SVC's "scale" (1 / (features * variance)) of the training set, so the fit is
+    the same as SVC(kernel=kernel) on that set.
+    """
+
+    def __init__(self, key : tuple, version : str, kernel : str = 'rbf', gamma : float | None = None, C : float = 1.0) -> None:
+        """Constructor
+
+        Args:
+            key (tuple): Dataset name and preprocessing parameters of the training set
+            version (str): Dataset version
+            kernel (str, optional): SVC kernel name. Defaults to 'rbf'.
+            gamma (float | None, optional): Kernel coefficient. Defaults to None ("scale").
+            C (float, optional): Regularization parameter. Defaults to 1.0.
+        """
+
+        self.key        : tuple         = key
+        self.version    : str           = version
+        self.kernel     : str           = kernel
+        self.gamma      : float | None  = gamma
+        self.C          : float         = C
+
+    def fit(self, X : np.ndarray, y : np.ndarray) -> 'KernelSVC':
+
+        self.X_fit_     : np.ndarray    = X
+        self.gamma_     : float         = self.gamma if self.gamma is not None else scale_gamma(X)
+
+        self.svc_ : SVC = SVC(kernel='precomputed', C=self.C, random_state=42).fit(cache.get(self.key, self.version, X, self.kernel, self.gamma_), y)
+
+        return self
+
+    def predict(self, X : np.ndarray) -> np.ndarray:
+
+        return self.svc_.predict(pairwise_kernels(X, self.X_fit_, metric=self.kernel, **kernel_params(self.kernel, self.gamma_)))
+
+# --- Utility
+
+def scale_gamma(X : np.ndarray) -> float:
+    """Kernel coefficient of SVC(gamma='scale')
+
+    Args:
+        X (np.ndarray): Training inputs
+
+    Returns:
+        float: 1 / (features * variance)
+    """
+
+    variance : float = float(X.var())
+
+    return 1.0 / (X.shape[1] * variance) if variance != 0.0 else 1.0
+
+def kernel_params(kernel : str, gamma : float | None) -> dict:
+    """Keyword arguments of pairwise_kernels giving the kernel of SVC (whose coef0 is 0, pairwise_kernels defaults to 1)
+
+    Args:
+        kernel (str): SVC kernel name
+        gamma (float | None): Kernel coefficient
+
+    Returns:
+        dict: Kernel parameters
+    """
+
+    match kernel:
+
+        case 'rbf':     return { 'gamma': gamma }
+        case 'poly':    return { 'gamma': gamma, 'degree': 3, 'coef0': 0.0 }
+        case 'sigmoid': return { 'gamma': gamma, 'coef0': 0.0 }
+        case _:         return {}
+
+def grid_search(key : tuple, version : str, X : np.ndarray, y : np.ndarray, kernel : str, gammas : list, Cs : list, cv : int = 10) -> dict:
+    """Cross validated accuracy of support vector classifiers for every (gamma, C)
+
+    Same folds as GridSearchCV / cross_val_score with an integer "cv", but the kernel is computed once per gamma on
+    the whole training set: the fold blocks are gathered from it (no kernel evaluation) and shared by every C.
+
+    Args:
+        key (tuple): Dataset name
+        version (str): Dataset version
+        X (np.ndarray): Training inputs
+        y (np.ndarray): Training targets
+        kernel (str): SVC kernel name
+        gammas (list): Kernel coefficients ([ None ] for the linear kernel)
+        Cs (list): Regularization parameters
+        cv (int, optional): Number of folds. Defaults to 10.
+
+    Returns:
+        dict: { (gamma, C): [fold accuracies] }
+    """
+
+    folds : list = list(StratifiedKFold(n_splits=cv).split(X, y))
+
+    def score(K_train : np.ndarray, K_test : np.ndarray, y_train : np.ndarray, y_test : np.ndarray, C : float) -> float:
+
+        return float(SVC(kernel='precomputed', C=C, random_state=42).fit(K_train, y_train).score(K_test, y_test))
+
+    scores : dict = dict()
+
+    for gamma in gammas:
+
+        K : np.ndarray = cache.get(key, version, X, kernel, gamma)
+
+        blocks : list = [ (K[np.ix_(train, train)], K[np.ix_(test, train)], y[train], y[test]) for train, test in folds ]
+
+        # ? libsvm releases the GIL: threads share the blocks instead of copying them to worker processes
+
+        results : list = Parallel(n_jobs=GRAM_N_JOBS, prefer='threads')(delayed(score)(*block, C) for C in Cs for block in blocks)
+
+        for index, C in enumerate(Cs): scores[(gamma, C)] = results[index * cv:(index + 1) * cv]
+
+    return scores
+
+def landmarks(n_samples : int, budget_mb : int = KERNEL_PCA_BUDGET_MB, n_components : int = 2) -> int:
+    """Number of Nystroem landmarks fitting the memory budget
+
+    The approximate kernel PCA holds about three float64 N x landmarks blocks at once (kernel against the landmarks,
+    its normalized copy and the centered copy of the randomized eigensolver), where the exact method holds N x N.
+
+    Args:
+        n_samples (int): Number of training rows
+        budget_mb (int, optional): Memory budget in MB. Defaults to KERNEL_PCA_BUDGET_MB.
+        n_components (int, optional): Number of kept components. Defaults to 2.
+
+    Returns:
+        int: Number of landmarks, between n_components + 1 and n_samples
+    """
+
+    budget : int = budget_mb * 2 ** 20 // (3 * 8 * max(n_samples, 1))
+
+    return max(n_components + 1, min(budget, n_samples))
+
+def approximate_kernel_pca(n_samples : int, n_features : int, n_components : int = 2, budget_mb : int = KERNEL_PCA_BUDGET_MB, random_state : int = 42) -> Pipeline | KernelPCA:
+    """RBF kernel PCA approximated by Nystroem landmarks and a randomized eigensolver
+
+    Same kernel as KernelPCA(kernel='rbf') (gamma = 1 / features): PCA centers the landmark features, which is the
+    kernel centering of the exact method. Components match the exact ones up to sign and rotation, closer as the
+    budget grows. When the whole N x N kernel fits the budget the exact method is returned: with every row as a
+    landmark the approximation is slower and larger.
+
+    Args:
+        n_samples (int): Number of training rows
+        n_features (int): Number of input features
+        n_components (int, optional): Number of kept components. Defaults to 2.
+        budget_mb (int, optional): Memory budget in MB. Defaults to KERNEL_PCA_BUDGET_MB.
+        random_state (int, optional): Seed of the landmark sampling and of the eigensolver. Defaults to 42.
+
+    Returns:
+        Pipeline | KernelPCA: Unfitted transformer
+    """
+
+    n_landmarks : int = landmarks(n_samples, budget_mb, n_components)
+
+    if n_landmarks >= n_samples: return KernelPCA(n_components=n_components, kernel='rbf')
+
+    nystroem : Nystroem = Nystroem(kernel='rbf', gamma=1.0 / n_features, n_components=n_landmarks, random_state=random_state)
+
+    return Pipeline([ ('nystroem', nystroem), ('pca', PCA(n_components=n_components, svd_solver='randomized', random_state=random_state)) ])
@@ -0,0 +1,77 @@
+import importlib
+import sys
+import threading
+import types
+
+# --- Params
+
+_lock : threading.Lock = threading.Lock()
+
+class LazyModule(types.ModuleType):
+    """Module placeholder that imports the real module on first attribute access
+
+    Heavy frameworks (TensorFlow, Keras, PyTorch, XGBoost, MiniSom, Matplotlib, NLTK) are only loaded when an
+    endpoint actually uses them, so the server starts without paying their import time and memory.
+    """
+
+    def __init__(self, name : str) -> None:
+        """Constructor
+
+        Args:
+            name (str): Full module name (e.g. "keras" or "matplotlib.pyplot")
+        """
+
+        super().__init__(name)
+
+        self.__dict__['_module'] = None
+
+    def _load(self) -> types.ModuleType:
+        """Import the real module once
+
+        Returns:
+            types.ModuleType: Imported module
+        """
+
+        if self.__dict__['_module'] is None:
+
+            with _lock:
+
+                if self.__dict__['_module'] is None: self.__dict__['_module'] = importlib.import_module(self.__name__)
+
+        return self.__dict__['_module']
+
+    # >>> Override
+    def __getattr__(self, attr : str):
+
+        return getattr(self._load(), attr)
+
+    # >>> Override
+    def __dir__(self) -> list:
+
+        return dir(self._load())
+
+def lazy_import(name : str) -> types.ModuleType:
+    """Return the module if already imported, otherwise a placeholder importing it on first use
+
+    Args:
+        name (str): Full module name
+
+    Returns:
+        types.ModuleType: Module or lazy placeholder
+    """
+
+    if name in sys.modules: return sys.modules[name]
+
+    return LazyModule(name)
+
+def is_loaded(name : str) -> bool:
+    """Check if the given module has been imported
+
+    Args:
+        name (str): Full module name
+
+    Returns:
+        bool: True if imported
+    """
+
+    return name in sys.modules
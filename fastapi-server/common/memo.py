@@ -0,0 +1,192 @@
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import collections
+import functools
+import inspect
+import os
+import threading
+import time
+
+from common import telemetry
+from fastapi import Response
+from typing import Any, Callable
+
+# --- Params
+
+MEMO_CACHE_SIZE : int = int(os.environ.get('MEMO_CACHE_SIZE', '256'))
+
+MEMO_TTL_S : float = float(os.environ.get('MEMO_TTL_S', '3600')) # ? 0 = no expiration
+
+class CachedResponse:
+    """Rendered response kept by the cache (a new Response is built for every hit, headers are per request)"""
+
+    def __init__(self, response : Response) -> None:
+
+        self.body           : bytes = response.body
+        self.status_code    : int   = response.status_code
+        self.media_type     : str   = response.media_type
+
+    def response(self) -> Response:
+
+        return Response(content=self.body, status_code=self.status_code, media_type=self.media_type)
+
+class ResultCache:
+    """Bounded LRU of endpoint results with a time to live"""
+
+    def __init__(self, max_size : int = MEMO_CACHE_SIZE, ttl : float = MEMO_TTL_S) -> None:
+        """Constructor
+
+        Args:
+            max_size (int, optional): Maximum number of results. Defaults to MEMO_CACHE_SIZE.
+            ttl (float, optional): Seconds before a result expires (0 = never). Defaults to MEMO_TTL_S.
+        """
+
+        self.max_size   : int   = max_size
+        self.ttl        : float = ttl
+
+        self.hits   : int = 0
+        self.misses : int = 0
+
+        self._results : collections.OrderedDict = collections.OrderedDict()
+
+        self._computing : dict = dict()
+
+        self._lock : threading.Lock = threading.Lock()
+
+    def get(self, key : tuple, compute : Callable[[], Any], name : str = '') -> Any:
+        """Return the result for the given key, computing it once if missing or expired
+
+        Concurrent requests for the same missing key wait for a single computation.
+
+        Args:
+            key (tuple): Endpoint, dataset version and parameters
+            compute (Callable[[], Any]): Function computing the result
+            name (str, optional): Endpoint name used in the metrics. Defaults to ''.
+
+        Returns:
+            Any: Result (shared between requests, never modify it)
+        """
+
+        with self._lock:
+
+            result : Any = self._lookup(key)
+
+            if result is not None:
+
+                self.hits += 1
+
+                telemetry.event('result_cache_hit', endpoint=name)
+
+                return result[0]
+
+            compute_lock : threading.Lock = self._computing.setdefault(key, threading.Lock())
+
+        with compute_lock:
+
+            with self._lock:
+
+                result = self._lookup(key)
+
+                if result is not None: return result[0]
+
+                self.misses += 1
+
+            telemetry.event('result_cache_miss', endpoint=name)
+
+            try:
+
+                value : Any = compute()
+
+                with self._lock:
+
+                    self._results[key] = (value, time.monotonic() + self.ttl if self.ttl else None)
+
+                    while len(self._results) > self.max_size: self._results.popitem(last=False)
+
+            finally:
+
+                with self._lock: self._computing.pop(key, None) # ? Errors are not cached, the next request computes again
+
+        return value
+
+    def _lookup(self, key : tuple) -> tuple | None:
+        """Fresh entry of the given key, refreshed in the LRU order (called with the lock held)
+
+        Args:
+            key (tuple): Cache key
+
+        Returns:
+            tuple | None: (value, expiration) or None when missing or expired
+        """
+
+        entry : tuple = self._results.get(key)
+
+        if entry is None: return None
+
+        if entry[1] is not None and entry[1] < time.monotonic():
+
+            del self._results[key]
+
+            return None
+
+        self._results.move_to_end(key)
+
+        return entry
+
+    def clear(self) -> None:
+        """Remove all results"""
+
+        with self._lock: self._results.clear()
+
+    def __len__(self) -> int:
+
+        return len(self._results)
+
+cache : ResultCache = ResultCache()
+
+# --- Utility
+
+def memoize(version : Callable[..., str]) -> Callable:
+    """Memoize a deterministic endpoint by (endpoint, dataset version, parameters)
+
+    >>> @router.get(path='/linear-regression')
+    >>> @memo.memoize(lambda column, **_: dataset_version(column))
+    >>> def linear_regression(column : int = 1): ...
+
+    Args:
+        version (Callable[..., str]): Dataset version, called with the endpoint arguments
+
+    Returns:
+        Callable: Decorator keeping the endpoint signature
+    """
+
+    def decorator(endpoint : Callable) -> Callable:
+
+        signature : inspect.Signature = inspect.signature(endpoint)
+
+        name : str = endpoint.__name__
+
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+
+            arguments : inspect.BoundArguments = signature.bind(*args, **kwargs)
+
+            arguments.apply_defaults()
+
+            key : tuple = (endpoint.__module__, name, version(**arguments.arguments), tuple(sorted(arguments.arguments.items())))
+
+            def compute() -> Any:
+
+                result : Any = endpoint(*args, **kwargs)
+
+                return CachedResponse(result) if isinstance(result, Response) else result
+
+            result : Any = cache.get(key, compute, name)
+
+            return result.response() if isinstance(result, CachedResponse) else result
+
+        return wrapper
+
+    return decorator
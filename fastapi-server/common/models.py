@@ -0,0 +1,172 @@
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import collections
+import hashlib
+import joblib
+import json
+import os
+import threading
+import uuid
+
+from common import telemetry
+from typing import Any, Callable
+
+# --- Params
+
+MODEL_DIR : str = os.environ.get('MODEL_DIR', './fastapi-server/models')
+
+MODEL_CACHE_SIZE : int = int(os.environ.get('MODEL_CACHE_SIZE', '64'))
+
+class ModelRegistry:
+    """Bounded LRU of fitted models, persisted with joblib (one file per key, overwritten when the dataset changes)"""
+
+    def __init__(self, max_size : int = MODEL_CACHE_SIZE, directory : str = MODEL_DIR) -> None:
+        """Constructor
+
+        Args:
+            max_size (int, optional): Maximum number of models kept in memory. Defaults to MODEL_CACHE_SIZE.
+            directory (str, optional): Folder of the model files. Defaults to MODEL_DIR.
+        """
+
+        self.max_size   : int = max_size
+        self.directory  : str = directory
+
+        self._models : collections.OrderedDict = collections.OrderedDict()
+
+        self._fitting : dict = dict()
+
+        self._lock : threading.Lock = threading.Lock()
+
+    def get(self, key : tuple, version : str, fit : Callable[[], Any]) -> Any:
+        """Return the model for the given key, from memory, from disk or fitted once if missing or stale
+
+        Concurrent requests for the same missing key wait for a single fit.
+
+        Args:
+            key (tuple): Dataset name, algorithm and parameters (JSON serializable)
+            version (str): Dataset version
+            fit (Callable[[], Any]): Function fitting the model (the model must be picklable)
+
+        Returns:
+            Any: Fitted model (shared between requests, never refit it)
+        """
+
+        full_key : tuple = (*key, version)
+
+        with self._lock:
+
+            if full_key in self._models:
+
+                self._models.move_to_end(full_key)
+
+                telemetry.event('model_registry_hit', model=key[0])
+
+                return self._models[full_key]
+
+            fit_lock : threading.Lock = self._fitting.setdefault(full_key, threading.Lock())
+
+        with fit_lock:
+
+            with self._lock:
+
+                if full_key in self._models: return self._models[full_key]
+
+            path : str = model_path(key, self.directory)
+
+            try:
+
+                model : Any = read_model(path, version)
+
+                if model is not None:
+
+                    telemetry.event('model_registry_load', model=key[0])
+
+                else:
+
+                    telemetry.event('model_registry_miss', model=key[0])
+
+                    model = fit()
+
+                    write_model(path, version, model)
+
+                with self._lock:
+
+                    self._models[full_key] = model
+
+                    while len(self._models) > self.max_size: self._models.popitem(last=False)
+
+            finally:
+
+                with self._lock: self._fitting.pop(full_key, None) # ? A failed fit is retried by the next request
+
+        return model
+
+    def clear(self) -> None:
+        """Remove all models from memory (files are kept)"""
+
+        with self._lock: self._models.clear()
+
+    def __len__(self) -> int:
+
+        return len(self._models)
+
+registry : ModelRegistry = ModelRegistry()
+
+# --- Utility
+
+def model_path(key : tuple, directory : str = MODEL_DIR) -> str:
+    """File of the model of the given key
+
+    Args:
+        key (tuple): Dataset name, algorithm and parameters
+        directory (str, optional): Folder of the model files. Defaults to MODEL_DIR.
+
+    Returns:
+        str: Model file
+    """
+
+    digest : str = hashlib.sha1(json.dumps(key, default=str).encode()).hexdigest()[:12]
+
+    return f'{directory}/{key[0]}-{digest}.joblib'
+
+def read_model(path : str, version : str) -> Any:
+    """Read a model from disk
+
+    Args:
+        path (str): Model file
+        version (str): Expected dataset version
+
+    Returns:
+        Any: Model or None when the file is missing, unreadable or stale
+    """
+
+    if not os.path.exists(path): return None
+
+    try:
+
+        entry : dict = joblib.load(path)
+
+    except Exception:
+
+        return None # ? Truncated file or model pickled by another library version
+
+    return entry['model'] if entry.get('version') == version else None
+
+def write_model(path : str, version : str, model : Any) -> None:
+    """Write a model on disk (atomic replace, concurrent processes keep the last one)
+
+    Args:
+        path (str): Model file
+        version (str): Dataset version
+        model (Any): Fitted model
+    """
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    temp_path : str = f'{path}.{uuid.uuid4().hex}.tmp'
+
+    joblib.dump({ 'version': version, 'model': model }, temp_path)
+
+    os.replace(temp_path, path)
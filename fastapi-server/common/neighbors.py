@@ -0,0 +1,282 @@
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import collections
+import numpy as np
+import os
+import threading
+
+from common import models, snapshot, telemetry
+from sklearn.model_selection import StratifiedKFold
+from sklearn.neighbors import NearestNeighbors
+
+# --- Params
+
+NEIGHBORS_CACHE_SIZE : int = int(os.environ.get('NEIGHBORS_CACHE_SIZE', '16'))
+
+class NeighborIndex:
+    """Nearest neighbors structure of a training set (KD-tree, ball tree or brute force as chosen by scikit-learn)
+
+    The neighbors of each query set are kept for the largest k asked so far, so smaller k are slices and a whole
+    k-sweep is answered by one query. Equal distances are ordered by training row: scikit-learn leaves their order
+    unspecified (it even changes with k), so only exact ties at the k-th neighbor can change a vote.
+    """
+
+    def __init__(self, X : np.ndarray, y : np.ndarray, p : int = 2) -> None:
+        """Constructor (builds the index)
+
+        Args:
+            X (np.ndarray): Training inputs
+            y (np.ndarray): Training labels
+            p (int, optional): Minkowski power (1 = Manhattan, 2 = Euclidean). Defaults to 2.
+        """
+
+        self.index : NearestNeighbors = NearestNeighbors(metric='minkowski', p=p).fit(X)
+
+        self.classes_, self.labels = np.unique(y, return_inverse=True)
+
+        self._queries : dict = dict()
+
+        self._lock : threading.Lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+
+        return { 'index': self.index, 'classes_': self.classes_, 'labels': self.labels } # ? Query results and lock are not persisted
+
+    def __setstate__(self, state : dict) -> None:
+
+        self.__dict__.update(state)
+
+        self._queries   = dict()
+        self._lock      = threading.Lock()
+
+    def kneighbors(self, name : str, X : np.ndarray, k : int) -> np.ndarray:
+        """Training rows of the k nearest neighbors of a query set
+
+        Args:
+            name (str): Query set name (e.g. "test"), the same name must always come with the same X
+            X (np.ndarray): Query inputs
+            k (int): Number of neighbors
+
+        Returns:
+            np.ndarray: N x k training row indices, nearest first
+        """
+
+        k = min(k, self.labels.shape[0])
+
+        with self._lock:
+
+            indices : np.ndarray | None = self._queries.get(name)
+
+            if indices is None or indices.shape[1] < k:
+
+                telemetry.event('neighbors_query', index=name)
+
+                distances, indices = self.index.kneighbors(X, n_neighbors=k)
+
+                order : np.ndarray = np.lexsort((indices, distances), axis=1) # ? Distance, then training row
+
+                indices = np.take_along_axis(indices, order, axis=1)
+
+                self._queries[name] = indices
+
+        return indices[:, :k]
+
+    def predict(self, name : str, X : np.ndarray, k : int) -> np.ndarray:
+        """Majority vote of the k nearest neighbors (ties go to the smallest label, as KNeighborsClassifier)
+
+        Args:
+            name (str): Query set name
+            X (np.ndarray): Query inputs
+            k (int): Number of neighbors
+
+        Returns:
+            np.ndarray: Predicted labels
+        """
+
+        return self.sweep(name, X, [ k ])[k]
+
+    def sweep(self, name : str, X : np.ndarray, ks : list) -> dict:
+        """Predictions for several numbers of neighbors from a single query of the largest one
+
+        Args:
+            name (str): Query set name
+            X (np.ndarray): Query inputs
+            ks (list): Numbers of neighbors
+
+        Returns:
+            dict: { k: predicted labels }
+        """
+
+        return vote(self.classes_, self.labels, self.kneighbors(name, X, max(ks)), ks)
+
+class NeighborClassifier:
+    """Fitted k-nearest neighbors classifier view of an index for a fixed k (predict only)"""
+
+    def __init__(self, index : NeighborIndex, name : str, k : int) -> None:
+
+        self.index  : NeighborIndex = index
+        self.name   : str           = name
+        self.k      : int           = k
+
+    def predict(self, X : np.ndarray) -> np.ndarray:
+
+        return self.index.predict(self.name, X, self.k)
+
+class FoldNeighbors:
+    """Bounded LRU of the nearest neighbors of the test rows of every cross validation fold, shared by every number of
+    neighbors until the dataset changes
+
+    Each (fold, p) gets an in-memory index of the fold training rows, queried once for the largest k asked so far.
+    Only the neighbor lists are kept: the indexes hold a copy of the training rows, too big to keep or persist for
+    wide inputs such as bags of words.
+    """
+
+    def __init__(self, max_size : int = NEIGHBORS_CACHE_SIZE) -> None:
+        """Constructor
+
+        Args:
+            max_size (int, optional): Maximum number of (training set, p) entries. Defaults to NEIGHBORS_CACHE_SIZE.
+        """
+
+        self.max_size : int = max_size
+
+        self._neighbors : collections.OrderedDict = collections.OrderedDict()
+
+        self._locks : dict = dict()
+
+        self._lock : threading.Lock = threading.Lock()
+
+    def get(self, key : tuple, version : str, X : np.ndarray, y : np.ndarray, folds : list, p : int, k : int) -> list:
+        """Neighbors of the test rows of every fold, searched once per (dataset version, folds, p) for the largest k
+
+        Args:
+            key (tuple): Dataset name and preprocessing parameters (the same key must always come with the same X and folds)
+            version (str): Dataset version
+            X (np.ndarray): Training inputs
+            y (np.ndarray): Training labels
+            folds (list): (train, test) row indices of every fold
+            p (int): Minkowski power
+            k (int): Number of neighbors
+
+        Returns:
+            list: One (test rows x k) array per fold of fold training rows, nearest first
+        """
+
+        full_key : tuple = (*key, len(folds), p, version)
+
+        with self._lock: entry_lock : threading.Lock = self._locks.setdefault(full_key, threading.Lock())
+
+        with entry_lock:
+
+            with self._lock:
+
+                neighbors : list | None = self._neighbors.get(full_key)
+
+                if neighbors is not None: self._neighbors.move_to_end(full_key)
+
+            if neighbors is None or neighbors[0].shape[1] < min(k, len(folds[0][0])):
+
+                telemetry.event('fold_neighbors_miss', p=p)
+
+                neighbors = [ NeighborIndex(X[train], y[train], p).kneighbors('test', X[test], k) for train, test in folds ]
+
+            else:
+
+                telemetry.event('fold_neighbors_hit', p=p)
+
+            with self._lock:
+
+                self._neighbors[full_key] = neighbors
+
+                while len(self._neighbors) > self.max_size:
+
+                    evicted, _ = self._neighbors.popitem(last=False)
+
+                    self._locks.pop(evicted, None)
+
+        return [ indices[:, :k] for indices in neighbors ]
+
+    def clear(self) -> None:
+        """Remove all neighbor lists"""
+
+        with self._lock: self._neighbors.clear()
+
+    def __len__(self) -> int:
+
+        return len(self._neighbors)
+
+registry : models.ModelRegistry = models.ModelRegistry(max_size=NEIGHBORS_CACHE_SIZE, directory=snapshot.SNAPSHOT_DIR) # ? Persisted next to the dataset snapshots
+
+folds_cache : FoldNeighbors = FoldNeighbors()
+
+# --- Utility
+
+def index(key : tuple, version : str, X : np.ndarray, y : np.ndarray, p : int = 2) -> NeighborIndex:
+    """Neighbor index of a training set, built once per dataset version and persisted
+
+    Args:
+        key (tuple): Dataset name and preprocessing parameters
+        version (str): Dataset version
+        X (np.ndarray): Training inputs
+        y (np.ndarray): Training labels
+        p (int, optional): Minkowski power. Defaults to 2.
+
+    Returns:
+        NeighborIndex: Neighbor index
+    """
+
+    return registry.get(('neighbors', *key, p), version, lambda: NeighborIndex(X, y, p))
+
+def vote(classes_ : np.ndarray, labels : np.ndarray, indices : np.ndarray, ks : list) -> dict:
+    """Majority votes of the nearest neighbors for several numbers of neighbors (ties go to the smallest label, as KNeighborsClassifier)
+
+    Args:
+        classes_ (np.ndarray): Sorted labels
+        labels (np.ndarray): Class position of every training row
+        indices (np.ndarray): N x k training rows, nearest first
+        ks (list): Numbers of neighbors
+
+    Returns:
+        dict: { k: predicted labels }
+    """
+
+    votes : np.ndarray = np.cumsum(np.eye(classes_.shape[0], dtype='int32')[labels[indices]], axis=1) # ? N x k x classes
+
+    return { k: classes_[np.argmax(votes[:, min(k, indices.shape[1]) - 1], axis=1)] for k in ks }
+
+def grid_search(key : tuple, version : str, X : np.ndarray, y : np.ndarray, ks : list, ps : list, cv : int = 10) -> dict:
+    """Cross validated accuracy of k-nearest neighbors classifiers for every (k, p)
+
+    Same folds as GridSearchCV / cross_val_score with an integer "cv", but the neighbors of each fold are searched
+    once per p for the largest k (see FoldNeighbors) and sliced for the others.
+
+    Args:
+        key (tuple): Dataset name and preprocessing parameters
+        version (str): Dataset version
+        X (np.ndarray): Training inputs
+        y (np.ndarray): Training labels
+        ks (list): Numbers of neighbors
+        ps (list): Minkowski powers
+        cv (int, optional): Number of folds. Defaults to 10.
+
+    Returns:
+        dict: { (k, p): [fold accuracies] }
+    """
+
+    folds : list = list(StratifiedKFold(n_splits=cv).split(X, y))
+
+    scores : dict = dict()
+
+    for p in ps:
+
+        for (train, test), indices in zip(folds, folds_cache.get(key, version, X, y, folds, p, max(ks))):
+
+            classes_, labels = np.unique(y[train], return_inverse=True)
+
+            predictions : dict = vote(classes_, labels, indices, ks)
+
+            for k in ks: scores.setdefault((k, p), []).append(float(np.mean(predictions[k] == y[test])))
+
+    return scores
@@ -0,0 +1,232 @@
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import collections
+import numpy as np
+import os
+import threading
+
+from common import telemetry
+from scipy.linalg import solve_triangular
+from typing import Callable
+
+# --- Params
+
+ONLINE_CACHE_SIZE : int = int(os.environ.get('ONLINE_CACHE_SIZE', '16'))
+
+class RecursiveLeastSquares:
+    """Least squares polynomial updated one point at a time in O(features²) (Sherman-Morrison update of the inverse Gram matrix)
+
+    Inputs are mapped to [-1, 1] with the range of the first fit (later points may fall outside, the fit stays exact).
+    """
+
+    def __init__(self, degree : int) -> None:
+        """Constructor
+
+        Args:
+            degree (int): Polynomial degree (1 = linear regression)
+        """
+
+        self.degree : int = degree
+
+        self.low    : float = 0.0
+        self.span   : float = 1.0
+
+        self.coef_  : np.ndarray = np.zeros(degree + 1)
+        self.P      : np.ndarray = np.eye(degree + 1) # ? (V^T V)^-1
+
+        self.n_samples_ : int = 0
+
+    def features(self, X : np.ndarray) -> np.ndarray:
+        """Vandermonde matrix of the scaled inputs
+
+        Args:
+            X (np.ndarray): Inputs (N or N x 1)
+
+        Returns:
+            np.ndarray: N x (degree + 1) increasing powers
+        """
+
+        t : np.ndarray = (2.0 * (np.ravel(X).astype('float64') - self.low) - self.span) / self.span
+
+        return np.vander(t, self.degree + 1, increasing=True)
+
+    def fit(self, X : np.ndarray, y : np.ndarray) -> 'RecursiveLeastSquares':
+        """Batch least squares on the initial points (QR factorization)
+
+        Args:
+            X (np.ndarray): Inputs (N or N x 1)
+            y (np.ndarray): Values (N or N x 1)
+
+        Returns:
+            RecursiveLeastSquares: Self
+        """
+
+        x : np.ndarray = np.ravel(X).astype('float64')
+        y = np.ravel(y).astype('float64')
+
+        self.low    = float(x.min()) if x.size else 0.0
+        self.span   = max(float(x.max()) - self.low, 1.0) if x.size else 1.0
+
+        self.n_samples_ = x.size
+
+        if x.size <= self.degree:
+
+            # ? Not enough points to solve: classic RLS start (large P, no coefficients) then one update per point
+
+            self.coef_  = np.zeros(self.degree + 1)
+            self.P      = np.eye(self.degree + 1) * 1e8
+
+            self.n_samples_ = 0
+
+            for value, target in zip(x, y): self.update(value, target)
+
+            return self
+
+        Q, R = np.linalg.qr(self.features(x))
+
+        self.coef_ = solve_triangular(R, Q.T @ y)
+
+        R_inv : np.ndarray = solve_triangular(R, np.eye(self.degree + 1))
+
+        self.P = R_inv @ R_inv.T
+
+        return self
+
+    def update(self, x : float, y : float) -> None:
+        """Add one point
+
+        Args:
+            x (float): Input
+            y (float): Value
+        """
+
+        v : np.ndarray = self.features(np.array([ x ]))[0]
+
+        Pv : np.ndarray = self.P @ v
+
+        gain : np.ndarray = Pv / (1.0 + v @ Pv)
+
+        self.coef_  = self.coef_ + gain * (float(y) - v @ self.coef_)
+        self.P      = self.P - np.outer(gain, Pv)
+
+        self.n_samples_ += 1
+
+    def predict(self, X : np.ndarray) -> np.ndarray:
+
+        return self.features(X) @ self.coef_
+
+class OnlineSeries:
+    """Growing series and its recursive least squares fits, synchronized with the rows appended since the last seen key
+
+    Rows are only appended: a change of older rows is not seen by the fits.
+    """
+
+    def __init__(self, name : str) -> None:
+
+        self.name : str = name
+
+        self.X : np.ndarray = np.empty(0, dtype='int64')
+        self.y : np.ndarray = np.empty(0, dtype='float64')
+
+        self.last : int | None = None # ? Greatest key seen
+
+        self.version : str | None = None # ? Dataset version of the last synchronization
+
+        self.models : dict = dict()
+
+        self.lock : threading.Lock = threading.Lock()
+
+    def sync(self, fetch : Callable[[int | None], tuple], version : str | None = None) -> int:
+        """Fetch the rows newer than the last seen key and update every fit with them (call with the lock held)
+
+        Args:
+            fetch (Callable[[int | None], tuple]): Function returning (X, y) of the rows with a key greater than the given one (all rows for None), sorted by key
+            version (str | None, optional): Dataset version, nothing is fetched while it is the one of the last synchronization. Defaults to None (always fetch).
+
+        Returns:
+            int: Number of new rows
+        """
+
+        if version is not None and version == self.version:
+
+            telemetry.event('online_sync_hit', series=self.name)
+
+            return 0
+
+        X, y = fetch(self.last)
+
+        self.version = version
+
+        if len(X) == 0:
+
+            telemetry.event('online_sync_hit', series=self.name)
+
+            return 0
+
+        telemetry.event('online_sync_update', series=self.name)
+
+        X = np.asarray(X, dtype='int64')
+        y = np.asarray(y, dtype='float64')
+
+        with telemetry.span(telemetry.Stage.Fit):
+
+            for model in self.models.values():
+
+                for value, target in zip(X, y): model.update(value, target)
+
+        self.X = np.concatenate([ self.X, X ])
+        self.y = np.concatenate([ self.y, y ])
+
+        self.last = int(self.X.max())
+
+        return len(X)
+
+    def model(self, degree : int) -> RecursiveLeastSquares:
+        """Fit of the given degree, fitted on the rows seen so far the first time (call with the lock held)
+
+        Args:
+            degree (int): Polynomial degree
+
+        Returns:
+            RecursiveLeastSquares: Fit kept up to date by sync
+        """
+
+        if degree not in self.models:
+
+            with telemetry.span(telemetry.Stage.Fit): self.models[degree] = RecursiveLeastSquares(degree).fit(self.X, self.y)
+
+        return self.models[degree]
+
+_series : collections.OrderedDict = collections.OrderedDict() # ? Bounded LRU, an evicted series is fetched again on next use
+
+_lock : threading.Lock = threading.Lock()
+
+# --- Utility
+
+def series(key : tuple) -> OnlineSeries:
+    """Online series of the given key, created empty on first use (callers check the key, e.g. a known column)
+
+    >>> with (s := online.series(('regression', column))).lock: s.sync(fetch, version); model = s.model(degree)
+
+    Args:
+        key (tuple): Dataset name and series parameters
+
+    Returns:
+        OnlineSeries: Online series
+    """
+
+    with _lock:
+
+        if key in _series:
+
+            _series.move_to_end(key)
+
+            return _series[key]
+
+        _series[key] = OnlineSeries(str(key[0]))
+
+        while len(_series) > ONLINE_CACHE_SIZE: _series.popitem(last=False)
+
+        return _series[key]
@@ -0,0 +1,50 @@
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import multiprocessing
+import os
+import threading
+
+from concurrent.futures import ProcessPoolExecutor
+
+# --- Params
+
+POOL_MAX_WORKERS : int = int(os.environ.get('POOL_MAX_WORKERS', '0')) # ? 0 = number of CPUs
+
+_executor : ProcessPoolExecutor | None = None
+
+_lock : threading.Lock = threading.Lock()
+
+# --- Utility
+
+def executor() -> ProcessPoolExecutor:
+    """Process pool shared by the endpoints training several models at once, started on first use
+
+    Workers are spawned (TensorFlow and PyTorch are not fork-safe) and kept alive between requests. Submitted
+    functions must be defined at module level: workers import them by name.
+
+    Returns:
+        ProcessPoolExecutor: Process pool
+    """
+
+    global _executor
+
+    with _lock:
+
+        if _executor is None:
+
+            _executor = ProcessPoolExecutor(max_workers=POOL_MAX_WORKERS or os.cpu_count(), mp_context=multiprocessing.get_context('spawn'))
+
+        return _executor
+
+def shutdown() -> None:
+    """Stop the worker processes"""
+
+    global _executor
+
+    with _lock:
+
+        if _executor is not None: _executor.shutdown(wait=False, cancel_futures=True)
+
+        _executor = None
@@ -0,0 +1,220 @@
+import numpy as np
+import orjson
+import pandas as pd
+import shutil
+import tempfile
+import time
+
+from common import telemetry
+from common.telemetry import Stage
+from enum import StrEnum
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, create_model
+from typing import BinaryIO, Callable, List
+
+# --- Params
+
+CHUNK_SIZE : int = 1000 # ? Rows per NDJSON chunk (and per CSV chunk when scoring files)
+
+UPLOAD_SPOOL_MB : int = 16 # ? Uploaded files larger than this are copied to a temporary file on disk
+
+class Layout(StrEnum):
+
+    Rows    = 'rows'    # ? [ { "x": ..., "y": ... }, ... ] (default, same shape as the response models)
+    Columns = 'columns' # ? { "x": [ ... ], "y": [ ... ] }
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered by orjson: NumPy arrays are serialized natively and no response model validation is done
+
+    >>> return responses.FastJSONResponse(responses.table(layout, x=handle.dates, y=values))
+    """
+
+    # >>> Override
+    def render(self, content) -> bytes:
+
+        with telemetry.span(Stage.Serialize): return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+# --- Utility
+
+def columns_model(model : type[BaseModel]) -> type[BaseModel]:
+    """Model of the columnar layout of a row model (same fields, one list each), documents layout=columns
+
+    >>> PointColumns : type[BaseModel] = responses.columns_model(PointData)
+
+    Args:
+        model (type[BaseModel]): Row model
+
+    Returns:
+        type[BaseModel]: "<Model>Columns" model
+    """
+
+    return create_model(f'{model.__name__}Columns', __module__=model.__module__, **{ name: (List[field.annotation], ...) for name, field in model.model_fields.items() })
+
+def ndjson(model : type[BaseModel]) -> dict:
+    """OpenAPI responses of an endpoint streaming its rows as NDJSON (stream=true), next to its JSON response model
+
+    Args:
+        model (type[BaseModel]): Row model
+
+    Returns:
+        dict: "responses" argument of the route
+    """
+
+    return { 200: { 'content': { 'application/x-ndjson': { 'schema': model.model_json_schema() } } } }
+
+def column(values) -> np.ndarray | list:
+    """Flat column serializable by orjson
+
+    Args:
+        values (np.ndarray | list | tuple): Column values (N or N x 1)
+
+    Returns:
+        np.ndarray | list: Contiguous numeric array, or list for any other dtype (e.g. strings, objects)
+    """
+
+    array : np.ndarray = np.ravel(values)
+
+    if array.dtype.kind in 'biuf': return np.ascontiguousarray(array)
+
+    return array.tolist()
+
+@telemetry.span(Stage.Serialize)
+def table(layout : Layout, **columns) -> list | dict:
+    """Response content of equally long columns
+
+    Args:
+        layout (Layout): Rows (list of objects) or columns (object of lists)
+        columns (dict): Column name => values
+
+    Returns:
+        list | dict: Response content
+    """
+
+    columns = { name: column(values) for name, values in columns.items() }
+
+    if layout == Layout.Columns: return columns
+
+    return records(columns)
+
+def records(columns : dict) -> list:
+    """Rows of flat columns
+
+    Args:
+        columns (dict): Column name => flat values (see column)
+
+    Returns:
+        list: [ { name: value } ]
+    """
+
+    names : list = list(columns)
+
+    values : list = [ value.tolist() if isinstance(value, np.ndarray) else value for value in columns.values() ]
+
+    return [ dict(zip(names, row)) for row in zip(*values) ]
+
+def stream(**columns) -> StreamingResponse:
+    """NDJSON response of equally long columns, one object per line, rendered in chunks of CHUNK_SIZE rows
+
+    Args:
+        columns (dict): Column name => values
+
+    Returns:
+        StreamingResponse: "application/x-ndjson" response
+    """
+
+    columns = { name: column(values) for name, values in columns.items() }
+
+    size : int = min((len(values) for values in columns.values()), default=0)
+
+    def lines():
+
+        for start in range(0, size, CHUNK_SIZE):
+
+            chunk : list = records({ name: values[start : start + CHUNK_SIZE] for name, values in columns.items() })
+
+            yield b''.join(orjson.dumps(row, option=orjson.OPT_APPEND_NEWLINE) for row in chunk)
+
+    return StreamingResponse(lines(), media_type='application/x-ndjson')
+
+def spool(upload : BinaryIO) -> BinaryIO:
+    """Copy of an uploaded file owned by the caller, still open when a streamed response reads it
+
+    Args:
+        upload (BinaryIO): Uploaded file (e.g. "UploadFile.file")
+
+    Returns:
+        BinaryIO: Copy positioned at its start, in memory up to UPLOAD_SPOOL_MB and on disk beyond
+    """
+
+    copy : BinaryIO = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MB * 2 ** 20)
+
+    upload.seek(0)
+
+    shutil.copyfileobj(upload, copy)
+
+    copy.seek(0)
+
+    return copy
+
+def score_csv(source : BinaryIO, columns : list, score : Callable[[pd.DataFrame], dict], name : str, chunk_rows : int = CHUNK_SIZE) -> StreamingResponse:
+    """NDJSON scores of a CSV file read and scored chunk by chunk, so memory does not grow with the file
+
+    One object per row ({ "row": index, score columns }), then { "rows", "seconds", "rows_per_second" }. A chunk
+    that cannot be parsed or scored ends the stream with { "error", "row" } before the summary.
+
+    Args:
+        source (BinaryIO): CSV file (closed at the end of the stream)
+        columns (list): Required columns (the others are skipped)
+        score (Callable[[pd.DataFrame], dict]): Function returning the score columns of a chunk
+        name (str): Scoring name (telemetry label)
+        chunk_rows (int, optional): Rows per chunk. Defaults to CHUNK_SIZE.
+
+    Raises:
+        ValueError: Unreadable CSV or missing columns (checked before streaming)
+
+    Returns:
+        StreamingResponse: "application/x-ndjson" response
+    """
+
+    try:
+
+        reader = pd.read_csv(source, usecols=columns, chunksize=chunk_rows)
+
+    except Exception:
+
+        source.close()
+
+        raise
+
+    def lines():
+
+        start   : float = time.perf_counter()
+        rows    : int   = 0
+
+        try:
+
+            for chunk in reader:
+
+                with telemetry.span(Stage.Predict): scores : dict = score(chunk)
+
+                yield b''.join(orjson.dumps(row, option=orjson.OPT_APPEND_NEWLINE) for row in records({ 'row': np.arange(rows, rows + len(chunk)), **{ key: column(values) for key, values in scores.items() } }))
+
+                rows += len(chunk)
+
+        except Exception as error: # ? Parser errors and values the model cannot handle (e.g. unseen categories), the headers are already sent
+
+            yield orjson.dumps({ 'error': str(error), 'row': rows }, option=orjson.OPT_APPEND_NEWLINE)
+
+        finally:
+
+            reader.close()
+
+            source.close()
+
+        seconds : float = time.perf_counter() - start
+
+        telemetry.events_total.increment(rows, event='csv_scored_rows', scoring=name)
+
+        yield orjson.dumps({ 'rows': rows, 'seconds': seconds, 'rows_per_second': rows / seconds if seconds > 0 else 0.0 }, option=orjson.OPT_APPEND_NEWLINE)
+
+    return StreamingResponse(lines(), media_type='application/x-ndjson')
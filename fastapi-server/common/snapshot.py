@@ -0,0 +1,275 @@
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import hashlib
+import json
+import numpy as np
+import os
+import pandas as pd
+import shutil
+import threading
+import time
+import uuid
+
+from common import database, telemetry
+from common.database import CollectionName
+
+# --- Params
+
+SNAPSHOT_DIR : str = os.environ.get('SNAPSHOT_DIR', './fastapi-server/cache')
+
+SNAPSHOT_KEEP_S : float = float(os.environ.get('SNAPSHOT_KEEP_S', '3600')) # ? Age after which the versions replaced by a newer one are removed
+
+SNAPSHOT_FORMAT : int = 2 # ? Part of the version folder name, bumped when the file layout changes (older folders are pruned)
+
+FINGERPRINT_TTL_S : float = float(os.environ.get('FINGERPRINT_TTL_S', '5')) # ? Longest delay before a change made outside the server is seen (0 = query every time)
+
+_fingerprints : dict = dict() # ? (collection, filter) => (fingerprint, expiry)
+
+_fingerprints_lock : threading.Lock = threading.Lock()
+
+# --- Utility
+
+def snapshot_path(name : CollectionName, filter : dict | None = None, projection : list | None = None) -> str:
+    """Folder of the snapshot of the given collection (and query filter and projection)
+
+    Args:
+        name (CollectionName): Collection name
+        filter (dict | None, optional): MongoDB query filter. Defaults to None.
+        projection (list | None, optional): Fields to read. Defaults to None.
+
+    Returns:
+        str: Snapshot folder
+    """
+
+    if not filter and not projection: return f'{SNAPSHOT_DIR}/{name}'
+
+    query : dict | list = filter if not projection else [ filter or {}, projection ] # ? Same folder as before for filters alone
+
+    digest : str = hashlib.sha1(json.dumps(query, sort_keys=True, default=str).encode()).hexdigest()[:12]
+
+    return f'{SNAPSHOT_DIR}/{name}-{digest}'
+
+def fingerprint(name : CollectionName, filter : dict | None = None) -> str:
+    """Cheap version of the collection: number of documents plus the greatest "_id"
+
+    The fingerprint is kept FINGERPRINT_TTL_S seconds, so repeated requests do not query MongoDB (see invalidate for
+    the collections written by the server).
+
+    Args:
+        name (CollectionName): Collection name
+        filter (dict | None, optional): MongoDB query filter. Defaults to None.
+
+    Returns:
+        str: Fingerprint
+    """
+
+    key : tuple = (str(name), json.dumps(filter, sort_keys=True, default=str) if filter else '')
+
+    now : float = time.monotonic()
+
+    with _fingerprints_lock: cached : tuple | None = _fingerprints.get(key)
+
+    if cached is not None and cached[1] > now:
+
+        telemetry.event('fingerprint_hit', collection=name)
+
+        return cached[0]
+
+    telemetry.event('fingerprint_miss', collection=name)
+
+    with telemetry.span(telemetry.Stage.Fetch):
+
+        collection = database.get_collection(name)
+
+        count : int = collection.count_documents(filter or {})
+
+        last : list = list(collection.find(filter or {}, { '_id': 1 }).sort('_id', -1).limit(1))
+
+    version : str = f'{count}-{last[0]["_id"] if last else ""}'
+
+    if FINGERPRINT_TTL_S > 0:
+
+        with _fingerprints_lock: _fingerprints[key] = (version, now + FINGERPRINT_TTL_S)
+
+    return version
+
+def invalidate(name : CollectionName) -> None:
+    """Forget the fingerprints of a collection (all filters) after the server has written it
+
+    Args:
+        name (CollectionName): Collection name
+    """
+
+    with _fingerprints_lock:
+
+        for key in [ key for key in _fingerprints if key[0] == str(name) ]: del _fingerprints[key]
+
+def version_path(path : str, version : str) -> str:
+    """Folder of one version of a snapshot
+
+    Every version has its own folder, published once and never rewritten: readers of any process can load it while
+    a newer version is written next to it.
+
+    Args:
+        path (str): Snapshot folder
+        version (str): Fingerprint
+
+    Returns:
+        str: Version folder
+    """
+
+    return f'{path}/{hashlib.sha1(f"{SNAPSHOT_FORMAT}:{version}".encode()).hexdigest()[:12]}'
+
+def read_snapshot(path : str, version : str) -> pd.DataFrame | None:
+    """Read a snapshot from disk, numeric columns are memory-mapped
+
+    Nothing is unpickled: a file written in SNAPSHOT_DIR by someone else can not run code in the server.
+
+    Args:
+        path (str): Snapshot folder
+        version (str): Expected fingerprint
+
+    Returns:
+        pd.DataFrame | None: Data or None when the snapshot is missing or stale
+    """
+
+    path = version_path(path, version)
+
+    if not os.path.exists(f'{path}/meta.json'): return None
+
+    with open(f'{path}/meta.json', 'r') as file: meta : dict = json.load(file)
+
+    if meta['fingerprint'] != version: return None
+
+    data : dict = dict()
+
+    for index, column in enumerate(meta['columns']):
+
+        if column['dtype'] == 'object':
+
+            with open(f'{path}/{index}.json', 'r') as file: data[column['name']] = pd.Series(json.load(file), dtype=object).to_numpy()
+
+        else:
+
+            data[column['name']] = np.load(f'{path}/{index}.npy', mmap_mode='r', allow_pickle=False)
+
+    return pd.DataFrame(data, columns=[column['name'] for column in meta['columns']], copy=False)
+
+def write_snapshot(path : str, version : str, df : pd.DataFrame) -> None:
+    """Write a snapshot version on disk as one ".npy" file per column (".json" for object columns such as strings),
+    published by a single atomic rename
+
+    Args:
+        path (str): Snapshot folder
+        version (str): Fingerprint
+        df (pd.DataFrame): Data
+    """
+
+    os.makedirs(path, exist_ok=True)
+
+    temp_path : str = f'{path}/{uuid.uuid4().hex}.tmp'
+
+    os.makedirs(temp_path)
+
+    columns : list = []
+
+    for index, column in enumerate(df.columns):
+
+        values : np.ndarray = df[column].to_numpy()
+
+        if values.dtype == object:
+
+            with open(f'{temp_path}/{index}.json', 'w') as file: json.dump(values.tolist(), file, default=str)
+
+        else:
+
+            np.save(f'{temp_path}/{index}.npy', values, allow_pickle=False)
+
+        columns.append({ 'name': str(column), 'dtype': 'object' if values.dtype == object else str(values.dtype) })
+
+    with open(f'{temp_path}/meta.json', 'w') as file: json.dump({ 'fingerprint': version, 'columns': columns }, file)
+
+    try:
+
+        os.rename(temp_path, version_path(path, version)) # ? Fails when the folder exists: never replaces a published version
+
+    except OSError:
+
+        shutil.rmtree(temp_path, ignore_errors=True) # ? Another process has already written this version
+
+    prune_snapshot(path, version)
+
+def prune_snapshot(path : str, version : str) -> None:
+    """Remove the other versions (and abandoned temporary folders) older than SNAPSHOT_KEEP_S
+
+    Readers only open the version matching the current fingerprint, so a replaced version is only read by the
+    requests that were already loading it when it was replaced.
+
+    Args:
+        path (str): Snapshot folder
+        version (str): Fingerprint of the version to keep
+    """
+
+    current : str = os.path.basename(version_path(path, version))
+
+    for entry in os.scandir(path):
+
+        if entry.name == current or not entry.is_dir(): continue
+
+        try:
+
+            if time.time() - entry.stat().st_mtime > SNAPSHOT_KEEP_S: shutil.rmtree(entry.path, ignore_errors=True)
+
+        except OSError:
+
+            pass # ? Removed by another process
+
+@telemetry.span(telemetry.Stage.Fetch)
+def load_dataframe(name : CollectionName, filter : dict | None = None, version : str | None = None, projection : list | None = None) -> pd.DataFrame:
+    """Load the documents of a collection (without "_id") from the local snapshot
+
+    MongoDB is only read again when the fingerprint of the collection has changed.
+
+    Args:
+        name (CollectionName): Collection name
+        filter (dict | None, optional): MongoDB query filter. Defaults to None.
+        version (str | None, optional): Fingerprint already computed by the caller. Defaults to None.
+        projection (list | None, optional): Fields to read (all when None). Defaults to None.
+
+    Returns:
+        pd.DataFrame: Data
+    """
+
+    path : str = snapshot_path(name, filter, projection)
+
+    version = version or fingerprint(name, filter)
+
+    df : pd.DataFrame | None = read_snapshot(path, version)
+
+    if df is not None:
+
+        telemetry.event('snapshot_hit', collection=name)
+
+        return df
+
+    telemetry.event('snapshot_miss', collection=name)
+
+    # * Read from MongoDB
+
+    cursor = database.get_collection(name).find(filter or {}, { '_id': 0, **{ field: 1 for field in projection or [] } })
+
+    df = pd.DataFrame(list(cursor), columns=projection)
+
+    cursor.close()
+
+    # * Store
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+
+    write_snapshot(path, version, df)
+
+    snapshot : pd.DataFrame | None = read_snapshot(path, version)
+
+    return snapshot if snapshot is not None else df
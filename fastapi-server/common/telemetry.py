@@ -0,0 +1,323 @@
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import asyncio
+import bisect
+import contextlib
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+
+from common import utility
+from fastapi import HTTPException
+from fastapi.routing import APIRoute
+
+# --- Params
+
+TELEMETRY_SLOW_MS : float = float(os.environ.get('TELEMETRY_SLOW_MS', '0')) # ? Log the stage breakdown of slower requests (0 = disabled)
+
+BUCKETS : tuple = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Stage:
+
+    Fetch           = 'fetch'           # ? MongoDB reads and local snapshots
+    Preprocess      = 'preprocess'      # ? Dataset preparation (encoding, scaling, splitting, text cleaning)
+    Fit             = 'fit'
+    Predict         = 'predict'
+    ModelSelection  = 'model-selection' # ? Cross validation and grid search
+    Endpoint        = 'endpoint'        # ? Endpoint code outside the other stages
+    Serialize       = 'serialize'       # ? Request validation, response model and JSON rendering
+
+class Histogram:
+    """Prometheus histogram with labels"""
+
+    def __init__(self, name : str, description : str, buckets : tuple = BUCKETS) -> None:
+
+        self.name           : str   = name
+        self.description    : str   = description
+        self.buckets        : tuple = buckets
+
+        self._series : dict = dict()
+
+        self._lock : threading.Lock = threading.Lock()
+
+    def observe(self, value : float, **labels) -> None:
+        """Record a value
+
+        Args:
+            value (float): Observed value (seconds)
+            labels (dict): Label values
+        """
+
+        key : tuple = tuple(sorted(labels.items()))
+
+        index : int = bisect.bisect_left(self.buckets, value)
+
+        with self._lock:
+
+            series : list = self._series.setdefault(key, [ [0] * len(self.buckets), 0.0, 0 ])
+
+            if index < len(self.buckets): series[0][index] += 1
+
+            series[1] += value
+            series[2] += 1
+
+    def counts(self) -> dict:
+        """Number of observations of every label set
+
+        Returns:
+            dict: { sorted (name, value) pairs: count }
+        """
+
+        with self._lock: return { key: count for key, (_, _, count) in self._series.items() }
+
+    def render(self) -> list:
+        """Prometheus text lines"""
+
+        lines : list = [ f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram' ]
+
+        with self._lock: series : dict = { key: (list(counts), total, count) for key, (counts, total, count) in self._series.items() }
+
+        for key, (counts, total, count) in sorted(series.items()):
+
+            cumulative : int = 0
+
+            for bound, bucket in zip(self.buckets, counts):
+
+                cumulative += bucket
+
+                lines.append(f'{self.name}_bucket{format_labels(key + (("le", f"{bound:g}"),))} {cumulative}')
+
+            lines.append(f'{self.name}_bucket{format_labels(key + (("le", "+Inf"),))} {count}')
+            lines.append(f'{self.name}_sum{format_labels(key)} {total:.6f}')
+            lines.append(f'{self.name}_count{format_labels(key)} {count}')
+
+        return lines
+
+class Counter:
+    """Prometheus counter with labels"""
+
+    def __init__(self, name : str, description : str) -> None:
+
+        self.name           : str = name
+        self.description    : str = description
+
+        self._series : dict = dict()
+
+        self._lock : threading.Lock = threading.Lock()
+
+    def increment(self, amount : float = 1.0, **labels) -> None:
+
+        key : tuple = tuple(sorted(labels.items()))
+
+        with self._lock: self._series[key] = self._series.get(key, 0.0) + amount
+
+    def render(self) -> list:
+        """Prometheus text lines"""
+
+        lines : list = [ f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter' ]
+
+        with self._lock: series : dict = dict(self._series)
+
+        for key, value in sorted(series.items()): lines.append(f'{self.name}{format_labels(key)} {value:g}')
+
+        return lines
+
+class Frame:
+    """Running span: its own duration excludes the nested spans"""
+
+    def __init__(self, stage : str, route : str, root : 'Frame | None' = None) -> None:
+
+        self.stage      : str   = stage
+        self.route      : str   = route
+        self.root       : Frame = root or self
+        self.children   : float = 0.0
+        self.stages     : dict  = dict() # ? Only filled on the root: self time per stage of the whole request
+
+stage_seconds : Histogram = Histogram('learningai_stage_duration_seconds', 'Time spent in each stage of a request (nested stages excluded)')
+
+request_seconds : Histogram = Histogram('learningai_request_duration_seconds', 'Time spent handling a request (routing and middlewares excluded)')
+
+requests_total : Counter = Counter('learningai_requests_total', 'Handled requests')
+
+events_total : Counter = Counter('learningai_events_total', 'Internal events (e.g. cache hits and misses)')
+
+_current : contextvars.ContextVar = contextvars.ContextVar('telemetry_frame', default=None)
+
+# --- Utility
+
+def format_labels(key : tuple) -> str:
+    """Prometheus label set
+
+    Args:
+        key (tuple): Sorted (name, value) pairs
+
+    Returns:
+        str: e.g. {route="/x",stage="fit"} (empty string without labels)
+    """
+
+    if not key: return ''
+
+    escaped : list = [ (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for name, value in key ]
+
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+@contextlib.contextmanager
+def span(stage : str):
+    """Time a stage of the current request (usable as context manager or decorator)
+
+    Args:
+        stage (str): Stage name (see Stage)
+    """
+
+    parent : Frame = _current.get()
+
+    frame : Frame = Frame(stage, parent.route, parent.root) if parent is not None else Frame(stage, '')
+
+    token = _current.set(frame)
+
+    start : float = time.perf_counter()
+
+    try:
+
+        yield frame
+
+    finally:
+
+        elapsed : float = time.perf_counter() - start
+
+        _current.reset(token)
+
+        own : float = max(0.0, elapsed - frame.children)
+
+        stage_seconds.observe(own, route=frame.route, stage=stage)
+
+        frame.root.stages[stage] = frame.root.stages.get(stage, 0.0) + own
+
+        if parent is not None: parent.children += elapsed
+
+def event(name : str, **labels) -> None:
+    """Count an internal event
+
+    Args:
+        name (str): Event name (e.g. "dataset_cache_hit")
+        labels (dict): Extra labels
+    """
+
+    events_total.increment(event=name, **labels)
+
+def render() -> str:
+    """All metrics in Prometheus text format
+
+    Returns:
+        str: Exposition text
+    """
+
+    lines : list = []
+
+    for metric in (request_seconds, requests_total, stage_seconds, events_total): lines.extend(metric.render())
+
+    return '\n'.join(lines) + '\n'
+
+def timed_endpoint(endpoint):
+    """Wrap an endpoint in an "endpoint" span, keeping the signature read by FastAPI
+
+    Args:
+        endpoint (Callable): Endpoint function
+
+    Returns:
+        Callable: Wrapped endpoint (the endpoint itself when already wrapped)
+    """
+
+    if getattr(endpoint, '__timed__', False): return endpoint # ? include_router rebuilds the routes from their wrapped endpoints
+
+    if asyncio.iscoroutinefunction(endpoint):
+
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+
+            with span(Stage.Endpoint): return await endpoint(*args, **kwargs)
+
+    else:
+
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+
+            with span(Stage.Endpoint): return endpoint(*args, **kwargs)
+
+    wrapper.__signature__ = inspect.signature(endpoint, eval_str=True) # ? Resolve string annotations in the endpoint module
+
+    wrapper.__timed__ = True
+
+    return wrapper
+
+class TimedRoute(APIRoute):
+    """Route recording request duration and stage breakdown (histograms and "Server-Timing" header)
+
+    >>> APIRouter(prefix=..., tags=..., route_class=telemetry.TimedRoute)
+    """
+
+    def __init__(self, path : str, endpoint, **kwargs) -> None:
+
+        super().__init__(path, timed_endpoint(endpoint), **kwargs)
+
+    # >>> Override
+    def get_route_handler(self):
+
+        handler = super().get_route_handler()
+
+        route : str = self.path_format
+
+        async def timed_handler(request):
+
+            root : Frame = Frame(Stage.Serialize, route)
+
+            token = _current.set(root)
+
+            status : int = 500
+
+            response = None
+
+            start : float = time.perf_counter()
+
+            try:
+
+                response = await handler(request)
+
+                status = response.status_code
+
+                return response
+
+            except HTTPException as error:
+
+                status = error.status_code
+
+                raise
+
+            finally:
+
+                elapsed : float = time.perf_counter() - start
+
+                _current.reset(token)
+
+                own : float = max(0.0, elapsed - root.children)
+
+                stage_seconds.observe(own, route=route, stage=Stage.Serialize)
+
+                root.stages[Stage.Serialize] = root.stages.get(Stage.Serialize, 0.0) + own
+
+                request_seconds.observe(elapsed, route=route, method=request.method)
+
+                requests_total.increment(route=route, method=request.method, status=status)
+
+                if response is not None: response.headers['Server-Timing'] = ', '.join(f'{stage};dur={value * 1000.0:.2f}' for stage, value in root.stages.items())
+
+                if TELEMETRY_SLOW_MS and elapsed * 1000.0 >= TELEMETRY_SLOW_MS:
+
+                    utility.log(f'{request.method} {route} {elapsed * 1000.0:.1f} ms', ', '.join(f'{stage} {value * 1000.0:.1f} ms' for stage, value in root.stages.items()))
+
+        return timed_handler
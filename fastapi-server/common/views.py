@@ -0,0 +1,63 @@
+import threading
+
+from common import database, snapshot, telemetry
+from common.database import CollectionName
+
+# --- Params
+
+VIEWS_COLLECTION : str = 'materialized_views' # ? { _id: view, source: fingerprint of the source collection when built }
+
+VIEWS : dict =\
+{
+    CollectionName.CarbonEmissionsAnnual: (CollectionName.CarbonEmissions,
+    [
+        { '$match': { 'YYYYMM': { '$regex': '13$' } } }, # ? Annual totals (month "13")
+        { '$project': { 'Column_Order': 1, 'Description': 1, 'YYYYMM': 1, 'Value': 1 } }
+    ])
+}
+
+_versions : dict = dict() # ? Source fingerprint of the views already checked by this process
+
+_lock : threading.Lock = threading.Lock()
+
+# --- Utility
+
+def refresh(name : CollectionName) -> None:
+    """Rebuild a materialized view when its source collection has changed since the last build
+
+    The view is written with "$out", which replaces the collection atomically and keeps its indexes.
+
+    Args:
+        name (CollectionName): View name (see VIEWS)
+    """
+
+    source, pipeline = VIEWS[name]
+
+    version : str = snapshot.fingerprint(source)
+
+    if _versions.get(name) == version: return
+
+    with _lock:
+
+        if _versions.get(name) == version: return
+
+        meta_collection = database.get_database().get_collection(VIEWS_COLLECTION)
+
+        meta : dict | None = meta_collection.find_one({ '_id': str(name) })
+
+        if meta is None or meta.get('source') != version:
+
+            telemetry.event('view_refresh', view=name)
+
+            with telemetry.span(telemetry.Stage.Fetch): database.get_collection(source).aggregate([ *pipeline, { '$out': str(name) } ])
+
+            meta_collection.replace_one({ '_id': str(name) }, { '_id': str(name), 'source': version }, upsert=True)
+
+            snapshot.invalidate(name)
+
+        _versions[name] = version
+
+def refresh_all() -> None:
+    """Rebuild the stale materialized views"""
+
+    for name in VIEWS: refresh(name)
@@ -1,4 +1,8 @@
+import contextlib
 import fastapi as fa
+import pymongo
+
+from common import database, jobs, pool, utility, views
 
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -16,6 +20,9 @@ from routers.deep_learning.self_organizing_map import router as router_dl_self_o
 from routers.deep_learning.restricted_boltzmann_machine import router as router_dl_restricted_boltzmann_machine
 from routers.deep_learning.stacked_autoencoder import router as router_dl_stacked_autoencoder
 
+from routers.jobs import router as router_jobs
+from routers.telemetry import router as router_telemetry
+
 # >>> Pylance for type checking (python.analysis.typeCheckingMode settings)
 # >>> Launch from CL: fastapi dev fastapi-server/main.py
 
@@ -38,13 +45,44 @@ description = """LearningAI backend server implement all AI algorithms.
 * **minisom** 2.3.5
 * **matplotlib** 3.10.6
 * **torch** 2.8.0
+* **orjson** 3.11.3
 """
 
+@contextlib.asynccontextmanager
+async def lifespan(app : fa.FastAPI):
+    
+    # * Create the indexes and the stale materialized views (the requests refresh them too)
+    
+    try:
+        
+        database.ensure_indexes()
+        
+        views.refresh_all()
+    
+    except pymongo.errors.PyMongoError as error:
+        
+        utility.log('MongoDB not ready at startup', str(error))
+    
+    yield
+    
+    # * Stop the training jobs
+    
+    jobs.scheduler.shutdown()
+    
+    # * Stop the process pool of the leaderboards
+    
+    pool.shutdown()
+    
+    # * Release the pooled MongoDB connections
+    
+    database.close_client()
+
 app = fa.FastAPI(
     title="LearningAI 🤖",
     description=description,
     summary="LearningAI backend server",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(CORSMiddleware, allow_origins=[ 'http://localhost:3000' ], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
@@ -61,4 +99,7 @@ app.include_router(router_dl_convolutional_neural_network)
 app.include_router(router_dl_recurrent_neural_network)
 app.include_router(router_dl_self_organizing_map)
 app.include_router(router_dl_restricted_boltzmann_machine)
-app.include_router(router_dl_stacked_autoencoder)
\ No newline at end of file
+app.include_router(router_dl_stacked_autoencoder)
+
+app.include_router(router_jobs)
+app.include_router(router_telemetry)
\ No newline at end of file
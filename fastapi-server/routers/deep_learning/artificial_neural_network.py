@@ -6,43 +6,32 @@ import os
 
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
 
-import keras
+import functools
 import numpy as np
 import pandas as pd
-import pymongo
-import tensorflow as tf
 
-from common import utility
+from common import datasets, jobs, snapshot, telemetry, utility
+from common.lazy import lazy_import
+from common.database import CollectionName
+from common.telemetry import Stage
 
-from fastapi import APIRouter, BackgroundTasks, HTTPException, Query, status
+from fastapi import APIRouter, HTTPException, Query, status
 from sklearn.compose import ColumnTransformer
 from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler, TargetEncoder
 from pydantic import BaseModel
+from routers.jobs import stop_latest_job, submit_job
 from typing import Annotated, List
 
+keras   = lazy_import('keras')
+tf      = lazy_import('tensorflow')
+
 # --- Params 
 
 MODELS_DIR : str = './fastapi-server/models'
 
-X       = None
-X_train = None
-X_test  = None
-y       = None
-y_train = None
-y_test  = None
-
-ann : keras.Model = None
-
-class InfoData:
-    
-    stop        : bool  = False
-    trained     : bool  = False
-    epoch_count : int   = 1
-    epochs      : int   = 1
-    accuracy    : float = 0.0
-    loss        : float = 0.0
+JOB_KIND : str = 'artificial-neural-network'
 
 class InfoModel(BaseModel):
     
@@ -65,60 +54,48 @@ class MetricsModel(AnnModel):
     precision   : List[float]
     recall      : List[float]
 
-info_data : InfoData = InfoData()
-
-router : APIRouter = APIRouter(prefix='/deep-learning/artificial-neural-network', tags=['Deep Learning - Artificial Neural Network'])
+router : APIRouter = APIRouter(prefix='/deep-learning/artificial-neural-network', tags=['Deep Learning - Artificial Neural Network'], route_class=telemetry.TimedRoute)
 
-class FitCallback(keras.callbacks.Callback):
-    """Callback function used in Keras "fit" method
+@functools.cache
+def fit_callback_class() -> type:
+    """Callback class used in Keras "fit" method (defined on first training since Keras is imported lazily)
     
     https://keras.io/api/callbacks/backup_and_restore/
+    
+    Returns:
+        type: FitCallback class
     """
     
-    # >>> Override
-    def on_epoch_end(self, epoch : int, logs : dict = None):
-        
-        global info_data
-        
-        info_data.epoch_count += 1
+    class FitCallback(keras.callbacks.Callback):
         
-        if info_data.stop:
+        # >>> Override
+        def on_epoch_end(self, epoch : int, logs : dict = None):
             
-            info_data.stop          = False
-            info_data.epoch_count   = 1
-            info_data.accuracy      = logs['accuracy']
-            info_data.loss          = logs['loss']
+            context : jobs.JobContext = jobs.context()
             
-            raise RuntimeError('Interrupting!')
+            context.report(epoch_count=epoch + 1, accuracy=float(logs['accuracy']), loss=float(logs['loss']))
+            
+            context.check() # ? Interrupt if the job has been cancelled
+    
+    return FitCallback
 
 # --- Utility 
 
-def prepare_dataset() -> None:
+def prepare_dataset(version : str | None = None) -> dict:
     """Connect to MongoDB database "LearningAI" and extract the documents from the collection "songs"
-    """
     
-    global X
-    global X_train
-    global X_test
-    global y
-    global y_train
-    global y_test
+    Args:
+        version (str | None, optional): Collection fingerprint. Defaults to None.
     
-    # * Read from MongoDB
+    Returns:
+        dict: { X_train, X_test, y_train, y_test }
+    """
     
-    mongo_client : pymongo.MongoClient = pymongo.MongoClient(host='mongodb://localhost:27017/')
-
-    database : pymongo.database.Database = mongo_client.get_database('LearningAI')
-
-    songs_collection : pymongo.collection.Collection = database.get_collection('songs')
-
-    cursor = songs_collection.find()
+    # * Read from MongoDB (local snapshot)
+    
+    df : pd.DataFrame = snapshot.load_dataframe(CollectionName.Songs, version=version)
     
     # * Prepare dataset with Pandas
-
-    df : pd.DataFrame = pd.DataFrame(list(cursor))
-
-    df.drop(columns=['_id'], axis=1, inplace=True)
     
     # >>> Convert variables from int type to float type
 
@@ -158,32 +135,39 @@ def prepare_dataset() -> None:
     y_train = y_train.values
     y_test  = y_test.values
     
-    # * Close
+    return dict(X_train=X_train, X_test=X_test, y_train=y_train, y_test=y_test)
+
+def dataset_handle() -> datasets.DatasetHandle:
+    """Prepared dataset, shared by all requests until the collection changes
+
+    Returns:
+        datasets.DatasetHandle: Dataset handle
+    """
     
-    cursor.close()
+    version : str = snapshot.fingerprint(CollectionName.Songs)
     
-    mongo_client.close()
+    return datasets.cache.get(('artificial-neural-network',), version, lambda: prepare_dataset(version))
 
-def train_model(batch_size : int = 16, epochs : int = 10):
-    """Train the Artificial Neural Network (ANN)
+@jobs.task(JOB_KIND)
+def train_model(batch_size : int = 16, epochs : int = 10) -> str:
+    """Train the Artificial Neural Network (ANN) (job task, runs in a worker process)
 
     Args:
         batch_size (int, optional): Size of the batch. Defaults to 16.
         epochs (int, optional): Training epochs. Defaults to 10.
+
+    Returns:
+        str: Saved model path
     """
     
-    global ann
-    global info_data
-    
-    info_data.trained   = False
-    info_data.epochs    = epochs
+    handle : datasets.DatasetHandle = dataset_handle()
     
     # * Convert data to tensor
     
-    X_train_tf  = tf.convert_to_tensor(X_train)
-    X_test_tf   = tf.convert_to_tensor(X_test)
-    y_train_tf  = tf.convert_to_tensor(y_train)
-    y_test_tf   = tf.convert_to_tensor(y_test)
+    X_train_tf  = tf.convert_to_tensor(handle.X_train)
+    X_test_tf   = tf.convert_to_tensor(handle.X_test)
+    y_train_tf  = tf.convert_to_tensor(handle.y_train)
+    y_test_tf   = tf.convert_to_tensor(handle.y_test)
     
     # * Create the Artificial Neural Network
     
@@ -194,30 +178,23 @@ def train_model(batch_size : int = 16, epochs : int = 10):
     
     output_layer = keras.layers.Dense(units=3, activation='softmax')(x)    # ? 3 neurons for the 3 classes
     
-    ann = keras.Model(inputs=input_layer, outputs=output_layer, name='model_dense_multiclass')
+    ann : keras.Model = keras.Model(inputs=input_layer, outputs=output_layer, name='model_dense_multiclass')
     
     # * Train
     
     ann.compile(optimizer=keras.optimizers.Adam(learning_rate=10e-4), loss=keras.losses.SparseCategoricalCrossentropy(), metrics=['accuracy'])
     
-    try:
+    ann.fit(x=X_train_tf, y=y_train_tf, batch_size=batch_size, epochs=epochs, validation_data=(X_test_tf, y_test_tf), callbacks=[fit_callback_class()()])
     
-        ann.fit(x=X_train_tf, y=y_train_tf, batch_size=batch_size, epochs=epochs, validation_data=(X_test_tf, y_test_tf), callbacks=[FitCallback()])
-        
-        info_data.trained       = True
-        info_data.epoch_count   = 1
-        
-        # * Save the model
-        
-        model_path : str = f'{MODELS_DIR}/songs-bs_{batch_size}-epochs_{epochs}.keras'
-        
-        if os.path.exists(model_path): os.remove(model_path)
-            
-        ann.save(model_path)
+    # * Save the model
+    
+    model_path : str = f'{MODELS_DIR}/songs-bs_{batch_size}-epochs_{epochs}.keras'
     
-    except:
+    if os.path.exists(model_path): os.remove(model_path)
         
-        info_data.trained = False
+    ann.save(model_path)
+    
+    return model_path
 
 # --- Router 
 
@@ -228,29 +205,35 @@ def dataset():
     
     # * Retrieve data from MongoDB dataset
     
-    prepare_dataset()
+    dataset_handle()
     
     # * JSON
     
     return {}
 
 @router.get(path='/train')
-def train(background_tasks : BackgroundTasks,
-          batch_size : Annotated[int | None, Query(alias='batch_size', title='Batch Size >= 8')] = 16,
-          epochs : Annotated[int | None, Query(alias='epochs', title='Epochs >= 1')] = 10):
+def train(batch_size : Annotated[int | None, Query(alias='batch_size', title='Batch Size >= 8')] = 16,
+          epochs : Annotated[int | None, Query(alias='epochs', title='Epochs >= 1')] = 10,
+          priority : Annotated[int | None, Query(alias='priority', title='Job priority (higher first)')] = 0):
     
-    # * Train ANN
+    # * Train ANN (worker process)
     
-    background_tasks.add_task(train_model, batch_size, epochs)
+    dataset_handle() # ? Fail fast and refresh the local snapshot read by the worker
+    
+    job : dict = submit_job(JOB_KIND, dict(batch_size=batch_size, epochs=epochs), priority)
     
     # * JSON
     
-    return {}
+    return dict(id=job['id'])
 
 @router.get(path='/status', response_model=InfoModel)
 def model_status():
     
-    return info_data
+    info : dict = jobs.training_status(JOB_KIND, accuracy=0.0, loss=0.0)
+    
+    info['stop'] = info.pop('stopped')
+    
+    return info
 
 @router.get(path='/models', response_model=List[AnnModel])
 def models():
@@ -268,6 +251,8 @@ def models():
 @router.get(path='/metrics', response_model=List[MetricsModel], status_code=status.HTTP_200_OK)
 def metrics():
     
+    handle : datasets.DatasetHandle = dataset_handle()
+    
     metrics_list : list = []
     
     for id, filename in enumerate(sorted(os.listdir(MODELS_DIR))):
@@ -276,16 +261,16 @@ def metrics():
     
         ann_model : keras.Model = keras.saving.load_model(MODELS_DIR + '/' + filename)
         
-        y_pred : np.ndarray = ann_model.predict(X_test) # ? List of best matches for each element
+        with telemetry.span(Stage.Predict): y_pred : np.ndarray = ann_model.predict(handle.X_test) # ? List of best matches for each element
         
         y_pred = [np.argmax(prob) for prob in y_pred] # ? Choose the most likely ones
         
         metrics_list.append(dict(id=id,
                                  name=filename,
-                                 accuracy=accuracy_score(y_test, y_pred),
-                                 f1=f1_score(y_test, y_pred, average=None),
-                                 precision=precision_score(y_test, y_pred, average=None),
-                                 recall=recall_score(y_test, y_pred, average=None)))
+                                 accuracy=accuracy_score(handle.y_test, y_pred),
+                                 f1=f1_score(handle.y_test, y_pred, average=None),
+                                 precision=precision_score(handle.y_test, y_pred, average=None),
+                                 recall=recall_score(handle.y_test, y_pred, average=None)))
     
     return metrics_list
 
@@ -294,10 +279,7 @@ def metrics():
 @router.put(path='/stop-training', status_code=status.HTTP_200_OK)
 def stop_training():
     
-    global info_data
-    
-    info_data.trained   = False
-    info_data.stop      = True
+    stop_latest_job(JOB_KIND)
     
     return {}
 
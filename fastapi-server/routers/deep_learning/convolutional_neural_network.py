@@ -7,36 +7,31 @@ import os
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
 
 import aiofiles
-import keras
+import functools
 import numpy as np
 import pandas as pd
-import tensorflow as tf
 
-from common import utility
+from common import jobs, telemetry, utility
+from common.lazy import lazy_import
+from common.telemetry import Stage
 
-from fastapi import APIRouter, BackgroundTasks, HTTPException, Query, status, UploadFile
-from keras.preprocessing.image import img_to_array, load_img
-from keras.src.legacy.preprocessing.image import ImageDataGenerator
+from fastapi import APIRouter, HTTPException, Query, status, UploadFile
 from pydantic import BaseModel
+from routers.jobs import stop_latest_job, submit_job
 from typing import Annotated, List
 
+keras               = lazy_import('keras')
+keras_image         = lazy_import('keras.preprocessing.image')
+keras_legacy_image  = lazy_import('keras.src.legacy.preprocessing.image')
+tf                  = lazy_import('tensorflow')
+
 # --- Params 
 
 DATASET_DIR : str = './dataset/deep-learning/cnn'
 
 MODELS_DIR : str = './fastapi-server/models'
 
-training_set    = None
-test_set        = None
-
-cnn : keras.models.Sequential = None
-
-class InfoData:
-    
-    stopped     : bool  = False
-    trained     : bool  = False
-    epoch_count : int   = 1
-    epochs      : int   = 1
+JOB_KIND : str = 'convolutional-neural-network'
 
 class InfoModel(BaseModel):
     
@@ -51,66 +46,70 @@ class PredictModel(BaseModel):
     name    : str
     result  : int
 
-info_data : InfoData = InfoData()
+router : APIRouter = APIRouter(prefix='/deep-learning/convolutional-neural-network', tags=['Deep Learning - Convolutional Neural Network'], route_class=telemetry.TimedRoute)
 
-router : APIRouter = APIRouter(prefix='/deep-learning/convolutional-neural-network', tags=['Deep Learning - Convolutional Neural Network'])
-
-class FitCallback(keras.callbacks.Callback):
-    """Callback function used in Keras "fit" method
+@functools.cache
+def fit_callback_class() -> type:
+    """Callback class used in Keras "fit" method (defined on first training since Keras is imported lazily)
     
     https://keras.io/api/callbacks/backup_and_restore/
+    
+    Returns:
+        type: FitCallback class
     """
     
-    # >>> Override
-    def on_epoch_end(self, epoch : int, logs : dict = None):
-        
-        global info_data
+    class FitCallback(keras.callbacks.Callback):
         
-        info_data.epoch_count += 1
-        
-        if info_data.stopped:
+        # >>> Override
+        def on_epoch_end(self, epoch : int, logs : dict = None):
+            
+            context : jobs.JobContext = jobs.context()
             
-            info_data.stopped       = False
-            info_data.epoch_count   = 1
+            context.report(epoch_count=epoch + 1)
             
-            raise RuntimeError('Interrupting!')
+            context.check() # ? Interrupt if the job has been cancelled
+    
+    return FitCallback
 
 # --- Utility 
 
-def prepare_dataset(batch_size : int = 32) -> None:
+def prepare_dataset(batch_size : int = 32) -> tuple:
     """Retrieve the images from a local folder
     
     Args:
         batch_size (int, optional): Size of the batch. Defaults to 32.
-    """
     
-    global training_set
-    global test_set
+    Returns:
+        tuple: (training set, test set) image iterators
+    """
     
     # * Data-Augmentation only on training data
     
-    training_datagen    = ImageDataGenerator(rescale=1.0/255, shear_range=0.2, zoom_range=0.2, horizontal_flip=True)
-    test_datagen        = ImageDataGenerator(rescale=1.0/255)
+    training_datagen    = keras_legacy_image.ImageDataGenerator(rescale=1.0/255, shear_range=0.2, zoom_range=0.2, horizontal_flip=True)
+    test_datagen        = keras_legacy_image.ImageDataGenerator(rescale=1.0/255)
     
     training_set    = training_datagen.flow_from_directory(directory=f'{DATASET_DIR}/training_set', target_size=(64,64), batch_size=batch_size, class_mode='binary')
     test_set        = test_datagen.flow_from_directory(directory=f'{DATASET_DIR}/test_set', target_size=(64,64), batch_size=batch_size, class_mode='binary')
+    
+    return training_set, test_set
 
-def train_model(epochs : int = 25):
-    """Train the Convolutional Neural Network (CNN)
+@jobs.task(JOB_KIND)
+def train_model(batch_size : int = 32, epochs : int = 25) -> str:
+    """Train the Convolutional Neural Network (CNN) (job task, runs in a worker process)
     
     Args:
+        batch_size (int, optional): Size of the batch. Defaults to 32.
         epochs (int, optional): Training epochs. Defaults to 25.
-    """
     
-    global cnn
-    global info_data
+    Returns:
+        str: Saved model path
+    """
     
-    info_data.trained   = False
-    info_data.epochs    = epochs
+    training_set, test_set = prepare_dataset(batch_size=batch_size)
     
     # * Create the Convolutional Neural Network
     
-    cnn = keras.models.Sequential()
+    cnn : keras.models.Sequential = keras.models.Sequential()
     
     cnn.add(keras.layers.Input(shape=[64, 64, 3])) # ? 64 px X 64 px X RGB
 
@@ -129,24 +128,17 @@ def train_model(epochs : int = 25):
 
     cnn.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
     
-    try:
-
-        cnn.fit(x=training_set, validation_data=test_set, epochs=epochs, callbacks=[FitCallback()])
-        
-        info_data.trained       = True
-        info_data.epoch_count   = 1
-        
-        # * Save the model
-        
-        model_path : str = f'{MODELS_DIR}/animals-epochs_{epochs}.keras'
-        
-        if os.path.exists(model_path): os.remove(model_path)
-            
-        cnn.save(model_path)
+    cnn.fit(x=training_set, validation_data=test_set, epochs=epochs, callbacks=[fit_callback_class()()])
+    
+    # * Save the model
+    
+    model_path : str = f'{MODELS_DIR}/animals-epochs_{epochs}.keras'
     
-    except:
+    if os.path.exists(model_path): os.remove(model_path)
         
-        info_data.trained = False
+    cnn.save(model_path)
+    
+    return model_path
 
 # --- Router 
 
@@ -164,31 +156,29 @@ def dataset(batch_size : Annotated[int | None, Query(alias='batch_size', title='
     return {}
 
 @router.get(path='/train')
-def train(background_tasks : BackgroundTasks,
-          epochs : Annotated[int | None, Query(alias='epochs', title='Epochs >= 1')] = 25):
+def train(batch_size : Annotated[int | None, Query(alias='batch_size', title='Batch Size >= 8')] = 32,
+          epochs : Annotated[int | None, Query(alias='epochs', title='Epochs >= 1')] = 25,
+          priority : Annotated[int | None, Query(alias='priority', title='Job priority (higher first)')] = 0):
     
-    # * Train CNN
+    # * Train CNN (worker process)
     
-    background_tasks.add_task(train_model, epochs)
+    job : dict = submit_job(JOB_KIND, dict(batch_size=batch_size, epochs=epochs), priority)
     
     # * JSON
     
-    return {}
+    return dict(id=job['id'])
 
 @router.get(path='/status', response_model=InfoModel)
 def model_status():
     
-    return info_data
+    return jobs.training_status(JOB_KIND)
 
 # >>> PUT
 
 @router.put(path='/stop-training', status_code=status.HTTP_200_OK)
 def stop_training():
     
-    global info_data
-    
-    info_data.trained   = False
-    info_data.stopped   = True
+    stop_latest_job(JOB_KIND)
     
     return {}
 
@@ -217,11 +207,11 @@ async def predict(file : UploadFile):
     
         cnn_model : keras.Model = keras.saving.load_model(MODELS_DIR + '/' + filename)
         
-        test_image = load_img(path=file_path, target_size=(64, 64))
-        test_image = img_to_array(img=test_image)
+        test_image = keras_image.load_img(path=file_path, target_size=(64, 64))
+        test_image = keras_image.img_to_array(img=test_image)
         test_image = np.expand_dims(test_image, axis=0)
         
-        prediction : np.ndarray = cnn_model.predict(test_image)
+        with telemetry.span(Stage.Predict): prediction : np.ndarray = cnn_model.predict(test_image)
         
         predict_list.append(dict(id=id, name=filename, result=int(prediction[0][0])))
     
@@ -7,48 +7,32 @@ import os
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
 
 import datetime as dt
-import keras as ks
+import functools
 import numpy as np
 import pandas as pd
-import pymongo as pm
 
-from common import utility
+from common import datasets, jobs, responses, snapshot, telemetry, utility
+from common.lazy import lazy_import
+from common.database import CollectionName
+from common.responses import Layout
+from common.telemetry import Stage
 
-from fastapi import APIRouter, BackgroundTasks, Query, status
+from fastapi import APIRouter, Query, status
 from pydantic import BaseModel
 from sklearn.preprocessing import MinMaxScaler
+from routers.jobs import stop_latest_job, submit_job
 from typing import Annotated, List
 
+ks = lazy_import('keras')
+
 # --- Parmas 
 
 MODELS_DIR : str = './fastapi-server/models'
 
-X       = None
-X_train = None
-X_test  = None
-y       = None
-y_train = None
-y_test  = None
-
-df : pd.DataFrame = None
-
-test_set : np.ndarray = None
-
-test_dates : np.ndarray = None
-
-scaler : MinMaxScaler = None
+JOB_KIND : str = 'recurrent-neural-network'
 
 window : int = 60
 
-rnn : ks.models.Sequential = None
-
-class InfoData:
-    
-    stopped     : bool  = False
-    trained     : bool  = False
-    epoch_count : int   = 1
-    epochs      : int   = 1
-
 class InfoModel(BaseModel):
     
     stopped     : bool
@@ -61,34 +45,37 @@ class PointData(BaseModel):
     x: str
     y: float
 
+PointColumns : type[BaseModel] = responses.columns_model(PointData) # ? layout=columns
+
 class Predictions(BaseModel):
     
     name    : str
-    points  : List[PointData]
-
-info_data : InfoData = InfoData()
+    points  : List[PointData] | PointColumns
 
-router : APIRouter = APIRouter(prefix='/deep-learning/recurrent-neural-network', tags=['Deep Learning - Recurrent Neural Network'])
+router : APIRouter = APIRouter(prefix='/deep-learning/recurrent-neural-network', tags=['Deep Learning - Recurrent Neural Network'], route_class=telemetry.TimedRoute)
 
-class FitCallback(ks.callbacks.Callback):
-    """Callback function used in Keras "fit" method
+@functools.cache
+def fit_callback_class() -> type:
+    """Callback class used in Keras "fit" method (defined on first training since Keras is imported lazily)
     
     https://keras.io/api/callbacks/backup_and_restore/
+    
+    Returns:
+        type: FitCallback class
     """
     
-    # >>> Override
-    def on_epoch_end(self, epoch : int, logs : dict = None):
+    class FitCallback(ks.callbacks.Callback):
         
-        global info_data
-        
-        info_data.epoch_count += 1
-        
-        if info_data.stopped:
+        # >>> Override
+        def on_epoch_end(self, epoch : int, logs : dict = None):
             
-            info_data.stopped       = False
-            info_data.epoch_count   = 1
+            context : jobs.JobContext = jobs.context()
             
-            raise RuntimeError('Interrupting!')
+            context.report(epoch_count=epoch + 1)
+            
+            context.check() # ? Interrupt if the job has been cancelled
+    
+    return FitCallback
 
 # --- Utility
 
@@ -104,37 +91,19 @@ def format_date(data : np.ndarray) -> np.ndarray:
     
     return [str(date) for date in np.datetime_as_string(arr=data, unit='D')]
 
-def prepare_dataset() -> None:
+def prepare_dataset(version : str | None = None) -> dict:
     """Connect to MongoDB database "LearningAI" and extract the documents from the collection "nflx"
-    """
     
-    global X
-    global X_train
-    global X_test
-    global y
-    global y_train
-    global y_test
-    global df
-    global test_dates
-    global test_set
-    global scaler
-    global window
+    Args:
+        version (str | None, optional): Collection fingerprint. Defaults to None.
     
-    # * Read from MongoDB
+    Returns:
+        dict: { X, y, X_train, y_train, X_test, test_dates, scaler }
+    """
     
-    mongo_client : pm.MongoClient = pm.MongoClient(host='mongodb://localhost:27017/')
-
-    database : pm.database.Database = mongo_client.get_database('LearningAI')
-
-    nflx_collection : pm.collection.Collection = database.get_collection('nflx')
-
-    cursor = nflx_collection.find()
+    # * Read from MongoDB (local snapshot)
     
-    # * Prepare dataset with Pandas
-
-    df = pd.DataFrame(list(cursor))
-
-    df = df.drop(columns=['_id'])
+    df : pd.DataFrame = snapshot.load_dataframe(CollectionName.Nflx, version=version)
     
     # * Data
     
@@ -152,22 +121,20 @@ def prepare_dataset() -> None:
 
     # >>> Test
 
-    test_dates = format_date(df[df['Date'] >= '2023-01-01'].iloc[:, 0:1].values[:, 0])
+    test_dates : list = format_date(df[df['Date'] >= '2023-01-01'].iloc[:, 0:1].values[:, 0])
 
-    test_set = df[df['Date'] >= '2023-01-01'].iloc[:, 1:2].values # ? Open Value
+    test_set : np.ndarray = df[df['Date'] >= '2023-01-01'].iloc[:, 1:2].values # ? Open Value
     
     # >>> Scaling
 
-    scaler = MinMaxScaler(feature_range=(0, 1))
+    scaler : MinMaxScaler = MinMaxScaler(feature_range=(0, 1))
 
     training_set_scaled : np.ndarray = scaler.fit_transform(training_set)
     
     # >>> Preparation
 
-    X_train = list()
-    y_train = list()
-
-    window = 60
+    X_train : list = list()
+    y_train : list = list()
 
     for i in range(window, training_set_scaled.shape[0]):
         
@@ -178,31 +145,53 @@ def prepare_dataset() -> None:
     y_train = np.array(y_train)
     X_train = np.reshape(X_train, (X_train.shape[0], X_train.shape[1], 1)) # ? Add a third size
     
-    # * Close
+    # >>> Test inputs (same for every saved model)
     
-    cursor.close()
+    inputs : np.ndarray = df['Open'].iloc[df.shape[0] - test_set.shape[0] - window :].values
+    inputs = inputs.reshape(-1, 1)
+    inputs = scaler.transform(inputs)
+
+    X_test : list = list()
+
+    for i in range(window, window + test_set.shape[0]):
+        
+        X_test.append(inputs[i - window : i, 0])
+
+    X_test = np.array(X_test)
+    X_test = np.reshape(X_test, (X_test.shape[0], X_test.shape[1], 1))
     
-    mongo_client.close()
+    return dict(X=X, y=y, X_train=X_train, y_train=y_train, X_test=X_test, test_dates=test_dates, scaler=scaler)
+
+def dataset_handle() -> datasets.DatasetHandle:
+    """Prepared dataset, shared by all requests until the collection changes
 
-def train_model(batch_size : int = 32, epochs : int = 100):
-    """Train the Recurrent Neural Network (RNN)
+    Returns:
+        datasets.DatasetHandle: Dataset handle
+    """
+    
+    version : str = snapshot.fingerprint(CollectionName.Nflx)
+    
+    return datasets.cache.get(('recurrent-neural-network', window), version, lambda: prepare_dataset(version))
+
+@jobs.task(JOB_KIND)
+def train_model(batch_size : int = 32, epochs : int = 100) -> str:
+    """Train the Recurrent Neural Network (RNN) (job task, runs in a worker process)
     
     Args:
         batch_size (int, optional): Size of the batch. Defaults to 32.
         epochs (int, optional): Training epochs. Defaults to 100.
-    """
     
-    global rnn
-    global info_data
+    Returns:
+        str: Saved model path
+    """
     
-    info_data.trained   = False
-    info_data.epochs    = epochs
+    handle : datasets.DatasetHandle = dataset_handle()
     
     # * Create the Recurrent Neural Network
     
-    rnn = ks.models.Sequential()
+    rnn : ks.models.Sequential = ks.models.Sequential()
     
-    rnn.add(ks.layers.Input(shape=(X_train.shape[1], 1))) # ! shape[0] = window
+    rnn.add(ks.layers.Input(shape=(handle.X_train.shape[1], 1))) # ! shape[0] = window
     
     rnn.add(ks.layers.LSTM(units=50, return_sequences=True))
     rnn.add(ks.layers.Dropout(rate=0.2))
@@ -222,49 +211,41 @@ def train_model(batch_size : int = 32, epochs : int = 100):
 
     rnn.compile(optimizer='adam', loss='mean_squared_error')
     
-    try:
-
-        rnn.fit(x=X_train, y=y_train, batch_size=batch_size, epochs=epochs, callbacks=[FitCallback()])
-        
-        info_data.trained       = True
-        info_data.epoch_count   = 1
-        
-        # * Save the model
-        
-        model_path : str = f'{MODELS_DIR}/nflx-bs_{batch_size}-epochs_{epochs}.keras'
-        
-        if os.path.exists(model_path): os.remove(model_path)
-            
-        rnn.save(model_path)
+    rnn.fit(x=handle.X_train, y=handle.y_train, batch_size=batch_size, epochs=epochs, callbacks=[fit_callback_class()()])
+    
+    # * Save the model
     
-    except:
+    model_path : str = f'{MODELS_DIR}/nflx-bs_{batch_size}-epochs_{epochs}.keras'
+    
+    if os.path.exists(model_path): os.remove(model_path)
         
-        info_data.trained = False
+    rnn.save(model_path)
+    
+    return model_path
 
 
 # --- Router 
 
 # >>> GET
 
-@router.get(path='/dataset', response_model=List[PointData])
-def dataset():
+@router.get(path='/dataset', response_model=List[PointData] | PointColumns, response_class=responses.FastJSONResponse, responses=responses.ndjson(PointData))
+def dataset(layout : Annotated[Layout, Query(alias='layout', title='Response layout [rows, columns]')] = Layout.Rows,
+            stream : Annotated[bool, Query(alias='stream', title='NDJSON stream of rows')] = False):
     
     # * Retrieve data from MongoDB dataset
     
-    prepare_dataset()
+    handle : datasets.DatasetHandle = dataset_handle()
     
     # * JSON
     
-    response : list = list()
-    
-    for x_value, y_value in zip(X, y):
-        
-        response.append({ "x": x_value, "y": float(y_value) })
+    if stream: return responses.stream(x=handle.X, y=handle.y)
     
-    return response
+    return responses.FastJSONResponse(responses.table(layout, x=handle.X, y=handle.y))
 
-@router.get(path='/predictions', response_model=List[Predictions])
-def predictions():
+@router.get(path='/predictions', response_model=List[Predictions], response_class=responses.FastJSONResponse)
+def predictions(layout : Annotated[Layout, Query(alias='layout', title='Response layout [rows, columns]')] = Layout.Rows):
+    
+    handle : datasets.DatasetHandle = dataset_handle()
     
     predicted_values : list = list()
     
@@ -274,57 +255,37 @@ def predictions():
         
         rnn_model : ks.Model = ks.saving.load_model(MODELS_DIR + '/' + filename)
         
-        inputs = df['Open'].iloc[df.shape[0] - test_set.shape[0] - window :].values
-        inputs = inputs.reshape(-1, 1)
-        inputs = scaler.transform(inputs)
-
-        X_test = list()
-
-        for i in range(window, window + test_set.shape[0]):
-            
-            X_test.append(inputs[i - window : i, 0])
-
-        X_test = np.array(X_test)
-        X_test = np.reshape(X_test, (X_test.shape[0], X_test.shape[1], 1))
-
-        prediction : np.ndarray = scaler.inverse_transform(rnn_model.predict(X_test))
+        with telemetry.span(Stage.Predict): prediction : np.ndarray = handle.scaler.inverse_transform(rnn_model.predict(handle.X_test))
         
-        points : list = list()
+        predicted_values.append(dict(name=filename, points=responses.table(layout, x=handle.test_dates, y=prediction)))
     
-        for x_value, y_value in zip(test_dates, prediction):
-        
-            points.append({ "x": x_value, "y": float(y_value) })
-        
-        predicted_values.append(dict(name=filename, points=points))
-    
-    return predicted_values
+    return responses.FastJSONResponse(predicted_values)
 
 @router.get(path='/train')
-def train(background_tasks : BackgroundTasks,
-          batch_size : Annotated[int | None, Query(alias='batch_size', title='Batch Size >= 8')] = 32,
-          epochs : Annotated[int | None, Query(alias='epochs', title='Epochs >= 1')] = 100):
+def train(batch_size : Annotated[int | None, Query(alias='batch_size', title='Batch Size >= 8')] = 32,
+          epochs : Annotated[int | None, Query(alias='epochs', title='Epochs >= 1')] = 100,
+          priority : Annotated[int | None, Query(alias='priority', title='Job priority (higher first)')] = 0):
+    
+    # * Train RNN (worker process)
     
-    # * Train ANN
+    dataset_handle() # ? Fail fast and refresh the local snapshot read by the worker
     
-    background_tasks.add_task(train_model, batch_size, epochs)
+    job : dict = submit_job(JOB_KIND, dict(batch_size=batch_size, epochs=epochs), priority)
     
     # * JSON
     
-    return {}
+    return dict(id=job['id'])
 
 @router.get(path='/status', response_model=InfoModel)
 def model_status():
     
-    return info_data
+    return jobs.training_status(JOB_KIND)
 
 # >>> PUT
 
 @router.put(path='/stop-training', status_code=status.HTTP_200_OK)
 def stop_training():
     
-    global info_data
-    
-    info_data.trained   = False
-    info_data.stopped   = True
+    stop_latest_job(JOB_KIND)
     
     return {}
\ No newline at end of file
@@ -1,27 +1,27 @@
+from __future__ import annotations # ? Keep "torch" annotations unevaluated since PyTorch is imported lazily
+
 import numpy as np
 import os
 import pandas as pd
-import pymongo
 import shutil
-import torch
 
-from common import utility
+from common import datasets, jobs, snapshot, telemetry, utility
+from common.database import CollectionName
+from common.lazy import lazy_import
+from common.telemetry import Stage
 
-from fastapi import APIRouter, BackgroundTasks, Query, status
+from fastapi import APIRouter, HTTPException, Query, status
 from pydantic import BaseModel
+from routers.jobs import stop_latest_job, submit_job
 from typing import Annotated, List
 
+torch = lazy_import('torch')
+
 # --- Params 
 
 MODELS_DIR : str = './fastapi-server/models/rbm'
 
-number_users : int = 0
-
-number_movies : int = 0
-
-training_set = None
-
-test_set = None
+JOB_KIND : str = 'restricted-boltzmann-machine'
 
 class RBM():
     """Restricted Boltzmann Machine (RBM)"""
@@ -103,16 +103,6 @@ class RBM():
         self.b += torch.sum((visible_0 - visible_k), 0)
         self.a += torch.sum((prob_hidden_0 - prob_hidden_k), 0)
 
-rbm : RBM = None
-
-class InfoData:
-    
-    stopped     : bool  = False
-    trained     : bool  = False
-    epoch_count : int   = 1
-    epochs      : int   = 1
-    loss        : float = 0.0
-
 class InfoModel(BaseModel):
     
     stopped     : bool
@@ -127,17 +117,17 @@ class MetricsModel(BaseModel):
     name    : str
     loss    : float
 
-info_data : InfoData = InfoData()
-
-router : APIRouter = APIRouter(prefix='/deep-learning/restricted-boltzmann-machine', tags=['Deep Learning - Restricted Boltzmann Machine'])
+router : APIRouter = APIRouter(prefix='/deep-learning/restricted-boltzmann-machine', tags=['Deep Learning - Restricted Boltzmann Machine'], route_class=telemetry.TimedRoute)
 
 # --- Utility 
 
-def convert(data : np.ndarray) -> list:
+def convert(data : np.ndarray, number_users : int, number_movies : int) -> list:
     """Convert the full data in a matrix Users - Movies - Ratings (Rows - Columns - Cells)
 
     Args:
         data (np.ndarray): Original data
+        number_users (int): Number of users (rows)
+        number_movies (int): Number of movies (columns)
 
     Returns:
         list: Converted data
@@ -159,46 +149,33 @@ def convert(data : np.ndarray) -> list:
     
     return converted_data
 
-def prepare_dataset() -> None:
-    """Connect to MongoDB database "LearningAI" and extract the documents from the collection 'movies'"""
+def prepare_dataset(training_version : str | None = None, test_version : str | None = None) -> dict:
+    """Connect to MongoDB database "LearningAI" and extract the documents from the collection 'movies'
     
-    global number_users
-    global number_movies
-    global training_set
-    global test_set
+    Args:
+        training_version (str | None, optional): Training collection fingerprint. Defaults to None.
+        test_version (str | None, optional): Test collection fingerprint. Defaults to None.
     
-    # * Read from MongoDB
+    Returns:
+        dict: { training_set, test_set, number_users, number_movies }
+    """
     
-    mongo_client : pymongo.MongoClient = pymongo.MongoClient(host='mongodb://localhost:27017/')
-
-    database : pymongo.database.Database = mongo_client.get_database('LearningAI')
-
-    movies_training_collection : pymongo.collection.Collection = database.get_collection('movies_training')
+    # * Read from MongoDB (local snapshot)
     
-    movies_test_collection : pymongo.collection.Collection = database.get_collection('movies_test')
-
-    cursor_training = movies_training_collection.find()
+    df_training : pd.DataFrame = snapshot.load_dataframe(CollectionName.MoviesTraining, version=training_version)
     
-    cursor_test = movies_test_collection.find()
+    df_test : pd.DataFrame = snapshot.load_dataframe(CollectionName.MoviesTest, version=test_version)
     
     # * Prepare dataset with Pandas
-
-    df_training : pd.DataFrame = pd.DataFrame(list(cursor_training))
-
-    df_training.drop(columns=['_id'], axis=1, inplace=True)
-    
-    df_test : pd.DataFrame = pd.DataFrame(list(cursor_test))
-
-    df_test.drop(columns=['_id'], axis=1, inplace=True)
     
     training_set    = df_training.to_numpy()
     test_set        = df_test.to_numpy()
 
-    number_users    = max(max(training_set[:, 0]), max(test_set[:, 0]))
-    number_movies   = max(max(training_set[:, 1]), max(test_set[:, 1]))
+    number_users    : int = int(max(max(training_set[:, 0]), max(test_set[:, 0])))
+    number_movies   : int = int(max(max(training_set[:, 1]), max(test_set[:, 1])))
 
-    training_set    = convert(training_set)
-    test_set        = convert(test_set)
+    training_set    = convert(training_set, number_users, number_movies)
+    test_set        = convert(test_set, number_users, number_movies)
 
     # >>> Conversions + Rating Adjustment (-1 = skip, 0 = Not Liked, 1 = Liked)
 
@@ -215,39 +192,49 @@ def prepare_dataset() -> None:
     test_set[test_set == 2] = +0
     test_set[test_set >= 3] = +1
     
-    # * Close
-    
-    cursor_training.close()
+    return dict(training_set=training_set, test_set=test_set, number_users=number_users, number_movies=number_movies)
+
+def dataset_handle() -> datasets.DatasetHandle:
+    """Prepared dataset, shared by all requests until one of the collections changes
+
+    Returns:
+        datasets.DatasetHandle: Dataset handle
+    """
     
-    cursor_test.close()
+    training_version    : str = snapshot.fingerprint(CollectionName.MoviesTraining)
+    test_version        : str = snapshot.fingerprint(CollectionName.MoviesTest)
     
-    mongo_client.close()
+    return datasets.cache.get(('restricted-boltzmann-machine',), f'{training_version}/{test_version}', lambda: prepare_dataset(training_version, test_version))
 
-def train_model(batch_size : int = 100, epochs : int = 10) -> None:
-    """Train the Restricted Boltzmann Machine (RBM)
+@jobs.task(JOB_KIND)
+def train_model(batch_size : int = 100, epochs : int = 10) -> str:
+    """Train the Restricted Boltzmann Machine (RBM) (job task, runs in a worker process)
     
     Args:
         batch_size (int, optional): Size of the batch. Defaults to 100.
         epochs (int, optional): Training epochs. Defaults to 10.
+    
+    Returns:
+        str: Saved model folder
     """
     
-    global rbm
-    global info_data
+    context : jobs.JobContext = jobs.context()
     
-    info_data.trained   = False
-    info_data.epochs    = epochs
+    handle : datasets.DatasetHandle = dataset_handle()
+    
+    training_set : torch.Tensor = handle.training_set
     
     num_visible : int = len(training_set[0]) # ? Number of users
     num_hidden  : int = 100
 
-    rbm = RBM(num_visible, num_hidden)
+    rbm : RBM = RBM(num_visible, num_hidden)
 
     for epoch in range(1, epochs + 1):
         
         train_loss  : int  = 0
         counter     : float = 0.0
         
-        for user in range(0, number_users - batch_size, batch_size):
+        for user in range(0, handle.number_users - batch_size, batch_size):
             
             visible_0 : torch.Tensor = training_set[user : user + batch_size]
             visible_k : torch.Tensor = training_set[user : user + batch_size]
@@ -277,41 +264,52 @@ def train_model(batch_size : int = 100, epochs : int = 10) -> None:
         
         print(f'Epoch {epoch}: loss {train_loss / counter}')
         
-        info_data.epoch_count += 1
+        context.report(epoch_count=epoch, loss=float(train_loss / counter))
         
-        if info_data.stopped:
-            
-            info_data.trained       = False
-            info_data.epoch_count   = 1
-            
-            break
+        context.check() # ? Interrupt if the job has been cancelled
     
-    if not info_data.stopped:
-        
-        info_data.trained       = True
-        info_data.epoch_count   = 1
-        
-        # * Save the model
-        
-        if not os.path.exists(MODELS_DIR): os.mkdir(MODELS_DIR)
-        
-        model_path : str = f'{MODELS_DIR}/movies-bs_{batch_size}-epochs_{epochs}'
-        
-        if os.path.exists(model_path): shutil.rmtree(model_path)
-        
-        os.mkdir(model_path)
-        
-        torch.save(rbm.W, f'{model_path}/W.pt')
-        torch.save(rbm.a, f'{model_path}/a.pt')
-        torch.save(rbm.b, f'{model_path}/b.pt')
+    # * Save the model
     
-    else:
-        
-        info_data.stopped = False
+    if not os.path.exists(MODELS_DIR): os.mkdir(MODELS_DIR)
+    
+    model_path : str = f'{MODELS_DIR}/movies-bs_{batch_size}-epochs_{epochs}'
+    
+    if os.path.exists(model_path): shutil.rmtree(model_path)
+    
+    os.mkdir(model_path)
+    
+    torch.save(rbm.W, f'{model_path}/W.pt')
+    torch.save(rbm.a, f'{model_path}/a.pt')
+    torch.save(rbm.b, f'{model_path}/b.pt')
+    
+    return model_path
+
+def load_model(model_path : str) -> RBM:
+    """Load a saved RBM model
 
-def test_model(rbm_model : RBM) -> float:
+    Args:
+        model_path (str): Model folder
+
+    Returns:
+        RBM: Model
+    """
+    
+    rbm_model : RBM = RBM(0, 0)
+    
+    rbm_model.set_tensors(torch.load(f'{model_path}/W.pt'),
+                          torch.load(f'{model_path}/a.pt'),
+                          torch.load(f'{model_path}/b.pt'))
+    
+    return rbm_model
+
+@telemetry.span(Stage.Predict)
+def test_model(rbm_model : RBM, handle : datasets.DatasetHandle) -> float:
     """Test the RBM model
 
+    Args:
+        rbm_model (RBM): Model to test
+        handle (datasets.DatasetHandle): Prepared dataset
+
     Returns:
         float: Loss value
     """
@@ -319,10 +317,10 @@ def test_model(rbm_model : RBM) -> float:
     test_loss   : int = 0
     counter     : float = 0.0
 
-    for user in range(number_users):
+    for user in range(handle.number_users):
         
-        visible     : torch.Tensor = training_set[user : user + 1]
-        visible_t   : torch.Tensor = test_set[user : user + 1]
+        visible     : torch.Tensor = handle.training_set[user : user + 1]
+        visible_t   : torch.Tensor = handle.test_set[user : user + 1]
         
         # * Blind walk
         
@@ -348,31 +346,39 @@ def dataset():
     
     # * Retrieve data from MongoDB dataset
     
-    prepare_dataset()
+    dataset_handle()
     
     # * JSON
     
     return {}
 
 @router.get(path='/train')
-def train(background_tasks : BackgroundTasks,
-          batch_size : Annotated[int | None, Query(alias='batch_size', title='Batch Size >= 8')] = 100,
-          epochs : Annotated[int | None, Query(alias='epochs', title='Epochs >= 1')] = 10):
+def train(batch_size : Annotated[int | None, Query(alias='batch_size', title='Batch Size >= 8')] = 100,
+          epochs : Annotated[int | None, Query(alias='epochs', title='Epochs >= 1')] = 10,
+          priority : Annotated[int | None, Query(alias='priority', title='Job priority (higher first)')] = 0):
     
-    # * Train RBM
+    # * Train RBM (worker process)
     
-    background_tasks.add_task(train_model, batch_size, epochs)
+    dataset_handle() # ? Fail fast and refresh the local snapshot read by the worker
+    
+    job : dict = submit_job(JOB_KIND, dict(batch_size=batch_size, epochs=epochs), priority)
     
     # * JSON
     
-    return {}
+    return dict(id=job['id'])
 
 @router.get(path='/test')
 def test():
     
-    # * Test RBM
+    # * Test the last trained RBM
     
-    test_model(rbm_model=rbm)
+    job : jobs.Job = jobs.scheduler.latest_finished(JOB_KIND)
+    
+    if job is None:
+        
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='No model has been trained yet')
+    
+    test_model(rbm_model=load_model(job.result), handle=dataset_handle())
     
     # * JSON
     
@@ -381,24 +387,20 @@ def test():
 @router.get(path='/status', response_model=InfoModel)
 def model_status():
     
-    return info_data
+    return jobs.training_status(JOB_KIND, loss=0.0)
 
 @router.get(path='/metrics', response_model=List[MetricsModel], status_code=status.HTTP_200_OK)
 def metrics():
     
+    handle : datasets.DatasetHandle = dataset_handle()
+    
     metrics_list : list = []
     
     for id, filename in enumerate(sorted(os.listdir(MODELS_DIR))):
         
         if not filename.startswith('movies') or os.path.isfile(f'{MODELS_DIR}/{filename}'): continue
         
-        rbm_model : RBM = RBM(0, 0)
-        
-        rbm_model.set_tensors(torch.load(f'{MODELS_DIR}/{filename}/W.pt'),
-                              torch.load(f'{MODELS_DIR}/{filename}/a.pt'),
-                              torch.load(f'{MODELS_DIR}/{filename}/b.pt'))
-        
-        loss : float = test_model(rbm_model=rbm_model)
+        loss : float = test_model(rbm_model=load_model(f'{MODELS_DIR}/{filename}'), handle=handle)
         
         metrics_list.append(dict(id=id, name=filename, loss=loss))
     
@@ -409,9 +411,6 @@ def metrics():
 @router.put(path='/stop-training', status_code=status.HTTP_200_OK)
 def stop_training():
     
-    global info_data
-    
-    info_data.stopped = True
-    info_data.trained = False
+    stop_latest_job(JOB_KIND)
     
     return {}
\ No newline at end of file
@@ -6,35 +6,33 @@ import os
 
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
 
-import keras
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import pymongo
-import tensorflow as tf
 
-from common import utility
+from common import datasets, snapshot, telemetry, utility
+from common.database import CollectionName
+from common.lazy import lazy_import
+from common.telemetry import Stage
 
 from collections import defaultdict
 from fastapi import APIRouter, Query
 from fastapi.responses import FileResponse
-from minisom import MiniSom
 from sklearn.preprocessing import MinMaxScaler, StandardScaler
 from pydantic import BaseModel
 from typing import Annotated, List
 
+keras   = lazy_import('keras')
+minisom = lazy_import('minisom')
+plt     = lazy_import('matplotlib.pyplot')
+tf      = lazy_import('tensorflow')
+
 # --- Params 
 
 MODELS_DIR : str = './fastapi-server/models'
 
 IMG_DIR_DIR : str = './dataset/deep-learning/som'
 
-X       = None
-X_ann   = None
-y       = None
-ID_ann  = None
-
-som : MiniSom = None
+som : 'minisom.MiniSom' = None
 
 winner_matrix : list = []
 
@@ -44,52 +42,50 @@ class FraudModel(BaseModel):
     
     id : int
 
-scaler : MinMaxScaler = MinMaxScaler(feature_range=(0, 1))
-
-router : APIRouter = APIRouter(prefix='/deep-learning/self-organizing-map', tags=['Deep Learning - Self Organizing Map'])
+router : APIRouter = APIRouter(prefix='/deep-learning/self-organizing-map', tags=['Deep Learning - Self Organizing Map'], route_class=telemetry.TimedRoute)
 
 # --- Utility 
 
-def prepare_dataset() -> None:
+def prepare_dataset(version : str | None = None) -> dict:
     """Connect to MongoDB database "LearningAI" and extract the documents from the collection "credit_card_applications"
-    """
     
-    global X
-    global X_ann
-    global y
-    global ID_ann
+    Args:
+        version (str | None, optional): Collection fingerprint. Defaults to None.
+    
+    Returns:
+        dict: { X, y, X_ann, ID_ann, scaler }
+    """
     
-    # * Read from MongoDB
+    # * Read from MongoDB (local snapshot)
     
-    mongo_client : pymongo.MongoClient = pymongo.MongoClient(host='mongodb://localhost:27017/')
-
-    database : pymongo.database.Database = mongo_client.get_database('LearningAI')
-
-    credit_card_applications_collection : pymongo.collection.Collection = database.get_collection('credit_card_applications')
-
-    cursor = credit_card_applications_collection.find()
+    df : pd.DataFrame = snapshot.load_dataframe(CollectionName.CreditCardApplications, version=version)
     
     # * Prepare dataset with Pandas
-
-    df : pd.DataFrame = pd.DataFrame(list(cursor))
-
-    df.drop(columns=['_id'], axis=1, inplace=True)
     
-    ID_ann  = df.iloc[:, 0:1].values # ? CustomerID
-    X_ann   = df.iloc[:, 1:].values # ? A1-A14 + Class
+    ID_ann  : np.ndarray = df.iloc[:, 0:1].values # ? CustomerID
+    X_ann   : np.ndarray = df.iloc[:, 1:].values # ? A1-A14 + Class
     
-    X = df.iloc[:, :-1].values  # ? CustomerID + A1-A14
-    y = df.iloc[:, -1].values   # ? Class: 0 => Application Refused, 1 => Application Approved
+    X : np.ndarray = df.iloc[:, :-1].values  # ? CustomerID + A1-A14
+    y : np.ndarray = df.iloc[:, -1].values   # ? Class: 0 => Application Refused, 1 => Application Approved
     
     # >>> Preprocessing
     
+    scaler : MinMaxScaler = MinMaxScaler(feature_range=(0, 1))
+    
     X = scaler.fit_transform(X)
     
-    # * Close
+    return dict(X=X, y=y, X_ann=X_ann, ID_ann=ID_ann, scaler=scaler)
+
+def dataset_handle() -> datasets.DatasetHandle:
+    """Prepared dataset, shared by all requests until the collection changes
+
+    Returns:
+        datasets.DatasetHandle: Dataset handle
+    """
     
-    cursor.close()
+    version : str = snapshot.fingerprint(CollectionName.CreditCardApplications)
     
-    mongo_client.close()
+    return datasets.cache.get(('self-organizing-map',), version, lambda: prepare_dataset(version))
 
 # --- Router 
 
@@ -100,7 +96,7 @@ def dataset():
     
     # * Retrieve data from MongoDB dataset
     
-    prepare_dataset()
+    dataset_handle()
     
     # * JSON
     
@@ -112,6 +108,11 @@ def self_organizing_map():
     global som
     global winner_matrix
     
+    handle : datasets.DatasetHandle = dataset_handle()
+    
+    X : np.ndarray = handle.X
+    y : np.ndarray = handle.y
+    
     # * Self Organizing Map
     
     number_samples : int = X.shape[0]
@@ -120,13 +121,15 @@ def self_organizing_map():
     
     sigma : int = int(np.sqrt(neurons ** 2 + neurons ** 2))
     
-    som = MiniSom(x=neurons, y=neurons, input_len=X.shape[1], sigma=sigma,
-                  learning_rate=0.5, activation_distance='euclidean', topology='hexagonal',
-                  random_seed=10)
+    som = minisom.MiniSom(x=neurons, y=neurons, input_len=X.shape[1], sigma=sigma,
+                          learning_rate=0.5, activation_distance='euclidean', topology='hexagonal',
+                          random_seed=10)
     
-    som.random_weights_init(X)
+    with telemetry.span(Stage.Fit):
+        
+        som.random_weights_init(X)
 
-    som.train_random(data=X, num_iteration=100, verbose=False)
+        som.train_random(data=X, num_iteration=100, verbose=False)
     
     distance_map = som.distance_map().T
     
@@ -179,11 +182,13 @@ def check_frauds(level : Annotated[int | None, Query(alias='level', title='Level
     
     global frauds
     
+    handle : datasets.DatasetHandle = dataset_handle()
+    
     # * Frauds
     
     distance_map = som.distance_map()
     
-    mappings : defaultdict = som.win_map(X)
+    mappings : defaultdict = som.win_map(handle.X)
     
     mapping_list : list = []
     
@@ -197,7 +202,7 @@ def check_frauds(level : Annotated[int | None, Query(alias='level', title='Level
     
     possible_frauds : np.ndarray = np.concatenate(tuple(mapping_list), axis=0)
     
-    possible_frauds = scaler.inverse_transform(possible_frauds)
+    possible_frauds = handle.scaler.inverse_transform(possible_frauds)
     
     #approval_state : list = [index for index, row in enumerate(scaler.inverse_transform(X)) if float(row[0]) in possible_frauds[:, 0]]
     
@@ -216,19 +221,21 @@ def check_frauds(level : Annotated[int | None, Query(alias='level', title='Level
 @router.get(path='/neural-network', response_model=List[str])
 def neural_network():
     
-    global X_ann
+    handle : datasets.DatasetHandle = dataset_handle()
+    
+    ID_ann : np.ndarray = handle.ID_ann
     
     # * Artificial Neural Network
 
-    is_fraud = np.zeros(X_ann.shape[0])
+    is_fraud = np.zeros(handle.X_ann.shape[0])
 
-    for i in range(X_ann.shape[0]):
+    for i in range(handle.X_ann.shape[0]):
         
         is_fraud[i] = 1 if ID_ann[i, 0] in frauds else 0
 
     ann_scaler = StandardScaler()
 
-    X_ann = ann_scaler.fit_transform(X_ann)
+    X_ann : np.ndarray = ann_scaler.fit_transform(handle.X_ann) # ? Scaled copy, the shared dataset stays untouched
 
     ann = keras.models.Sequential()
 
@@ -238,9 +245,9 @@ def neural_network():
 
     ann.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
 
-    ann.fit(x=X_ann, y=is_fraud, batch_size=1, epochs=2)
+    with telemetry.span(Stage.Fit): ann.fit(x=X_ann, y=is_fraud, batch_size=1, epochs=2)
 
-    y_pred = ann.predict(X_ann)
+    with telemetry.span(Stage.Predict): y_pred = ann.predict(X_ann)
     y_pred = np.concatenate((ID_ann, y_pred), axis=1)
     y_pred = y_pred[y_pred[:, 1].argsort()]
 
@@ -1,61 +1,64 @@
+import functools
 import numpy as np
 import os
 import pandas as pd
-import pymongo
 import shutil
-import torch
 
-from common import utility
+from common import datasets, jobs, snapshot, telemetry, utility
+from common.database import CollectionName
+from common.lazy import lazy_import
+from common.telemetry import Stage
 
-from fastapi import APIRouter, BackgroundTasks, Query, status
+from fastapi import APIRouter, HTTPException, Query, status
 from pydantic import BaseModel
+from routers.jobs import stop_latest_job, submit_job
 from typing import Annotated, List
 
+torch = lazy_import('torch')
+
 # --- Params 
 
 MODELS_DIR : str = './fastapi-server/models/ae'
 
-number_users : int = 0
-
-number_movies : int = 0
-
-training_set = None
+JOB_KIND : str = 'stacked-autoencoder'
 
-test_set = None
-
-class SAE(torch.nn.Module):
-    """Stacked Autoencoder (SAE)"""
+@functools.cache
+def sae_class() -> type:
+    """Stacked Autoencoder (SAE) class (defined on first use since PyTorch is imported lazily)
     
-    def __init__(self) -> None:
-        """Constructor"""
-        
-        super(SAE, self).__init__()
-        
-        self.full_connected_layer_1 : torch.nn.Linear = torch.nn.Linear(in_features=number_movies, out_features=20)
-        self.full_connected_layer_2 : torch.nn.Linear = torch.nn.Linear(in_features=20, out_features=10)
-        self.full_connected_layer_3 : torch.nn.Linear = torch.nn.Linear(in_features=10, out_features=20)
-        self.full_connected_layer_4 : torch.nn.Linear = torch.nn.Linear(in_features=20, out_features=number_movies)
-        
-        self.activation : torch.nn.Sigmoid = torch.nn.Sigmoid()
+    Returns:
+        type: SAE class
+    """
     
-    def forward(self, x : torch.FloatTensor) -> torch.FloatTensor:
-        
-        x = self.activation(self.full_connected_layer_1(x))
-        x = self.activation(self.full_connected_layer_2(x))
-        x = self.activation(self.full_connected_layer_3(x))
-        x = self.full_connected_layer_4(x)
+    class SAE(torch.nn.Module):
+        """Stacked Autoencoder (SAE)"""
         
-        return x
+        def __init__(self, number_movies : int) -> None:
+            """Constructor
 
-sae : SAE = None
-
-class InfoData:
+            Args:
+                number_movies (int): Number of movies (input and output features)
+            """
+            
+            super(SAE, self).__init__()
+            
+            self.full_connected_layer_1 : torch.nn.Linear = torch.nn.Linear(in_features=number_movies, out_features=20)
+            self.full_connected_layer_2 : torch.nn.Linear = torch.nn.Linear(in_features=20, out_features=10)
+            self.full_connected_layer_3 : torch.nn.Linear = torch.nn.Linear(in_features=10, out_features=20)
+            self.full_connected_layer_4 : torch.nn.Linear = torch.nn.Linear(in_features=20, out_features=number_movies)
+            
+            self.activation : torch.nn.Sigmoid = torch.nn.Sigmoid()
+        
+        def forward(self, x : torch.FloatTensor) -> torch.FloatTensor:
+            
+            x = self.activation(self.full_connected_layer_1(x))
+            x = self.activation(self.full_connected_layer_2(x))
+            x = self.activation(self.full_connected_layer_3(x))
+            x = self.full_connected_layer_4(x)
+            
+            return x
     
-    stopped     : bool  = False
-    trained     : bool  = False
-    epoch_count : int   = 1
-    epochs      : int   = 1
-    loss        : float = 0.0
+    return SAE
 
 class InfoModel(BaseModel):
     
@@ -71,17 +74,17 @@ class MetricsModel(BaseModel):
     name    : str
     loss    : float
 
-info_data : InfoData = InfoData()
-
-router : APIRouter = APIRouter(prefix='/deep-learning/stacked-autoencoder', tags=['Deep Learning - Stacked Autoencoder'])
+router : APIRouter = APIRouter(prefix='/deep-learning/stacked-autoencoder', tags=['Deep Learning - Stacked Autoencoder'], route_class=telemetry.TimedRoute)
 
 # --- Utility 
 
-def convert(data : np.ndarray) -> list:
+def convert(data : np.ndarray, number_users : int, number_movies : int) -> list:
     """Convert the full data in a matrix Users - Movies - Ratings (Rows - Columns - Cells)
 
     Args:
         data (np.ndarray): Original data
+        number_users (int): Number of users (rows)
+        number_movies (int): Number of movies (columns)
 
     Returns:
         list: Converted data
@@ -103,74 +106,71 @@ def convert(data : np.ndarray) -> list:
     
     return converted_data
 
-def prepare_dataset() -> None:
-    """Connect to MongoDB database "LearningAI" and extract the documents from the collection 'movies'"""
+def prepare_dataset(training_version : str | None = None, test_version : str | None = None) -> dict:
+    """Connect to MongoDB database "LearningAI" and extract the documents from the collection 'movies'
     
-    global number_users
-    global number_movies
-    global training_set
-    global test_set
+    Args:
+        training_version (str | None, optional): Training collection fingerprint. Defaults to None.
+        test_version (str | None, optional): Test collection fingerprint. Defaults to None.
     
-    # * Read from MongoDB
+    Returns:
+        dict: { training_set, test_set, number_users, number_movies }
+    """
     
-    mongo_client : pymongo.MongoClient = pymongo.MongoClient(host='mongodb://localhost:27017/')
-
-    database : pymongo.database.Database = mongo_client.get_database('LearningAI')
-
-    movies_training_collection : pymongo.collection.Collection = database.get_collection('movies_training')
+    # * Read from MongoDB (local snapshot)
     
-    movies_test_collection : pymongo.collection.Collection = database.get_collection('movies_test')
-
-    cursor_training = movies_training_collection.find()
+    df_training : pd.DataFrame = snapshot.load_dataframe(CollectionName.MoviesTraining, version=training_version)
     
-    cursor_test = movies_test_collection.find()
+    df_test : pd.DataFrame = snapshot.load_dataframe(CollectionName.MoviesTest, version=test_version)
     
     # * Prepare dataset with Pandas
-
-    df_training : pd.DataFrame = pd.DataFrame(list(cursor_training))
-
-    df_training.drop(columns=['_id'], axis=1, inplace=True)
-    
-    df_test : pd.DataFrame = pd.DataFrame(list(cursor_test))
-
-    df_test.drop(columns=['_id'], axis=1, inplace=True)
     
     training_set    = df_training.to_numpy()
     test_set        = df_test.to_numpy()
 
-    number_users    = max(max(training_set[:, 0]), max(test_set[:, 0]))
-    number_movies   = max(max(training_set[:, 1]), max(test_set[:, 1]))
+    number_users    : int = int(max(max(training_set[:, 0]), max(test_set[:, 0])))
+    number_movies   : int = int(max(max(training_set[:, 1]), max(test_set[:, 1])))
 
-    training_set    = convert(training_set)
-    test_set        = convert(test_set)
+    training_set    = convert(training_set, number_users, number_movies)
+    test_set        = convert(test_set, number_users, number_movies)
 
     # >>> Conversions
 
     training_set    = torch.FloatTensor(training_set)
     test_set        = torch.FloatTensor(test_set)
     
-    # * Close
-    
-    cursor_training.close()
+    return dict(training_set=training_set, test_set=test_set, number_users=number_users, number_movies=number_movies)
+
+def dataset_handle() -> datasets.DatasetHandle:
+    """Prepared dataset, shared by all requests until one of the collections changes
+
+    Returns:
+        datasets.DatasetHandle: Dataset handle
+    """
     
-    cursor_test.close()
+    training_version    : str = snapshot.fingerprint(CollectionName.MoviesTraining)
+    test_version        : str = snapshot.fingerprint(CollectionName.MoviesTest)
     
-    mongo_client.close()
+    return datasets.cache.get(('stacked-autoencoder',), f'{training_version}/{test_version}', lambda: prepare_dataset(training_version, test_version))
 
-def train_model(epochs : int = 200) -> None:
-    """Train the Stacked Autoencoder (SAE)
+@jobs.task(JOB_KIND)
+def train_model(epochs : int = 200) -> str:
+    """Train the Stacked Autoencoder (SAE) (job task, runs in a worker process)
     
     Args:
         epochs (int, optional): Training epochs. Defaults to 200.
+    
+    Returns:
+        str: Saved model folder
     """
     
-    global sae
-    global info_data
+    context : jobs.JobContext = jobs.context()
     
-    info_data.trained   = False
-    info_data.epochs    = epochs
+    handle : datasets.DatasetHandle = dataset_handle()
 
-    sae = SAE()
+    number_movies : int = handle.number_movies
+
+    sae : torch.nn.Module = sae_class()(number_movies)
     
     criterion : torch.nn.MSELoss = torch.nn.MSELoss()
     
@@ -181,11 +181,11 @@ def train_model(epochs : int = 200) -> None:
         train_loss  : int  = 0
         counter     : float = 0.0
         
-        for user in range(number_users):
+        for user in range(handle.number_users):
             
             # * Add 1 (fake) dimension for a batch of 1
             
-            input_vector : torch.Tensor = torch.autograd.Variable(training_set[user]).unsqueeze(0)
+            input_vector : torch.Tensor = torch.autograd.Variable(handle.training_set[user]).unsqueeze(0)
             
             target_vector : torch.Tensor = input_vector.clone()
             
@@ -219,39 +219,50 @@ def train_model(epochs : int = 200) -> None:
         
         print(f'Epoch {epoch}: loss {train_loss / counter}')
         
-        info_data.epoch_count += 1
+        context.report(epoch_count=epoch, loss=float(train_loss / counter))
         
-        if info_data.stopped:
-            
-            info_data.trained       = False
-            info_data.epoch_count   = 1
-            
-            break
+        context.check() # ? Interrupt if the job has been cancelled
     
-    if not info_data.stopped:
-        
-        info_data.trained       = True
-        info_data.epoch_count   = 1
-        
-        # * Save the model
-        
-        if not os.path.exists(MODELS_DIR): os.mkdir(MODELS_DIR)
-        
-        model_path : str = f'{MODELS_DIR}/movies-epochs_{epochs}'
-        
-        if os.path.exists(model_path): shutil.rmtree(model_path)
-        
-        os.mkdir(model_path)
-        
-        torch.save(sae.state_dict(), f'{model_path}/state_dict.pt')
+    # * Save the model
     
-    else:
-        
-        info_data.stopped = False
+    if not os.path.exists(MODELS_DIR): os.mkdir(MODELS_DIR)
+    
+    model_path : str = f'{MODELS_DIR}/movies-epochs_{epochs}'
+    
+    if os.path.exists(model_path): shutil.rmtree(model_path)
+    
+    os.mkdir(model_path)
+    
+    torch.save(sae.state_dict(), f'{model_path}/state_dict.pt')
+    
+    return model_path
+
+def load_model(model_path : str, number_movies : int) -> 'torch.nn.Module':
+    """Load a saved SAE model
+
+    Args:
+        model_path (str): Model folder
+        number_movies (int): Number of movies (input and output features)
+
+    Returns:
+        torch.nn.Module: Model in evaluation mode
+    """
+    
+    sae_model : torch.nn.Module = sae_class()(number_movies)
+    
+    sae_model.load_state_dict(torch.load(f'{model_path}/state_dict.pt', weights_only=True))
+    sae_model.eval()
+    
+    return sae_model
 
-def test_model(sae_model : SAE) -> float:
+@telemetry.span(Stage.Predict)
+def test_model(sae_model : 'torch.nn.Module', handle : datasets.DatasetHandle) -> float:
     """Test the SAE model
 
+    Args:
+        sae_model (torch.nn.Module): Model to test
+        handle (datasets.DatasetHandle): Prepared dataset
+
     Returns:
         float: Loss value
     """
@@ -261,10 +272,12 @@ def test_model(sae_model : SAE) -> float:
     
     criterion : torch.nn.MSELoss = torch.nn.MSELoss()
 
-    for user in range(number_users):
+    number_movies : int = handle.number_movies
+
+    for user in range(handle.number_users):
         
-        input_vector  : torch.Tensor = torch.autograd.Variable(training_set[user]).unsqueeze(0)
-        target_vector : torch.Tensor = torch.autograd.Variable(test_set[user]).unsqueeze(0)
+        input_vector  : torch.Tensor = torch.autograd.Variable(handle.training_set[user]).unsqueeze(0)
+        target_vector : torch.Tensor = torch.autograd.Variable(handle.test_set[user]).unsqueeze(0)
         
         # * Skip data with no ratings (at least 1 is needed)
             
@@ -301,30 +314,40 @@ def dataset():
     
     # * Retrieve data from MongoDB dataset
     
-    prepare_dataset()
+    dataset_handle()
     
     # * JSON
     
     return {}
 
 @router.get(path='/train')
-def train(background_tasks : BackgroundTasks,
-          epochs : Annotated[int | None, Query(alias='epochs', title='Epochs >= 1')] = 200):
+def train(epochs : Annotated[int | None, Query(alias='epochs', title='Epochs >= 1')] = 200,
+          priority : Annotated[int | None, Query(alias='priority', title='Job priority (higher first)')] = 0):
+    
+    # * Train SAE (worker process)
     
-    # * Train RBM
+    dataset_handle() # ? Fail fast and refresh the local snapshot read by the worker
     
-    background_tasks.add_task(train_model, epochs)
+    job : dict = submit_job(JOB_KIND, dict(epochs=epochs), priority)
     
     # * JSON
     
-    return {}
+    return dict(id=job['id'])
 
 @router.get(path='/test')
 def test():
     
-    # * Test SAE
+    # * Test the last trained SAE
+    
+    job : jobs.Job = jobs.scheduler.latest_finished(JOB_KIND)
+    
+    if job is None:
+        
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='No model has been trained yet')
+    
+    handle : datasets.DatasetHandle = dataset_handle()
     
-    test_model(sae_model=sae)
+    test_model(sae_model=load_model(job.result, handle.number_movies), handle=handle)
     
     # * JSON
     
@@ -333,23 +356,20 @@ def test():
 @router.get(path='/status', response_model=InfoModel)
 def model_status():
     
-    return info_data
+    return jobs.training_status(JOB_KIND, loss=0.0)
 
 @router.get(path='/metrics', response_model=List[MetricsModel], status_code=status.HTTP_200_OK)
 def metrics():
     
+    handle : datasets.DatasetHandle = dataset_handle()
+    
     metrics_list : list = []
     
     for id, filename in enumerate(sorted(os.listdir(MODELS_DIR))):
         
         if not filename.startswith('movies') or os.path.isfile(f'{MODELS_DIR}/{filename}'): continue
         
-        sae_model : SAE = SAE()
-        
-        sae_model.load_state_dict(torch.load(f'{MODELS_DIR}/{filename}/state_dict.pt', weights_only=True))
-        sae_model.eval()
-        
-        loss : float = test_model(sae_model=sae_model)
+        loss : float = test_model(sae_model=load_model(f'{MODELS_DIR}/{filename}', handle.number_movies), handle=handle)
         
         metrics_list.append(dict(id=id, name=filename, loss=loss))
     
@@ -360,9 +380,6 @@ def metrics():
 @router.put(path='/stop-training', status_code=status.HTTP_200_OK)
 def stop_training():
     
-    global info_data
-    
-    info_data.stopped = True
-    info_data.trained = False
+    stop_latest_job(JOB_KIND)
     
     return {}
\ No newline at end of file
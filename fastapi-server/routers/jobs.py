@@ -0,0 +1,112 @@
+from common import jobs, telemetry
+from common.jobs import JobStatus
+
+from fastapi import APIRouter, HTTPException, Query, status
+from pydantic import BaseModel
+from typing import Annotated, Any, List
+
+# --- Params 
+
+class JobModel(BaseModel):
+    
+    id          : str
+    kind        : str
+    params      : dict
+    priority    : int
+    status      : JobStatus
+    created     : float
+    started     : float | None
+    finished    : float | None
+    progress    : dict
+    result      : Any
+    error       : str | None
+
+class SubmitModel(BaseModel):
+    
+    kind        : str
+    params      : dict  = {}
+    priority    : int   = 0
+
+router : APIRouter = APIRouter(prefix='/jobs', tags=['Jobs'], route_class=telemetry.TimedRoute)
+
+# --- Utility 
+
+def submit_job(kind : str, params : dict, priority : int = 0) -> dict:
+    """Queue a training job and translate scheduler errors into HTTP errors
+
+    Args:
+        kind (str): Registered task name
+        params (dict): Task keyword arguments
+        priority (int, optional): Higher runs first. Defaults to 0.
+
+    Returns:
+        dict: Job
+    """
+    
+    try:
+        
+        return jobs.scheduler.submit(kind, params, priority).to_dict()
+    
+    except jobs.UnknownJobError:
+        
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'The job kind {kind} does not exist')
+    
+    except TypeError as error:
+        
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(error))
+    
+    except jobs.QueueFullError as error:
+        
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(error))
+
+def stop_latest_job(kind : str) -> None:
+    """Cancel the latest job of a task if it is still queued or running
+
+    Args:
+        kind (str): Task name
+    """
+    
+    job : jobs.Job = jobs.scheduler.latest(kind)
+    
+    if job is not None: jobs.scheduler.cancel(job.id)
+
+# --- Router 
+
+# >>> GET
+
+@router.get(path='', response_model=List[JobModel])
+def list_jobs(kind : Annotated[str | None, Query(alias='kind', title='Task name')] = None,
+              job_status : Annotated[JobStatus | None, Query(alias='status', title='Job status')] = None):
+    
+    return [ job.to_dict() for job in jobs.scheduler.jobs(kind, job_status) ]
+
+@router.get(path='/{job_id}', response_model=JobModel)
+def get_job(job_id : str):
+    
+    job : jobs.Job = jobs.scheduler.get(job_id)
+    
+    if job is None:
+        
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'The job {job_id} has not been found')
+    
+    return job.to_dict()
+
+# >>> POST
+
+@router.post(path='', response_model=JobModel, status_code=status.HTTP_202_ACCEPTED)
+def submit(job : SubmitModel):
+    
+    return submit_job(job.kind, job.params, job.priority)
+
+# >>> DELETE
+
+@router.delete(path='/{job_id}', response_model=JobModel, status_code=status.HTTP_200_OK)
+def cancel_job(job_id : str):
+    
+    job : jobs.Job = jobs.scheduler.cancel(job_id)
+    
+    if job is None:
+        
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'The job {job_id} has not been found')
+    
+    return job.to_dict()
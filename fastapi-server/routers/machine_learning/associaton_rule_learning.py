@@ -1,10 +1,11 @@
 import numpy as np
 import pandas as pd
-import pymongo
 
 from random import randrange
 
-from common import utility
+from common import datasets, snapshot, telemetry, utility
+from common.database import CollectionName
+from common.telemetry import Stage
 
 from apyori import apriori
 from fastapi import APIRouter, Query
@@ -13,9 +14,7 @@ from typing import Optional, List, Annotated
 
 # --- Params 
 
-transactions : list = list()
-
-router : APIRouter = APIRouter(prefix='/machine-learning/association-rule-learning', tags=['Machine Learning - Association Rule Learning'])
+router : APIRouter = APIRouter(prefix='/machine-learning/association-rule-learning', tags=['Machine Learning - Association Rule Learning'], route_class=telemetry.TimedRoute)
 
 class Data(BaseModel):
     
@@ -50,30 +49,19 @@ def formatEclatRules(rules) -> list:
     return list(zip(left, right, support))
 
 
-def prepare_dataset() -> list:
+def prepare_dataset(version : str | None = None) -> dict:
     """Connect to MongoDB database "LearningAI" and extract the documents from the collection "market_basket_optimisation"
     
+    Args:
+        version (str | None, optional): Collection fingerprint. Defaults to None.
+    
     Returns:
-        list: [data]
+        dict: { data, transactions }
     """
     
-    global transactions
-    
-    # * Read from MongoDB
-    
-    mongo_client : pymongo.MongoClient = pymongo.MongoClient(host='mongodb://localhost:27017/')
-
-    database : pymongo.database.Database = mongo_client.get_database('LearningAI')
-
-    market_basket_optimisation_collection : pymongo.collection.Collection = database.get_collection('market_basket_optimisation')
-
-    cursor = market_basket_optimisation_collection.find()
-    
-    original_data : list = list(cursor)
-    
-    df : pd.DataFrame = pd.DataFrame(original_data)
+    # * Read from MongoDB (local snapshot)
     
-    df = df.drop(columns=['_id'], axis=1)
+    df : pd.DataFrame = snapshot.load_dataframe(CollectionName.MarketBasketOptimisation, version=version)
     
     # * Prepare data
     
@@ -91,17 +79,22 @@ def prepare_dataset() -> list:
     
     # * Prepare dataset
     
-    transactions = list()
+    transactions : list = list()
 
     for index, row in df.iterrows(): transactions.append([str(item) for item in row])
     
-    # * Close
-    
-    cursor.close()
+    return dict(data=data, transactions=transactions)
+
+def dataset_handle() -> datasets.DatasetHandle:
+    """Prepared dataset, shared by all requests until the collection changes
+
+    Returns:
+        datasets.DatasetHandle: Dataset handle
+    """
     
-    mongo_client.close()
+    version : str = snapshot.fingerprint(CollectionName.MarketBasketOptimisation)
     
-    return data
+    return datasets.cache.get(('association-rule-learning',), version, lambda: prepare_dataset(version))
 
 # --- Router 
 
@@ -110,7 +103,7 @@ def dataset():
     
     # * Retrieve data from MongoDB dataset
     
-    data = prepare_dataset()
+    data : list = dataset_handle().data
     
     # * JSON
     
@@ -119,53 +112,65 @@ def dataset():
 @router.get(path="/apriori-rules", response_model=List[BestResult])
 def apriori_rules(largest : Annotated[int | None, Query(alias='largest', title='Best results [1, 10]')] = 5):
     
+    handle : datasets.DatasetHandle = dataset_handle()
+    
     # * Training
     
-    rules : list = list(apriori(transactions=transactions, min_support=0.003, min_confidence=0.2, min_lift=3, min_length=2, max_length=3))
+    with telemetry.span(Stage.Fit):
+        
+        rules : list = list(apriori(transactions=handle.transactions, min_support=0.003, min_confidence=0.2, min_lift=3, min_length=2, max_length=3))
 
-    results : pd.DataFrame = pd.DataFrame(data=formatAprioriRules(rules), columns=[ 'Left', 'Right', 'Support', 'Confidence', 'Lift' ])
+        results : pd.DataFrame = pd.DataFrame(data=formatAprioriRules(rules), columns=[ 'Left', 'Right', 'Support', 'Confidence', 'Lift' ])
 
-    results = results.nlargest(n=largest, columns='Lift')
+        results = results.nlargest(n=largest, columns='Lift')
 
     # * JSON
     
-    best_results : list = list()
-    
-    for index, row in results.iterrows():
+    with telemetry.span(Stage.Serialize):
+        
+        best_results : list = list()
         
-        best_results.append(
-            {
-                'Left': str(row['Left']).replace('(', '').replace(')', '').replace('\'', '').removesuffix(','),
-                'Right': str(row['Right']).replace('(', '').replace(')', '').replace('\'', '').removesuffix(','),
-                'Support': float(row['Support']),
-                'Confidence': float(row['Confidence']),
-                'Lift': float(row['Lift'])
-            })
+        for index, row in results.iterrows():
+            
+            best_results.append(
+                {
+                    'Left': str(row['Left']).replace('(', '').replace(')', '').replace('\'', '').removesuffix(','),
+                    'Right': str(row['Right']).replace('(', '').replace(')', '').replace('\'', '').removesuffix(','),
+                    'Support': float(row['Support']),
+                    'Confidence': float(row['Confidence']),
+                    'Lift': float(row['Lift'])
+                })
     
     return best_results
 
 @router.get(path="/eclat-rules", response_model=List[BestResult])
 def eclat_rules(largest : Annotated[int | None, Query(alias='largest', title='Best results [1, 10]')] = 5):
     
+    handle : datasets.DatasetHandle = dataset_handle()
+    
     # * Training
     
-    rules : list = list(apriori(transactions=transactions, min_support=0.003, min_confidence=0.2, min_lift=3, min_length=2, max_length=3))
+    with telemetry.span(Stage.Fit):
+        
+        rules : list = list(apriori(transactions=handle.transactions, min_support=0.003, min_confidence=0.2, min_lift=3, min_length=2, max_length=3))
 
-    results : pd.DataFrame = pd.DataFrame(data=formatEclatRules(rules), columns=[ 'Left', 'Right', 'Support' ])
+        results : pd.DataFrame = pd.DataFrame(data=formatEclatRules(rules), columns=[ 'Left', 'Right', 'Support' ])
 
-    results = results.nlargest(n=largest, columns='Support')
+        results = results.nlargest(n=largest, columns='Support')
     
     # * JSON
     
-    best_results : list = list()
-    
-    for index, row in results.iterrows():
+    with telemetry.span(Stage.Serialize):
+        
+        best_results : list = list()
         
-        best_results.append(
-            {
-                'Left': str(row['Left']).replace('(', '').replace(')', '').replace('\'', '').removesuffix(','),
-                'Right': str(row['Right']).replace('(', '').replace(')', '').replace('\'', '').removesuffix(','),
-                'Support': float(row['Support'])
-            })
+        for index, row in results.iterrows():
+            
+            best_results.append(
+                {
+                    'Left': str(row['Left']).replace('(', '').replace(')', '').replace('\'', '').removesuffix(','),
+                    'Right': str(row['Right']).replace('(', '').replace(')', '').replace('\'', '').removesuffix(','),
+                    'Support': float(row['Support'])
+                })
     
     return best_results
\ No newline at end of file
@@ -1,10 +1,14 @@
+import numpy as np
 import pandas as pd
-import pymongo
+import time
 
-from common import utility
+from common import batching, datasets, forests, kernels, memo, models, neighbors, pool, responses, snapshot, telemetry, utility
+from common.database import CollectionName
+from common.responses import Layout
+from common.telemetry import Stage
 
-from enum import IntEnum
-from fastapi import APIRouter, Query
+from enum import IntEnum, StrEnum
+from fastapi import APIRouter, HTTPException, Query, status, UploadFile
 from pydantic import BaseModel
 from sklearn.compose import ColumnTransformer
 from sklearn.decomposition import PCA, KernelPCA
@@ -14,6 +18,7 @@ from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import accuracy_score, confusion_matrix
 from sklearn.model_selection import train_test_split
 from sklearn.naive_bayes import GaussianNB
+from sklearn.pipeline import Pipeline
 from sklearn.neighbors import KNeighborsClassifier
 from sklearn.preprocessing import OneHotEncoder, StandardScaler
 from sklearn.svm import SVC
@@ -21,16 +26,8 @@ from sklearn.tree import DecisionTreeClassifier
 from typing import Annotated, List
 
 # --- Parmas 
-    
-X           = None
-X_train     = None
-X_test      = None
-y           = None
-y_train     = None
-y_test      = None
-reduction   = None
 
-router : APIRouter = APIRouter(prefix='/machine-learning/classification', tags=['Machine Learning - Classification'])
+router : APIRouter = APIRouter(prefix='/machine-learning/classification', tags=['Machine Learning - Classification'], route_class=telemetry.TimedRoute)
 
 class Data(BaseModel):
     
@@ -43,6 +40,22 @@ class Data(BaseModel):
     Embarked: int   # ? 0-C = Cherbourg, 1-Q = Queenstown, 2-S = Southampton
     Survived: bool
 
+DataColumns : type[BaseModel] = responses.columns_model(Data) # ? layout=columns
+
+class PassengerData(BaseModel):
+    
+    Age     : int
+    Fare    : float
+    Sex     : int   # ? 0 = Male, 1 = Female
+    Sibsp   : int
+    Parch   : int
+    Pclass  : int   # ? 1 = 1st, 2 = 2nd, 3 = 3rd
+    Embarked: int   # ? 0-C = Cherbourg, 1-Q = Queenstown, 2-S = Southampton
+
+class PredictionData(BaseModel):
+    
+    Survived: bool
+
 class ConfusionMatrix(BaseModel):
     
     TN: int     # ? True-Negative
@@ -51,11 +64,41 @@ class ConfusionMatrix(BaseModel):
     TP: int     # ? True-Positive
     AC: float   # ? Accuracy
 
+class NeighborsData(BaseModel):
+    
+    neighbors   : int
+    TN          : int
+    FN          : int
+    FP          : int
+    TP          : int
+    AC          : float
+
+class ScoreData(BaseModel):
+    
+    name        : str
+    TN          : int
+    FN          : int
+    FP          : int
+    TP          : int
+    AC          : float
+    fit_ms      : float
+    predict_ms  : float
+
+class ClassifierType(StrEnum):
+    
+    LogisticRegression  = 'logistic-regression'
+    KNearestNeighbors   = 'k-nearest-neighbors'
+    SupportVector       = 'support-vector-classification'
+    NaiveBayes          = 'naive-bayes'
+    DecisionTree        = 'decision-tree-classification'
+    RandomForest        = 'random-forest-classification'
+
 class DimensionalityReductionType(IntEnum):
         
     PrincipalComponentAnalysis          = 1
     LinearDiscriminantAnalysis          = 2
     KernelPrincipalComponentAnalysis    = 3
+    ApproximateKernelPCA                = 4 # ? Nystroem landmarks within KERNEL_PCA_BUDGET_MB
 
 class KernelType(IntEnum):
     
@@ -67,61 +110,43 @@ class KernelType(IntEnum):
     
 # --- Utility 
 
-def prepare_dataset(method : DimensionalityReductionType) -> list:
+def prepare_dataset(version : str | None = None) -> dict:
     """Connect to MongoDB database "LearningAI" and extract the documents from the collection "titanic"
     
+    The encoding and scaling stages are shared by every dimensionality reduction method (see reduce_dataset).
+    
     Args:
-        method (DimensionalityReductionType): Method used for dimensionality reduction
+        version (str | None, optional): Collection fingerprint. Defaults to None.
 
     Returns:
-        list: [data]
+        dict: { columns, X, X_train, X_test, y, y_train, y_test, preprocessing }
     """
     
-    global X
-    global X_train
-    global X_test
-    global y
-    global y_train
-    global y_test
+    # * Read from MongoDB (local snapshot)
     
-    # * Read from MongoDB
-    
-    mongo_client : pymongo.MongoClient = pymongo.MongoClient(host='mongodb://localhost:27017/')
-
-    database : pymongo.database.Database = mongo_client.get_database('LearningAI')
-
-    titanic_collection : pymongo.collection.Collection = database.get_collection('titanic')
-
-    cursor = titanic_collection.find()
+    original_data : pd.DataFrame = snapshot.load_dataframe(CollectionName.Titanic, version=version)
     
     # * Prepare data
     
-    original_data : list = list(cursor)
-    
-    temp : pd.DataFrame = pd.DataFrame(original_data)
+    temp : pd.DataFrame = original_data.copy()
     
-    temp['Age'] = temp['Age'].astype('int64')
+    temp['Age']         = temp['Age'].astype('int64')
+    temp['Survived']    = temp['Survived'].astype('bool')
     
-    temp = temp.drop(columns=['_id', 'Passengerid'], axis=1)
-    
-    data = temp.to_dict(orient='records')
+    columns : dict = { name: temp[name].to_numpy() for name in Data.model_fields } # ? Response columns
     
     # * Prepare dataset with Pandas
 
-    df : pd.DataFrame = pd.DataFrame(original_data)
-
-    df = df.drop(columns=['_id', 'Passengerid'], axis=1)
+    df : pd.DataFrame = original_data.drop(columns=['Passengerid', 'Survived'], axis=1)
     
     # >>> Encoding
     
     features : list = [ 'Sex', 'Sibsp', 'Parch', 'Pclass', 'Embarked' ]
 
-    ct = ColumnTransformer(transformers=[('encoder', OneHotEncoder(), features)], remainder='passthrough')
-
-    df = pd.DataFrame(ct.fit_transform(df), columns=ct.get_feature_names_out())
+    ct = ColumnTransformer(transformers=[('encoder', OneHotEncoder(), features)], remainder='passthrough', sparse_threshold=0)
 
-    X = df.iloc[:, :-1].values
-    y = df.iloc[:, -1].values
+    X = ct.fit_transform(df).astype('float64')
+    y = original_data['Survived'].to_numpy(dtype='float64')
     
     # >>> Train / Test Split
 
@@ -134,134 +159,436 @@ def prepare_dataset(method : DimensionalityReductionType) -> list:
     X_train = scaler.fit_transform(X_train)
     X_test = scaler.transform(X_test)
     
+    preprocessing : Pipeline = Pipeline([ ('encoder', ct), ('scaler', scaler) ]) # ? Fitted stages, raw rows => scaled features
+    
+    return dict(columns=columns, X=X, X_train=X_train, X_test=X_test, y=y, y_train=y_train, y_test=y_test, preprocessing=preprocessing)
+
+def reduce_dataset(base : datasets.DatasetHandle, method : DimensionalityReductionType) -> dict:
+    """Fit the dimensionality reduction of the given method on the shared encoded and scaled dataset
+
+    Args:
+        base (datasets.DatasetHandle): Encoded and scaled dataset (see prepare_dataset)
+        method (DimensionalityReductionType): Method used for dimensionality reduction
+
+    Returns:
+        dict: { columns, X, X_train, X_test, y, y_train, y_test, pipeline } with pipeline = raw rows => reduced features
+    """
+    
+    X_train, X_test = base.X_train, base.X_test
+    
     # >>> Dimensionality Reduction
 
     match method:
         
-        case DimensionalityReductionType.PrincipalComponentAnalysis:
-            
-            reduction = PCA(n_components=2)
-            
-            X_train = reduction.fit_transform(X_train)
-            X_test = reduction.transform(X_test)
-            
-        case DimensionalityReductionType.LinearDiscriminantAnalysis:
-            
-            reduction = LDA(n_components=1)
-            
-            X_train = reduction.fit_transform(X_train, y_train)
-            X_test = reduction.transform(X_test)
-            
-        case DimensionalityReductionType.KernelPrincipalComponentAnalysis:
-            
-            reduction = KernelPCA(n_components=2, kernel='rbf')
-            
-            X_train = reduction.fit_transform(X_train)
-            X_test = reduction.transform(X_test)
+        case DimensionalityReductionType.PrincipalComponentAnalysis:        reduction = PCA(n_components=2)
+        case DimensionalityReductionType.LinearDiscriminantAnalysis:        reduction = LDA(n_components=1)
+        case DimensionalityReductionType.KernelPrincipalComponentAnalysis:  reduction = KernelPCA(n_components=2, kernel='rbf')
+        case DimensionalityReductionType.ApproximateKernelPCA:              reduction = kernels.approximate_kernel_pca(*X_train.shape, n_components=2)
+        case _:                                                             reduction = None
+    
+    if reduction is not None:
         
-        case _:
-            
-            pass
+        X_train = reduction.fit_transform(X_train, base.y_train)
+        X_test  = reduction.transform(X_test)
+    
+    pipeline : Pipeline = Pipeline([ ('preprocessing', base.preprocessing), ('reduction', reduction or 'passthrough') ])
+    
+    return dict(columns=base.columns, X=base.X, X_train=X_train, X_test=X_test, y=base.y, y_train=base.y_train, y_test=base.y_test, pipeline=pipeline)
+
+def dataset_version() -> str:
+    """Version of the "titanic" collection
+
+    Returns:
+        str: Collection fingerprint
+    """
     
-    # * Close
+    return snapshot.fingerprint(CollectionName.Titanic)
+
+def dataset_handle(method : DimensionalityReductionType) -> datasets.DatasetHandle:
+    """Prepared dataset for the given dimensionality reduction, shared by all requests until the collection changes
+
+    The encoded and scaled dataset is built once and shared, each method only adds its fitted reduction.
+
+    Args:
+        method (DimensionalityReductionType): Method used for dimensionality reduction
+
+    Returns:
+        datasets.DatasetHandle: Dataset handle
+    """
     
-    cursor.close()
+    version : str = dataset_version()
     
-    mongo_client.close()
+    base : datasets.DatasetHandle = datasets.cache.get(('classification',), version, lambda: prepare_dataset(version))
     
-    return data
+    return datasets.cache.get(('classification', int(method)), version, lambda: reduce_dataset(base, method))
 
-def train_and_json(model) -> dict:
+def train_and_json(model, handle : datasets.DatasetHandle, fitted : bool = False) -> dict:
     """Train with the given model and prepare the JSON response
     
     Args:
         model (any): Classification model
+        handle (datasets.DatasetHandle): Prepared dataset
+        fitted (bool, optional): Model already fitted on the training split (e.g. from the forest cache). Defaults to False.
 
     Returns:
         dict: JSON response
     """
     
-    if len(X_test[0]) > 1:
+    if len(handle.X_test[0]) > 1:
         
         return { "TN": 0, "FN": 0, "FP": 0, "TP": 0, "AC": 0.0 }
     
     # * Training
 
+    if not fitted:
+        
+        with telemetry.span(Stage.Fit): model.fit(handle.X_train, handle.y_train)
+    
+    with telemetry.span(Stage.Predict):
+        
+        prediction = model.predict(handle.X_test)
+
+        cm = confusion_matrix(handle.y_test, prediction)
+        
+        accuracy = accuracy_score(handle.y_test, prediction)
+        
+        #values = model.predict(reduction.transform(X))
+    
+    # * JSON
+    
+    return { "TN": int(cm[0][0]), "FN": int(cm[1][0]), "FP": int(cm[0][1]), "TP": int(cm[1][1]), "AC": accuracy }
+
+def kernel_name(kernel : int) -> str:
+    """SVC kernel name of the given KernelType
+
+    Args:
+        kernel (int): KernelType value
+
+    Returns:
+        str: Kernel name ("linear" for unknown values)
+    """
+    
+    match kernel:
+        
+        case KernelType.Poly:           return "poly"
+        case KernelType.Rbf:            return "rbf"
+        case KernelType.Sigmoid:        return "sigmoid"
+        case KernelType.Precomputed:    return "precomputed"
+        case _:                         return "linear"
+
+def make_classifier(classifier : ClassifierType, neighbors : int = 5, kernel : int = 1, estimators : int = 10):
+    """Unfitted classifier with the parameters of its endpoint
+
+    Args:
+        classifier (ClassifierType): Classification algorithm
+        neighbors (int, optional): Neighbours of the k-nearest neighbors. Defaults to 5.
+        kernel (int, optional): KernelType of the support vector classification. Defaults to 1.
+        estimators (int, optional): Number of trees of the random forest. Defaults to 10.
+
+    Returns:
+        ClassifierMixin: Classification model
+    """
+    
+    match classifier:
+        
+        case ClassifierType.LogisticRegression: return LogisticRegression(random_state=42)
+        case ClassifierType.KNearestNeighbors:  return KNeighborsClassifier(n_neighbors=neighbors, metric='minkowski', p=2)
+        case ClassifierType.SupportVector:      return SVC(kernel=kernel_name(kernel), random_state=42)
+        case ClassifierType.NaiveBayes:         return GaussianNB()
+        case ClassifierType.DecisionTree:       return DecisionTreeClassifier(criterion='entropy', random_state=42)
+        case ClassifierType.RandomForest:       return RandomForestClassifier(n_estimators=estimators, criterion='entropy', random_state=42)
+
+def score_classifier(classifier : ClassifierType, X_train : np.ndarray, X_test : np.ndarray, y_train : np.ndarray, y_test : np.ndarray, **params) -> dict:
+    """Fit a classifier and measure it on the test split (runs in the process pool, same results as train_and_json)
+
+    Args:
+        classifier (ClassifierType): Classification algorithm
+        X_train (np.ndarray): Training inputs
+        X_test (np.ndarray): Test inputs
+        y_train (np.ndarray): Training targets
+        y_test (np.ndarray): Test targets
+        params (dict): Parameters of make_classifier
+
+    Returns:
+        dict: { name, TN, FN, FP, TP, AC, fit_ms, predict_ms }
+    """
+    
+    if X_test.shape[1] > 1: return { "name": str(classifier), "TN": 0, "FN": 0, "FP": 0, "TP": 0, "AC": 0.0, "fit_ms": 0.0, "predict_ms": 0.0 }
+    
+    model = make_classifier(classifier, **params)
+    
+    start : float = time.perf_counter()
+    
     model.fit(X_train, y_train)
     
+    fit_time : float = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    
     prediction = model.predict(X_test)
-
+    
+    predict_time : float = time.perf_counter() - start
+    
     cm = confusion_matrix(y_test, prediction)
     
-    accuracy = accuracy_score(y_test, prediction)
+    return\
+    {
+        "name": str(classifier),
+        "TN": int(cm[0][0]),
+        "FN": int(cm[1][0]),
+        "FP": int(cm[0][1]),
+        "TP": int(cm[1][1]),
+        "AC": float(accuracy_score(y_test, prediction)),
+        "fit_ms": fit_time * 1000.0,
+        "predict_ms": predict_time * 1000.0
+    }
+
+def classifier_params(classifier : ClassifierType, neighbors : int, kernel : int, estimators : int) -> dict:
+    """Parameters of make_classifier used by the given algorithm (the others do not change the model)
+
+    Args:
+        classifier (ClassifierType): Classification algorithm
+        neighbors (int): Neighbours of the k-nearest neighbors
+        kernel (int): KernelType of the support vector classification
+        estimators (int): Number of trees of the random forest
+
+    Returns:
+        dict: Parameters
+    """
     
-    #values = model.predict(reduction.transform(X))
+    match classifier:
+        
+        case ClassifierType.KNearestNeighbors:  return { 'neighbors': neighbors }
+        case ClassifierType.SupportVector:      return { 'kernel': kernel }
+        case ClassifierType.RandomForest:       return { 'estimators': estimators }
+        case _:                                 return {}
+
+def fitted_classifier(handle : datasets.DatasetHandle, classifier : ClassifierType, **params) -> Pipeline:
+    """Fitted encoder, scaler, reduction and classifier, fitted once per dataset version and kept in the model registry
+
+    Args:
+        handle (datasets.DatasetHandle): Prepared dataset
+        classifier (ClassifierType): Classification algorithm
+        params (dict): Parameters of make_classifier (see classifier_params)
+
+    Returns:
+        Pipeline: Raw passengers => predicted survival
+    """
     
-    # * JSON
+    def fit() -> Pipeline:
+        
+        if classifier == ClassifierType.SupportVector and params.get('kernel') == KernelType.Precomputed: model = kernels.KernelSVC(handle.key, handle.version)
+        else: model = make_classifier(classifier, **params)
+        
+        with telemetry.span(Stage.Fit): model.fit(handle.X_train, handle.y_train)
+        
+        return Pipeline([ *handle.pipeline.steps, ('classifier', model) ])
     
-    return { "TN": int(cm[0][0]), "FN": int(cm[1][0]), "FP": int(cm[0][1]), "TP": int(cm[1][1]), "AC": accuracy }
+    return models.registry.get((*handle.key, str(classifier), *params.items()), handle.version, fit)
+
+def predict_rows(model : Pipeline, rows : list) -> np.ndarray:
+    """Survival of raw passengers
+
+    Args:
+        model (Pipeline): Fitted pipeline (see fitted_classifier)
+        rows (list): Passengers as dictionaries of PassengerData fields
+
+    Returns:
+        np.ndarray: Predicted survival
+    """
+    
+    return model.predict(pd.DataFrame.from_records(rows, columns=list(PassengerData.model_fields))).astype('bool')
+
+batcher : batching.MicroBatcher = batching.MicroBatcher('classification', predict_rows) # ? Concurrent single passengers are predicted together
 
 # --- Router 
 
-@router.get(path="/dataset", response_model=List[Data])
-def dataset(method : Annotated[int | None, Query(alias='method', title='Dimensionality Reduction method [1, 2, 3]')] = 2):
+@router.get(path="/dataset", response_model=List[Data] | DataColumns, response_class=responses.FastJSONResponse, responses=responses.ndjson(Data))
+def dataset(method : Annotated[int | None, Query(alias='method', title='Dimensionality Reduction method [1, 2, 3, 4]')] = 2,
+            layout : Annotated[Layout, Query(alias='layout', title='Response layout [rows, columns]')] = Layout.Rows,
+            stream : Annotated[bool, Query(alias='stream', title='NDJSON stream of rows')] = False):
     
     # * Retrieve data from MongoDB dataset
     
-    data = prepare_dataset(method=method)
+    handle : datasets.DatasetHandle = dataset_handle(method=method)
     
     # * JSON
     
-    return data
+    if stream: return responses.stream(**handle.columns)
+    
+    return responses.FastJSONResponse(responses.table(layout, **handle.columns))
 
 @router.get(path="/logistic-regression", response_model=ConfusionMatrix)
-def logistic_regression():
+@memo.memoize(lambda **_: dataset_version())
+def logistic_regression(method : Annotated[int | None, Query(alias='method', title='Dimensionality Reduction method [1, 2, 3, 4]')] = 2):
     
     model = LogisticRegression(random_state=42)
     
-    return train_and_json(model)
+    return train_and_json(model, dataset_handle(method=method))
 
 @router.get(path="/k-nearest-neighbors", response_model=ConfusionMatrix)
-def k_nearest_neighbors(neighbors : Annotated[int | None, Query(alias='neighbors', title='# Neighbours >= 1')] = 5):
+@memo.memoize(lambda **_: dataset_version())
+def k_nearest_neighbors(method : Annotated[int | None, Query(alias='method', title='Dimensionality Reduction method [1, 2, 3, 4]')] = 2,
+                        k : Annotated[int | None, Query(alias='neighbors', title='# Neighbours >= 1')] = 5):
+    
+    handle : datasets.DatasetHandle = dataset_handle(method=method)
     
-    model = KNeighborsClassifier(n_neighbors=neighbors, metric='minkowski', p=2) # ! p = 2 => Euclidean
+    # * Neighbor index of the training split (built once, the test neighbors are kept for the largest k)
+    
+    with telemetry.span(Stage.Fit): index : neighbors.NeighborIndex = neighbors.index(handle.key, handle.version, handle.X_train, handle.y_train, p=2) # ! p = 2 => Euclidean
 
-    return train_and_json(model)
+    return train_and_json(neighbors.NeighborClassifier(index, 'test', k), handle, fitted=True)
 
 @router.get(path="/support-vector-classification", response_model=ConfusionMatrix)
-def support_vector_classification(kernel : Annotated[int | None, Query(alias='kernel', title='SVM Kernel [1, 2, 3, 4, 5]')] = 1):
+@memo.memoize(lambda **_: dataset_version())
+def support_vector_classification(method : Annotated[int | None, Query(alias='method', title='Dimensionality Reduction method [1, 2, 3, 4]')] = 2,
+                                  kernel : Annotated[int | None, Query(alias='kernel', title='SVM Kernel [1, 2, 3, 4, 5]')] = 1):
     
-    kernel_name = "linear"
+    handle : datasets.DatasetHandle = dataset_handle(method=method)
     
-    match kernel:
-        
-        case KernelType.Linear:         kernel_name = "linear"
-        case KernelType.Poly:           kernel_name = "poly"
-        case KernelType.Rbf:            kernel_name = "rbf"
-        case KernelType.Sigmoid:        kernel_name = "sigmoid"
-        case KernelType.Precomputed:    kernel_name = "precomputed"
+    # ? Precomputed = RBF kernel ("scale" gamma) from the cached kernel matrix of the training split
     
-    model = SVC(kernel=kernel_name, random_state=42)
+    model = kernels.KernelSVC(handle.key, handle.version) if kernel == KernelType.Precomputed else SVC(kernel=kernel_name(kernel), random_state=42)
 
-    return train_and_json(model)
+    return train_and_json(model, handle)
 
 @router.get(path="/naive-bayes", response_model=ConfusionMatrix)
-def naive_bayes():
+@memo.memoize(lambda **_: dataset_version())
+def naive_bayes(method : Annotated[int | None, Query(alias='method', title='Dimensionality Reduction method [1, 2, 3, 4]')] = 2):
     
     model = GaussianNB()
     
-    return train_and_json(model)
+    return train_and_json(model, dataset_handle(method=method))
 
 @router.get(path="/decision-tree-classification", response_model=ConfusionMatrix)
-def decision_tree_classifier():
+@memo.memoize(lambda **_: dataset_version())
+def decision_tree_classifier(method : Annotated[int | None, Query(alias='method', title='Dimensionality Reduction method [1, 2, 3, 4]')] = 2):
     
     model = DecisionTreeClassifier(criterion='entropy', random_state=42)
     
-    return train_and_json(model)
+    return train_and_json(model, dataset_handle(method=method))
 
 @router.get(path="/random-forest-classification", response_model=ConfusionMatrix)
-def random_forest_classification(estimators : Annotated[int | None, Query(alias='estimators', title='Number of trees >= 1')] = 10):
+@memo.memoize(lambda **_: dataset_version())
+def random_forest_classification(method : Annotated[int | None, Query(alias='method', title='Dimensionality Reduction method [1, 2, 3, 4]')] = 2,
+                                 estimators : Annotated[int | None, Query(alias='estimators', title='Number of trees >= 1')] = 10):
+    
+    handle : datasets.DatasetHandle = dataset_handle(method=method)
+    
+    model = forests.cache.fit((*handle.key, 'entropy'), handle.version, lambda: RandomForestClassifier(criterion='entropy', random_state=42), handle.X_train, handle.y_train, estimators)
+    
+    return train_and_json(model, handle, fitted=True)
+
+@router.get(path="/leaderboard", response_model=List[ScoreData], response_class=responses.FastJSONResponse)
+@memo.memoize(lambda **_: dataset_version())
+def leaderboard(method : Annotated[int | None, Query(alias='method', title='Dimensionality Reduction method [1, 2, 3, 4]')] = 2,
+                neighbors : Annotated[int, Query(alias='neighbors', title='# Neighbours >= 1', ge=1)] = 5,
+                kernel : Annotated[int, Query(alias='kernel', title='SVM Kernel [1, 2, 3, 4]', ge=1, le=4)] = 1,
+                estimators : Annotated[int, Query(alias='estimators', title='Number of trees >= 1', ge=1)] = 10):
+    
+    handle : datasets.DatasetHandle = dataset_handle(method=method)
     
-    model = RandomForestClassifier(n_estimators=estimators, criterion='entropy', random_state=42)
+    # * Training (same reduced matrices for every classifier, fitted in parallel worker processes)
     
-    return train_and_json(model)
\ No newline at end of file
+    with telemetry.span(Stage.Fit):
+        
+        futures : list = [ pool.executor().submit(score_classifier, classifier, handle.X_train, handle.X_test, handle.y_train, handle.y_test, neighbors=neighbors, kernel=kernel, estimators=estimators) for classifier in ClassifierType ]
+        
+        scores : list = [ future.result() for future in futures ]
+    
+    # * JSON
+    
+    return responses.FastJSONResponse(sorted(scores, key=lambda score: score['AC'], reverse=True))
+
+@router.get(path="/k-nearest-neighbors/sweep", response_model=List[NeighborsData], response_class=responses.FastJSONResponse)
+@memo.memoize(lambda **_: dataset_version())
+def k_nearest_neighbors_sweep(method : Annotated[int | None, Query(alias='method', title='Dimensionality Reduction method [1, 2, 3, 4]')] = 2,
+                              max_neighbors : Annotated[int, Query(alias='max_neighbors', title='Highest # Neighbours [1, 100]', ge=1, le=100)] = 25):
+    
+    handle : datasets.DatasetHandle = dataset_handle(method=method)
+    
+    ks : list = list(range(1, max_neighbors + 1))
+    
+    if len(handle.X_test[0]) > 1: return [ { "neighbors": k, "TN": 0, "FN": 0, "FP": 0, "TP": 0, "AC": 0.0 } for k in ks ]
+    
+    # * Training (one query of the largest k answers every k)
+    
+    with telemetry.span(Stage.Fit): index : neighbors.NeighborIndex = neighbors.index(handle.key, handle.version, handle.X_train, handle.y_train, p=2)
+    
+    with telemetry.span(Stage.Predict): predictions : dict = index.sweep('test', handle.X_test, ks)
+    
+    # * JSON
+    
+    sweep : list = list()
+    
+    for k, prediction in predictions.items():
+        
+        cm = confusion_matrix(handle.y_test, prediction, labels=index.classes_)
+        
+        sweep.append({ "neighbors": k, "TN": int(cm[0][0]), "FN": int(cm[1][0]), "FP": int(cm[0][1]), "TP": int(cm[1][1]), "AC": float(accuracy_score(handle.y_test, prediction)) })
+    
+    return responses.FastJSONResponse(sweep)
+
+@router.post(path="/predict", response_model=PredictionData | List[PredictionData])
+def predict(passengers : PassengerData | List[PassengerData],
+            classifier : Annotated[ClassifierType, Query(alias='classifier', title='Classification algorithm')] = ClassifierType.LogisticRegression,
+            method : Annotated[int | None, Query(alias='method', title='Dimensionality Reduction method [1, 2, 3, 4]')] = 2,
+            neighbors : Annotated[int, Query(alias='neighbors', title='# Neighbours >= 1', ge=1)] = 5,
+            kernel : Annotated[int, Query(alias='kernel', title='SVM Kernel [1, 2, 3, 4, 5]', ge=1, le=5)] = 1,
+            estimators : Annotated[int, Query(alias='estimators', title='Number of trees >= 1', ge=1)] = 10):
+    
+    handle : datasets.DatasetHandle = dataset_handle(method=method)
+    
+    model : Pipeline = fitted_classifier(handle, classifier, **classifier_params(classifier, neighbors, kernel, estimators))
+    
+    # * Prediction (a single passenger joins the concurrent ones, a batch is already vectorized)
+    
+    rows : list = [ passenger.model_dump() for passenger in passengers ] if isinstance(passengers, list) else [ passengers.model_dump() ]
+    
+    if not rows: return []
+    
+    try:
+        
+        if isinstance(passengers, list):
+            
+            with telemetry.span(Stage.Predict): prediction : list = predict_rows(model, rows).tolist()
+        
+        else:
+            
+            prediction : list = batcher.predict(model, rows)
+    
+    except ValueError as error:
+        
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(error)) # ? e.g. category not seen in training
+    
+    # * JSON
+    
+    predictions : list = [ { "Survived": bool(survived) } for survived in prediction ]
+    
+    return predictions if isinstance(passengers, list) else predictions[0]
+
+@router.post(path="/predict/csv")
+def predict_csv(file : UploadFile,
+                classifier : Annotated[ClassifierType, Query(alias='classifier', title='Classification algorithm')] = ClassifierType.LogisticRegression,
+                method : Annotated[int | None, Query(alias='method', title='Dimensionality Reduction method [1, 2, 3, 4]')] = 2,
+                neighbors : Annotated[int, Query(alias='neighbors', title='# Neighbours >= 1', ge=1)] = 5,
+                kernel : Annotated[int, Query(alias='kernel', title='SVM Kernel [1, 2, 3, 4, 5]', ge=1, le=5)] = 1,
+                estimators : Annotated[int, Query(alias='estimators', title='Number of trees >= 1', ge=1)] = 10):
+    
+    handle : datasets.DatasetHandle = dataset_handle(method=method)
+    
+    model : Pipeline = fitted_classifier(handle, classifier, **classifier_params(classifier, neighbors, kernel, estimators))
+    
+    # * Stream the passengers of the CSV (PassengerData columns, the others are skipped) through the fitted pipeline
+    
+    source = responses.spool(file.file) # ? FastAPI closes the uploaded file when the endpoint returns, before the response is streamed
+    
+    columns : list = list(PassengerData.model_fields)
+    
+    try:
+        
+        return responses.score_csv(source, columns, lambda chunk: { "Survived": model.predict(chunk[columns]).astype('bool') }, name='classification')
+    
+    except ValueError as error:
+        
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(error))
@@ -1,8 +1,10 @@
 import numpy as np
 import pandas as pd
-import pymongo
 
-from common import utility
+from common import datasets, memo, responses, snapshot, telemetry, utility
+from common.database import CollectionName
+from common.responses import Layout
+from common.telemetry import Stage
 
 from fastapi import APIRouter, Query
 from pydantic import BaseModel
@@ -12,11 +14,8 @@ from sklearn.preprocessing import OneHotEncoder
 from typing import Annotated, List
 
 # --- Parmas 
-    
-X           = None
-X_original  = None
 
-router : APIRouter = APIRouter(prefix='/machine-learning/clustering', tags=['Machine Learning - Clustering'])
+router : APIRouter = APIRouter(prefix='/machine-learning/clustering', tags=['Machine Learning - Clustering'], route_class=telemetry.TimedRoute)
 
 class Data(BaseModel):
     
@@ -27,55 +26,43 @@ class Data(BaseModel):
     Sex             : str   # ? MALE, FEMALE
     Cluster         : int
 
+DataColumns : type[BaseModel] = responses.columns_model(Data) # ? layout=columns
+
 # --- Utility 
 
-def prepare_dataset() -> list:
+def prepare_dataset(version : str | None = None) -> dict:
     """Connect to MongoDB database "LearningAI" and extract the documents from the collection "penguins"
 
+    Args:
+        version (str | None, optional): Collection fingerprint. Defaults to None.
+
     Returns:
-        list: [data]
+        dict: { columns, X }
     """
     
-    global X
-    global X_original
+    # * Read from MongoDB (local snapshot)
     
-    # * Read from MongoDB
-    
-    mongo_client : pymongo.MongoClient = pymongo.MongoClient(host='mongodb://localhost:27017/')
-
-    database : pymongo.database.Database = mongo_client.get_database('LearningAI')
-
-    penguins_collection : pymongo.collection.Collection = database.get_collection('penguins')
-
-    cursor = penguins_collection.find()
+    original_data : pd.DataFrame = snapshot.load_dataframe(CollectionName.Penguins, version=version)
     
     # * Prepare data
     
-    original_data = list(cursor)
-    
-    temp : pd.DataFrame = pd.DataFrame(original_data)
-    
-    temp = temp.drop(columns=['_id'], axis=1)
+    temp : pd.DataFrame = original_data.copy()
     
     temp['flipper_length_mm']   = temp['flipper_length_mm'].astype('float')
     temp['body_mass_g']         = temp['body_mass_g'].astype('float')
     temp['sex']                 = temp['sex'].astype('str')
     
-    temp['Cluster'] = pd.Series(np.zeros(shape=temp['sex'].shape))
-    
     temp = temp.rename(columns={'culmen_length_mm': 'CulmenLength',
                                 'culmen_depth_mm': 'CulmenDepth',
                                 'flipper_length_mm': 'FlipperLength',
                                 'body_mass_g': 'BodyMass',
                                 'sex': 'Sex'})
     
-    data = temp.to_dict(orient='records')
+    columns : dict = { name: temp[name].to_numpy() for name in [ 'CulmenLength', 'CulmenDepth', 'FlipperLength', 'BodyMass', 'Sex' ] } # ? Response columns
     
     # * Prepare dataset with Pandas
 
-    df : pd.DataFrame = pd.DataFrame(original_data)
-
-    df = df.drop(columns=['_id'], axis=1)
+    df : pd.DataFrame = original_data.copy()
     
     df['flipper_length_mm'] = df['flipper_length_mm'].astype('float')
     df['body_mass_g']       = df['body_mass_g'].astype('float')
@@ -83,97 +70,84 @@ def prepare_dataset() -> list:
     
     # >>> Encoding
 
-    X_original = df.iloc[:, :].values
-
     ct = ColumnTransformer(transformers=[('encoder', OneHotEncoder(), ['sex'])], remainder='passthrough')
 
     df = pd.DataFrame(ct.fit_transform(df), columns=ct.get_feature_names_out())
 
     X = df.iloc[:, 2:].values # ? Skip sex from encoder
     
-    # * Close
+    return dict(columns=columns, X=X)
+
+def dataset_version() -> str:
+    """Version of the "penguins" collection
+
+    Returns:
+        str: Collection fingerprint
+    """
     
-    cursor.close()
+    return snapshot.fingerprint(CollectionName.Penguins)
+
+def dataset_handle() -> datasets.DatasetHandle:
+    """Prepared dataset, shared by all requests until the collection changes
+
+    Returns:
+        datasets.DatasetHandle: Dataset handle
+    """
     
-    mongo_client.close()
+    version : str = dataset_version()
     
-    return data
+    return datasets.cache.get(('clustering',), version, lambda: prepare_dataset(version))
 
 # --- Router 
 
-@router.get(path="/dataset", response_model=List[Data])
-def dataset():
+@router.get(path="/dataset", response_model=List[Data] | DataColumns, response_class=responses.FastJSONResponse, responses=responses.ndjson(Data))
+def dataset(layout : Annotated[Layout, Query(alias='layout', title='Response layout [rows, columns]')] = Layout.Rows,
+            stream : Annotated[bool, Query(alias='stream', title='NDJSON stream of rows')] = False):
     
     # * Retrieve data from MongoDB dataset
     
-    data = prepare_dataset()
+    handle : datasets.DatasetHandle = dataset_handle()
     
     # * JSON
     
-    return data
-
-@router.get(path="/k-means-clustering", response_model=List[Data])
-def k_means_clustering(clusters : Annotated[int | None, Query(alias='clusters', title='# Clusters >= 1')] = 2):
-    
-    # * Training
-    
-    model = KMeans(n_clusters=clusters, init='k-means++', n_init='auto', random_state=42)
-    
-    values = model.fit_predict(X)
+    if stream: return responses.stream(**handle.columns, Cluster=np.zeros(len(handle.X), dtype=int))
     
-    values = np.expand_dims(values, axis=1)
+    return responses.FastJSONResponse(responses.table(layout, **handle.columns, Cluster=np.zeros(len(handle.X), dtype=int)))
 
-    # * JSON
-    
-    data : np.ndarray = X_original
+@router.get(path="/k-means-clustering", response_model=List[Data] | DataColumns, response_class=responses.FastJSONResponse)
+@memo.memoize(lambda **_: dataset_version())
+def k_means_clustering(clusters : Annotated[int | None, Query(alias='clusters', title='# Clusters >= 1')] = 2,
+                       layout : Annotated[Layout, Query(alias='layout', title='Response layout [rows, columns]')] = Layout.Rows):
     
-    data = np.hstack((data, values))
+    handle : datasets.DatasetHandle = dataset_handle()
     
-    response : list = list()
+    # * Training
     
-    for value in data:
+    with telemetry.span(Stage.Fit):
         
-        response.append(
-            {
-                "CulmenLength": value[0],
-                "CulmenDepth": value[1],
-                "FlipperLength": value[2],
-                "BodyMass": value[3],
-                "Sex": value[4],
-                "Cluster": value[5]
-            })
-
-    return response
+        model = KMeans(n_clusters=clusters, init='k-means++', n_init='auto', random_state=42)
+        
+        values = model.fit_predict(handle.X)
 
-@router.get(path="/hierarchical-clustering", response_model=List[Data])
-def hierarchical_clustering(clusters : Annotated[int | None, Query(alias='clusters', title='# Clusters >= 1')] = 2):
+    # * JSON
     
-    # * Training
+    return responses.FastJSONResponse(responses.table(layout, **handle.columns, Cluster=values))
+
+@router.get(path="/hierarchical-clustering", response_model=List[Data] | DataColumns, response_class=responses.FastJSONResponse)
+@memo.memoize(lambda **_: dataset_version())
+def hierarchical_clustering(clusters : Annotated[int | None, Query(alias='clusters', title='# Clusters >= 1')] = 2,
+                            layout : Annotated[Layout, Query(alias='layout', title='Response layout [rows, columns]')] = Layout.Rows):
     
-    model = AgglomerativeClustering(n_clusters=clusters, metric='euclidean', linkage='ward')
+    handle : datasets.DatasetHandle = dataset_handle()
     
-    values = model.fit_predict(X)
+    # * Training
     
-    values = np.expand_dims(values, axis=1)
+    with telemetry.span(Stage.Fit):
+        
+        model = AgglomerativeClustering(n_clusters=clusters, metric='euclidean', linkage='ward')
+        
+        values = model.fit_predict(handle.X)
 
     # * JSON
     
-    data : np.ndarray = X_original
-    
-    data = np.hstack((data, values))
-    
-    response : list = list()
-    
-    for value in data:
-        
-        response.append(
-            {
-                "CulmenLength": value[0],
-                "CulmenDepth": value[1],
-                "FlipperLength": value[2],
-                "BodyMass": value[3],
-                "Sex": value[4],
-                "Cluster": value[5]
-            })
-
-    return response
\ No newline at end of file
+    return responses.FastJSONResponse(responses.table(layout, **handle.columns, Cluster=values))
\ No newline at end of file
@@ -1,17 +1,16 @@
-import nltk
 import numpy as np
 import pandas as pd
-import pymongo
 import re
 
-from common import utility
+from common import datasets, forests, kernels, neighbors, responses, snapshot, telemetry, utility
+from common.database import CollectionName
+from common.telemetry import Stage
+from common.lazy import lazy_import
 
 #nltk.download('stopwords') # ? Download stopwords in "C:\Users\aless\AppData\Roaming\nltk_data\corpora"
 
 from enum import IntEnum
-from fastapi import APIRouter, Query
-from nltk.corpus import stopwords
-from nltk.stem.porter import PorterStemmer
+from fastapi import APIRouter, HTTPException, Query, status, UploadFile
 from pydantic import BaseModel
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.feature_extraction.text import CountVectorizer
@@ -23,29 +22,17 @@ from sklearn.neighbors import KNeighborsClassifier
 from sklearn.preprocessing import LabelEncoder
 from sklearn.svm import SVC
 from sklearn.tree import DecisionTreeClassifier
-from typing import Annotated, List, Dict
-from xgboost import XGBClassifier
+from typing import Annotated, Callable, List, Dict
 
-# --- Params 
-
-X       = None
-X_train = None
-X_test  = None
-y       = None
-y_train = None
-y_test  = None
+nltk_corpus = lazy_import('nltk.corpus')
+nltk_stem   = lazy_import('nltk.stem.porter')
+xgboost     = lazy_import('xgboost')
 
-cv : CountVectorizer = None
+# --- Params 
 
-model_lr : LogisticRegression = None
-model_knn = None
-model_svc = None
-model_nb = None
-model_dt = None
-model_rf = None
-model_xgb = None
+trained : dict = dict() # ? Algorithm => (bag of words of its training set, latest fitted model), so sentences are always encoded with the vocabulary the model was fitted on
 
-router : APIRouter = APIRouter(prefix='/machine-learning/natural-language-processing', tags=['Machine Learning - Natural Language Processing'])
+router : APIRouter = APIRouter(prefix='/machine-learning/natural-language-processing', tags=['Machine Learning - Natural Language Processing'], route_class=telemetry.TimedRoute)
 
 class GridSearchCVParams(BaseModel):
     
@@ -90,6 +77,7 @@ class KernelType(IntEnum):
 
 # --- Utility 
 
+@telemetry.span(Stage.Preprocess)
 def text_preparation(texts : np.ndarray) -> np.ndarray:
     """Prepare the given list of texts with stopwords and stemming
 
@@ -100,9 +88,9 @@ def text_preparation(texts : np.ndarray) -> np.ndarray:
         np.ndarray: Prepared list of texts
     """
     
-    ps : PorterStemmer = PorterStemmer() # ? Take the root of a word (e.g. loved => love)
+    ps = nltk_stem.PorterStemmer() # ? Take the root of a word (e.g. loved => love)
 
-    sw : list = stopwords.words('english')
+    sw : list = nltk_corpus.stopwords.words('english')
 
     sw.remove('not') # ? Keep "not" stop word since useful in the analysis
 
@@ -120,32 +108,21 @@ def text_preparation(texts : np.ndarray) -> np.ndarray:
     
     return corpus
 
-def prepare_dataset() -> None:
+def prepare_dataset(version : str | None = None) -> dict:
     """Connect to MongoDB database "LearningAI" and extract the documents from the collection "sentiment_analysis"
-    """
     
-    global X
-    global X_train
-    global X_test
-    global y
-    global y_train
-    global y_test
-    
-    # * Read from MongoDB
+    Args:
+        version (str | None, optional): Collection fingerprint. Defaults to None.
     
-    mongo_client : pymongo.MongoClient = pymongo.MongoClient(host='mongodb://localhost:27017/')
-
-    database : pymongo.database.Database = mongo_client.get_database('LearningAI')
-
-    sentiment_analysis_collection : pymongo.collection.Collection = database.get_collection('sentiment_analysis')
-
-    cursor = sentiment_analysis_collection.find()
+    Returns:
+        dict: { X, X_train, X_test, y, y_train, y_test, cv }
+    """
     
-    original_data : list = list(cursor)
+    # * Read from MongoDB (local snapshot)
     
-    df : pd.DataFrame = pd.DataFrame(original_data)
+    df : pd.DataFrame = snapshot.load_dataframe(CollectionName.SentimentAnalysis, version=version)
     
-    df = df.drop(columns=['_id', 'Year', 'Month', 'Day', 'Time of Tweet', 'Platform'], axis=1)
+    df = df.drop(columns=['Year', 'Month', 'Day', 'Time of Tweet', 'Platform'], axis=1)
     
     # * Prepare dataset
     
@@ -167,36 +144,159 @@ def prepare_dataset() -> None:
     
     # >>> Bag Of Words 
     
-    global cv
-    
-    cv = CountVectorizer(max_features=900) # ? Take only the most frequent words as sparse matrix
+    cv : CountVectorizer = CountVectorizer(max_features=900) # ? Take only the most frequent words as sparse matrix
     
     X_train = cv.fit_transform(X_train).toarray()
     X_test  = cv.transform(X_test).toarray()
     
-    # * Close
+    return dict(X=X, X_train=X_train, X_test=X_test, y=y, y_train=y_train, y_test=y_test, cv=cv)
+
+def encode(cv : CountVectorizer, sentences : np.ndarray) -> np.ndarray:
+    """Bag of words of raw sentences
+
+    Args:
+        cv (CountVectorizer): Fitted bag of words
+        sentences (np.ndarray): Raw sentences
+
+    Returns:
+        np.ndarray: Dense word counts
+    """
+    
+    return cv.transform(text_preparation(sentences)).toarray()
+
+def dataset_handle() -> datasets.DatasetHandle:
+    """Prepared dataset, shared by all requests until the collection changes
+
+    Returns:
+        datasets.DatasetHandle: Dataset handle
+    """
     
-    cursor.close()
+    version : str = snapshot.fingerprint(CollectionName.SentimentAnalysis)
     
-    mongo_client.close()
+    return datasets.cache.get(('natural-language-processing',), version, lambda: prepare_dataset(version))
 
-def train_and_json(model, grid_search_cv_params : list, grid_search_cv_skip : bool = False) -> dict:
-    """Train with the given model and prepare the JSON response
+def forest_selection(handle : datasets.DatasetHandle, estimators : int) -> tuple:
+    """K-Fold Cross Validation of the entropy forest and Grid Search Cross Validation over criteria and number of trees,
+    growing one cached forest per (criterion, fold) instead of refitting one per candidate
 
     Args:
+        handle (datasets.DatasetHandle): Dataset handle
+        estimators (int): Number of trees of the cross validated forest
+
+    Returns:
+        tuple: (cross validation scores, best grid search score, best grid search params)
+    """
+    
+    criteria    : list = [ 'gini', 'entropy', 'log_loss' ]
+    sizes       : list = [ 100, 150, 200 ]
+    
+    factory : Callable = lambda criterion: RandomForestClassifier(criterion=criterion, random_state=42)
+    
+    scores : dict = forests.grid_search(handle.key, handle.version, factory, handle.X_train, handle.y_train, criteria, sizes)
+    
+    cv_ = np.array(forests.grid_search(handle.key, handle.version, factory, handle.X_train, handle.y_train, [ 'entropy' ], [ estimators ])[('entropy', estimators)])
+    
+    best : tuple = max(scores, key=lambda candidate: np.mean(scores[candidate])) # ? First best candidate, as GridSearchCV
+    
+    return cv_, float(np.mean(scores[best])), { 'criterion': best[0], 'n_estimators': best[1] }
+
+def knn_selection(handle : datasets.DatasetHandle, k : int) -> tuple:
+    """K-Fold Cross Validation of the Euclidean classifier and Grid Search Cross Validation over the number of neighbors
+    and the Minkowski power, from one neighbor search per (fold, power) for the largest number of neighbors
+
+    The leaf size only tunes the search structures, not the neighbors found: every leaf size scores the same, so the
+    first one is reported (as GridSearchCV) without searching again.
+
+    Args:
+        handle (datasets.DatasetHandle): Dataset handle
+        k (int): Number of neighbors of the cross validated classifier
+
+    Returns:
+        tuple: (cross validation scores, best grid search score, best grid search params)
+    """
+    
+    ks          : list = [ 5, 10, 15, 20 ]
+    leaf_sizes  : list = [ 30, 40, 50 ]
+    ps          : list = [ 1, 2, 3 ]
+    
+    scores : dict = neighbors.grid_search(handle.key, handle.version, handle.X_train, handle.y_train, sorted({ *ks, k }), ps)
+    
+    best : tuple = max([ (k_, p) for k_ in ks for p in ps ], key=lambda candidate: np.mean(scores[candidate])) # ? First best candidate in GridSearchCV order
+    
+    return np.array(scores[(k, 2)]), float(np.mean(scores[best])), { 'leaf_size': leaf_sizes[0], 'n_neighbors': best[0], 'p': best[1] }
+
+def svc_selection(handle : datasets.DatasetHandle, model) -> tuple:
+    """K-Fold Cross Validation of the given support vector classifier and Grid Search Cross Validation over the linear
+    kernel and the RBF kernel for every gamma, fitting every C on one cached kernel matrix per (kernel, gamma)
+
+    Args:
+        handle (datasets.DatasetHandle): Dataset handle
+        model (SVC | kernels.KernelSVC): Cross validated classifier
+
+    Returns:
+        tuple: (cross validation scores, best grid search score, best grid search params)
+    """
+    
+    Cs      : list          = [ 0.25, 0.50, 0.75, 1.00 ]
+    gammas  : np.ndarray    = np.arange(0.1, 1.0, 0.1)
+    
+    linear  : dict = kernels.grid_search(handle.key, handle.version, handle.X_train, handle.y_train, 'linear', [ None ], Cs)
+    rbf     : dict = kernels.grid_search(handle.key, handle.version, handle.X_train, handle.y_train, 'rbf', list(gammas), Cs)
+    
+    # ? Candidates in GridSearchCV order (then keys sorted in the params)
+    
+    candidates : list = [ ({ 'C': C, 'kernel': 'linear' }, linear[(None, C)]) for C in Cs ] +\
+                        [ ({ 'C': C, 'gamma': gamma, 'kernel': 'rbf' }, rbf[(gamma, C)]) for C in Cs for gamma in gammas ]
+    
+    best : tuple = max(candidates, key=lambda candidate: np.mean(candidate[1])) # ? First best candidate, as GridSearchCV
+    
+    # ? "scale" gamma of the other kernels depends on the fold, only the linear and the cached kernels reuse the matrices
+    
+    if isinstance(model, kernels.KernelSVC):
+        
+        cv_ = np.array(kernels.grid_search(handle.key, handle.version, handle.X_train, handle.y_train, model.kernel, [ model.gamma_ ], [ model.C ])[(model.gamma_, model.C)])
+    
+    elif model.kernel == 'linear':
+        
+        cv_ = np.array(linear[(None, model.C)]) if model.C in Cs else cross_val_score(estimator=model, X=handle.X_train, y=handle.y_train, cv=10)
+    
+    else:
+        
+        cv_ = cross_val_score(estimator=model, X=handle.X_train, y=handle.y_train, cv=10)
+    
+    return cv_, float(np.mean(best[1])), best[0]
+
+def train_and_json(handle : datasets.DatasetHandle, name : str, model, grid_search_cv_params : list, grid_search_cv_skip : bool = False, fitted : bool = False, model_selection : Callable[[], tuple] | None = None) -> dict:
+    """Train with the given model, keep it for the sentence checks and prepare the JSON response
+
+    Args:
+        handle (datasets.DatasetHandle): Dataset handle
+        name (str): Algorithm name (PredictionResults field)
         model (any): Classification model
         grid_search_cv_params (list): List of ditionaries for model parameters
         grid_search_cv_skip (bool, optional): Skip Grid Search Cross Validation. Defaults to False.
+        fitted (bool, optional): Model already fitted on the training set. Defaults to False.
+        model_selection (Callable[[], tuple] | None, optional): Replacement of the model selection returning (cross validation scores, best score, best params). Defaults to None.
 
     Returns:
         dict: JSON response
     """
     
+    X_train, X_test, y_train, y_test = handle.X_train, handle.X_test, handle.y_train, handle.y_test
+    
     # * Training
 
-    model.fit(X_train, y_train)
+    if not fitted:
+        
+        with telemetry.span(Stage.Fit):
+            
+            model.fit(X_train, y_train)
     
-    prediction = model.predict(X_test)
+    trained[name] = (handle.cv, model)
+    
+    with telemetry.span(Stage.Predict):
+        
+        prediction = model.predict(X_test)
     
     # * Params
 
@@ -208,15 +308,27 @@ def train_and_json(model, grid_search_cv_params : list, grid_search_cv_skip : bo
     
     # * Model selection (K-Fold Cross Validation - Grid Search Cross Validation)
     
-    cv_ = cross_val_score(estimator=model, X=X_train, y=y_train, cv=10) # ? Cross Validation
-    
-    kfcv_ = [ float(format(float(cv_.mean() * 100), '.2f')), float(format(float(cv_.std() * 100), '.2f')) ]
+    gscv_score, gscv_params = 0.0, {}
     
-    if not grid_search_cv_skip:
-    
-        gscv_ = GridSearchCV(estimator=model, param_grid=grid_search_cv_params, scoring='accuracy', n_jobs=-1, cv=10)
-
-        gscv_.fit(X_train, y_train)
+    with telemetry.span(Stage.ModelSelection):
+        
+        if model_selection is not None:
+            
+            cv_, gscv_score, gscv_params = model_selection()
+        
+        else:
+            
+            cv_ = cross_val_score(estimator=model, X=X_train, y=y_train, cv=10) # ? Cross Validation
+            
+            if not grid_search_cv_skip:
+            
+                gscv_ = GridSearchCV(estimator=model, param_grid=grid_search_cv_params, scoring='accuracy', n_jobs=-1, cv=10)
+
+                gscv_.fit(X_train, y_train)
+                
+                gscv_score, gscv_params = gscv_.best_score_, gscv_.best_params_
+        
+        kfcv_ = [ float(format(float(cv_.mean() * 100), '.2f')), float(format(float(cv_.std() * 100), '.2f')) ]
     
     # * JSON
     
@@ -240,8 +352,8 @@ def train_and_json(model, grid_search_cv_params : list, grid_search_cv_skip : bo
         "KFoldCV": kfcv_,
         "GridSearchCV":
         {
-            "Score": float(gscv_.best_score_ * 100.0) if not grid_search_cv_skip else 0.0,
-            "BestParams": gscv_.best_params_ if not grid_search_cv_skip else {}
+            "Score": float(gscv_score * 100.0),
+            "BestParams": gscv_params
         }
     }
 
@@ -252,7 +364,7 @@ def dataset():
     
     # * Retrieve data from MongoDB dataset
     
-    prepare_dataset()
+    dataset_handle()
     
     # * JSON
     
@@ -261,20 +373,18 @@ def dataset():
 @router.get(path="/logistic-regression", response_model=QualityParams)
 def logistic_regression():
     
-    global model_lr
-    
-    model_lr = LogisticRegression(random_state=42)
+    model_lr : LogisticRegression = LogisticRegression(random_state=42)
     
-    return train_and_json(model=model_lr, grid_search_cv_params=[{ 'C': [0.25, 0.50, 0.75, 1.00 ], 'penalty' : [ 'l2' ] }])
+    return train_and_json(handle=dataset_handle(), name='LinearRegression', model=model_lr, grid_search_cv_params=[{ 'C': [0.25, 0.50, 0.75, 1.00 ], 'penalty' : [ 'l2' ] }])
 
 @router.get(path="/k-nearest-neighbors", response_model=QualityParams)
 def k_nearest_neighbors(neighbors : Annotated[int | None, Query(alias='neighbors', title='# Neighbours >= 1')] = 5):
     
-    global model_knn
+    handle : datasets.DatasetHandle = dataset_handle()
     
-    model_knn = KNeighborsClassifier(n_neighbors=neighbors, metric='minkowski', p=2) # ! p = 2 => Euclidean
+    model_knn : KNeighborsClassifier = KNeighborsClassifier(n_neighbors=neighbors, metric='minkowski', p=2) # ! p = 2 => Euclidean
 
-    return train_and_json(model=model_knn, grid_search_cv_params=[{ 'n_neighbors': [ 5, 10, 15, 20 ], 'leaf_size': [ 30, 40, 50 ], 'p': [ 1, 2, 3 ] }])
+    return train_and_json(handle=handle, name='KNearestNeighbors', model=model_knn, grid_search_cv_params=[], model_selection=lambda: knn_selection(handle, neighbors))
 
 @router.get(path="/support-vector-classification", response_model=QualityParams)
 def support_vector_classification(kernel : Annotated[int | None, Query(alias='kernel', title='SVM Kernel [1, 2, 3, 4, 5]')] = 1):
@@ -289,61 +399,85 @@ def support_vector_classification(kernel : Annotated[int | None, Query(alias='ke
         case KernelType.Sigmoid:        kernel_name = "sigmoid"
         case KernelType.Precomputed:    kernel_name = "precomputed"
     
-    global model_svc
+    handle : datasets.DatasetHandle = dataset_handle()
     
-    model_svc = SVC(kernel=kernel_name, random_state=42)
+    # ? Precomputed = RBF kernel ("scale" gamma) from the cached kernel matrix of the training set
+    
+    model_svc : SVC | kernels.KernelSVC = kernels.KernelSVC(handle.key, handle.version) if kernel_name == "precomputed" else SVC(kernel=kernel_name, random_state=42)
 
-    return train_and_json(model=model_svc, grid_search_cv_params=[{ 'C': [0.25, 0.50, 0.75, 1.00 ], 'kernel': [ 'linear' ] },
-                                                              { 'C': [0.25, 0.50, 0.75, 1.00 ], 'kernel' : [ 'rbf' ], 'gamma' : np.arange(0.1, 1.0, 0.1) }])
+    return train_and_json(handle=handle, name='SupportVectorClassification', model=model_svc, grid_search_cv_params=[], model_selection=lambda: svc_selection(handle, model_svc))
 
 @router.get(path="/naive-bayes", response_model=QualityParams)
 def naive_bayes():
     
-    global model_nb
-    
-    model_nb = GaussianNB()
+    model_nb : GaussianNB = GaussianNB()
     
-    return train_and_json(model=model_nb, grid_search_cv_params=[], grid_search_cv_skip=True)
+    return train_and_json(handle=dataset_handle(), name='NaiveBayes', model=model_nb, grid_search_cv_params=[], grid_search_cv_skip=True)
 
 @router.get(path="/decision-tree-classification", response_model=QualityParams)
 def decision_tree_classifier():
     
-    global model_dt
+    model_dt : DecisionTreeClassifier = DecisionTreeClassifier(criterion='entropy', random_state=42)
     
-    model_dt = DecisionTreeClassifier(criterion='entropy', random_state=42)
-    
-    return train_and_json(model=model_dt, grid_search_cv_params=[{ 'criterion': [ 'gini', 'entropy', 'log_loss' ] }])
+    return train_and_json(handle=dataset_handle(), name='DecisionTreeClassification', model=model_dt, grid_search_cv_params=[{ 'criterion': [ 'gini', 'entropy', 'log_loss' ] }])
 
 @router.get(path="/random-forest-classification", response_model=QualityParams)
 def random_forest_classification(estimators : Annotated[int | None, Query(alias='estimators', title='Number of trees >= 1')] = 100):
     
-    global model_rf
+    handle : datasets.DatasetHandle = dataset_handle()
     
-    model_rf = RandomForestClassifier(n_estimators=estimators, criterion='entropy', random_state=42)
+    with telemetry.span(Stage.Fit):
+        
+        model_rf : RandomForestClassifier = forests.cache.fit((*handle.key, 'entropy'), handle.version, lambda: RandomForestClassifier(criterion='entropy', random_state=42), handle.X_train, handle.y_train, estimators)
     
-    return train_and_json(model=model_rf, grid_search_cv_params=[{ 'n_estimators': [ 100, 150, 200 ], 'criterion': [ 'gini' ] },
-                                                              { 'n_estimators': [ 100, 150, 200 ], 'criterion': [ 'entropy' ] },
-                                                              { 'n_estimators': [ 100, 150, 200 ], 'criterion': [ 'log_loss' ] }])
+    return train_and_json(handle=handle, name='RandomForestClassification', model=model_rf, grid_search_cv_params=[], fitted=True, model_selection=lambda: forest_selection(handle, estimators))
 
 @router.get(path="/x-g-boost-classification", response_model=QualityParams)
 def x_g_boost_classification():
     
-    global model_xgb
+    model_xgb = xgboost.XGBClassifier()
     
-    model_xgb = XGBClassifier()
-    
-    return train_and_json(model=model_xgb, grid_search_cv_params=[], grid_search_cv_skip=True)
+    return train_and_json(handle=dataset_handle(), name='XGBoostClassification', model=model_xgb, grid_search_cv_params=[], grid_search_cv_skip=True)
 
 @router.put(path="/check-sentence/{sentence}", response_model=PredictionResults)
 def check_sentence(sentence : str):
     
-    return\
-    {
-        'LinearRegression'              : model_lr.predict(cv.transform(text_preparation(np.array([sentence]))).toarray()).tolist()[0],
-        'KNearestNeighbors'             : model_knn.predict(cv.transform(text_preparation(np.array([sentence]))).toarray()).tolist()[0],
-        'SupportVectorClassification'   : model_svc.predict(cv.transform(text_preparation(np.array([sentence]))).toarray()).tolist()[0],
-        'NaiveBayes'                    : model_nb.predict(cv.transform(text_preparation(np.array([sentence]))).toarray()).tolist()[0],
-        'DecisionTreeClassification'    : model_dt.predict(cv.transform(text_preparation(np.array([sentence]))).toarray()).tolist()[0],
-        'RandomForestClassification'    : model_rf.predict(cv.transform(text_preparation(np.array([sentence]))).toarray()).tolist()[0],
-        'XGBoostClassification'         : model_xgb.predict(cv.transform(text_preparation(np.array([sentence]))).toarray()).tolist()[0]
-    }
\ No newline at end of file
+    models : dict = dict(trained) # ? Snapshot, the endpoints may replace models meanwhile
+    
+    missing : list = [ name for name in PredictionResults.model_fields if name not in models ]
+    
+    if missing: raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f'Models not trained yet: {", ".join(missing)}')
+    
+    with telemetry.span(Stage.Predict):
+        
+        return { name: model.predict(encode(cv, np.array([ sentence ]))).tolist()[0] for name, (cv, model) in models.items() }
+
+@router.post(path="/check-sentences/csv")
+def check_sentences_csv(file : UploadFile,
+                        column : Annotated[str, Query(alias='column', title='Column of the sentences')] = 'text'):
+    
+    # * Models trained so far (same names as "check-sentence")
+    
+    models : dict = dict(trained)
+    
+    if not models: raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail='No trained model, call the algorithm endpoints first')
+    
+    def score(chunk : pd.DataFrame) -> dict:
+        
+        sentences : np.ndarray = chunk[column].fillna('').astype('str').to_numpy()
+        
+        encoded : dict = { id(cv): encode(cv, sentences) for cv, _ in models.values() } # ? Once per vocabulary
+        
+        return { name: model.predict(encoded[id(cv)]) for name, (cv, model) in models.items() }
+    
+    # * Stream the sentences of the CSV through the bag of words and every trained model
+    
+    source = responses.spool(file.file) # ? FastAPI closes the uploaded file when the endpoint returns, before the response is streamed
+    
+    try:
+        
+        return responses.score_csv(source, [ column ], score, name='natural-language-processing')
+    
+    except ValueError as error:
+        
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(error))
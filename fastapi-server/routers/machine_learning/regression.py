@@ -1,30 +1,35 @@
+import contextvars
 import datetime as dt
+import numpy as np
 import pandas as pd
 import pymongo
+import time
 
-from common import utility
+from common import database, datasets, forests, memo, models, online, responses, snapshot, telemetry, utility, views
+from common.database import CollectionName
+from common.responses import Layout
+from common.telemetry import Stage
 
-from fastapi import APIRouter, Query
+from concurrent.futures import ThreadPoolExecutor
+from enum import StrEnum
+from fastapi import APIRouter, HTTPException, Query, status
 from pydantic import BaseModel
+from scipy.linalg import solve_triangular
+from sklearn.compose import TransformedTargetRegressor
 from sklearn.ensemble import RandomForestRegressor
+from sklearn.kernel_approximation import Nystroem
 from sklearn.linear_model import LinearRegression
-from sklearn.metrics import r2_score
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 from sklearn.model_selection import train_test_split
+from sklearn.pipeline import make_pipeline
 from sklearn.preprocessing import PolynomialFeatures, StandardScaler
-from sklearn.svm import SVR
+from sklearn.svm import SVR, LinearSVR
 from sklearn.tree import DecisionTreeRegressor
-from typing import Annotated, List
+from typing import Annotated, Callable, List
 
 # --- Parmas 
 
-X       = None
-X_train = None
-X_test  = None
-y       = None
-y_train = None
-y_test  = None
-
-router : APIRouter = APIRouter(prefix='/machine-learning/regression', tags=['Machine Learning - Regression'])
+router : APIRouter = APIRouter(prefix='/machine-learning/regression', tags=['Machine Learning - Regression'], route_class=telemetry.TimedRoute)
 
 class InfoData(BaseModel):
     
@@ -37,22 +42,63 @@ class PointData(BaseModel):
     x: str
     y: float
 
+PointColumns : type[BaseModel] = responses.columns_model(PointData) # ? layout=columns
+
+class ScoreData(BaseModel):
+    
+    name        : str
+    r2          : float # ? Scores on the test split
+    mae         : float
+    rmse        : float
+    fit_ms      : float
+    predict_ms  : float # ? Test split and full curve
+    points      : List[PointData] | PointColumns
+
+class DegreeData(BaseModel):
+    
+    degree      : int
+    r2          : float # ? Scores on the test split
+    mae         : float
+    rmse        : float
+    points      : List[PointData] | PointColumns
+
+class FitData(BaseModel):
+    
+    r2          : float # ? Scores on the test split
+    mae         : float
+    rmse        : float
+    points      : List[PointData] | PointColumns
+
+class SeriesData(BaseModel):
+    
+    column      : int
+    description : str
+    linear      : FitData
+    polynomial  : FitData
+
+class RegressorType(StrEnum):
+    
+    Linear          = 'linear-regression'
+    Polynomial      = 'polynomial-regression'
+    SupportVector   = 'support-vector-regression'
+    DecisionTree    = 'decision-tree-regression'
+    RandomForest    = 'random-forest-regression'
+
+executor : ThreadPoolExecutor = ThreadPoolExecutor(max_workers=len(RegressorType), thread_name_prefix='regression') # ? Scikit-learn and NumPy release the GIL while fitting
+
 # --- Utility 
 
-def dataset_columns() -> dict:
-    """Connect to MongoDB database "LearningAI" and extract the columns from the collection "carbon_emissions"
+@telemetry.span(Stage.Fetch)
+def prepare_columns() -> dict:
+    """Connect to MongoDB database "LearningAI" and extract the columns from the view "carbon_emissions_annual"
 
     Returns:
-        list: [columns]
+        dict: { column: description }
     """
     
     # * Read from MongoDB
     
-    mongo_client : pymongo.MongoClient = pymongo.MongoClient(host='mongodb://localhost:27017/')
-
-    database : pymongo.database.Database = mongo_client.get_database('LearningAI')
-
-    carbon_emissions_collection : pymongo.collection.Collection = database.get_collection('carbon_emissions')
+    carbon_emissions_collection : pymongo.collection.Collection = database.get_collection(CollectionName.CarbonEmissionsAnnual)
 
     cursor = carbon_emissions_collection.aggregate([{ '$group': { '_id': { 'Column_Order': '$Column_Order', 'Description': '$Description' }, 'count': { '$sum': 1 } } }])
     
@@ -66,52 +112,231 @@ def dataset_columns() -> dict:
     
     cursor.close()
     
-    mongo_client.close()
-    
     return sorted_items
 
-def prepare_dataset(column : int) -> None:
-    """Connect to MongoDB database "LearningAI" and extract the documents from the collection "carbon_emissions"
+def dataset_columns() -> dict:
+    """Column catalog, computed once and shared by all requests until the collection changes
+
+    Returns:
+        dict: { column: description }
+    """
+    
+    version : str = overview_version()
+    
+    return datasets.cache.get(('regression', 'columns'), version, lambda: dict(items=prepare_columns())).items
+
+def dataset_filter(column : int | None = None) -> dict:
+    """MongoDB filter of the annual documents (view "carbon_emissions_annual") of the given column
+
+    Args:
+        column (int | None, optional): Specific "column_order" filter (None = every column). Defaults to None.
+
+    Returns:
+        dict: Query filter
+    """
+    
+    if column is None: return {}
+    
+    return { 'Column_Order': { '$eq': column } }
+
+def prepare_dataset(column : int, version : str | None = None) -> dict:
+    """Connect to MongoDB database "LearningAI" and extract the annual documents of the view "carbon_emissions_annual"
 
     Args:
         column (int): Specific "column_order" filter
+        version (str | None, optional): Collection fingerprint. Defaults to None.
+
+    Returns:
+        dict: { X, X_train, X_test, y, y_train, y_test, dates }
     """
     
-    global X
-    global X_train
-    global X_test
-    global y
-    global y_train
-    global y_test
+    # * Read from MongoDB (local snapshot)
     
-    # * Read from MongoDB
+    df : pd.DataFrame = snapshot.load_dataframe(CollectionName.CarbonEmissionsAnnual, dataset_filter(column), version, projection=[ 'YYYYMM', 'Value' ])
     
-    mongo_client : pymongo.MongoClient = pymongo.MongoClient(host='mongodb://localhost:27017/')
+    # * Prepare dataset with Pandas
+    
+    df['YYYYMM'] = df['YYYYMM'].astype('int64')
 
-    database : pymongo.database.Database = mongo_client.get_database('LearningAI')
+    X = df['YYYYMM'].values.reshape(-1, 1)
+    y = df['Value'].values.reshape(-1, 1)
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    
+    dates : tuple = tuple(convert_YYYYMM(value) for value in X[:, 0]) # ? Formatted once, used by every response
+    
+    return dict(X=X, X_train=X_train, X_test=X_test, y=y, y_train=y_train, y_test=y_test, dates=dates)
 
-    carbon_emissions_collection : pymongo.collection.Collection = database.get_collection('carbon_emissions')
+def prepare_overview(version : str | None = None) -> dict:
+    """Connect to MongoDB database "LearningAI" and extract the annual documents of every column in one query
 
-    cursor = carbon_emissions_collection.find({ 'Column_Order': { '$eq': column }, 'YYYYMM': { '$regex': '13$' } })
+    Series with the same years share the same design matrix, so they are stacked as the columns of one matrix and
+    split with the same indices as "prepare_dataset" (the split only depends on the number of rows).
+
+    Args:
+        version (str | None, optional): Collection fingerprint. Defaults to None.
+
+    Returns:
+        dict: { groups, descriptions } with groups of series sharing the same years { columns, X, Y, train, test, dates }
+    """
+    
+    # * Read from MongoDB (local snapshot)
+    
+    df : pd.DataFrame = snapshot.load_dataframe(CollectionName.CarbonEmissionsAnnual, dataset_filter(), version, projection=[ 'Column_Order', 'Description', 'YYYYMM', 'Value' ])
     
     # * Prepare dataset with Pandas
+    
+    df['YYYYMM'] = df['YYYYMM'].astype('int64')
+    
+    descriptions : dict = { int(column): str(description) for column, description in zip(df['Column_Order'], df['Description']) }
+    
+    series : dict = dict()
+    
+    for column, rows in df.groupby('Column_Order', sort=True):
+        
+        X : np.ndarray = rows['YYYYMM'].to_numpy()
+        
+        group : dict = series.setdefault(X.tobytes(), { 'columns': [], 'X': X, 'values': [] })
+        
+        group['columns'].append(int(column))
+        group['values'].append(rows['Value'].to_numpy(dtype='float64'))
+    
+    # >>> Train/Test
+    
+    groups : list = list()
+    
+    for group in series.values():
+        
+        train, test = train_test_split(np.arange(group['X'].shape[0]), test_size=0.2, random_state=42)
+        
+        dates : tuple = tuple(convert_YYYYMM(value) for value in group['X'])
+        
+        groups.append(datasets.freeze(dict(columns=tuple(group['columns']), X=group['X'], Y=np.column_stack(group['values']), train=train, test=test, dates=dates)))
+    
+    return dict(groups=tuple(groups), descriptions=descriptions)
+
+def fit_series(group : dict, degree : int) -> np.ndarray:
+    """Least squares polynomials of every series of a group at once: one "lstsq" solve with one right-hand side per series
+
+    Inputs are mapped to [-1, 1] as in "polynomial_sweep" (same fit as the raw YYYYMM values, well conditioned).
+
+    Args:
+        group (dict): Series sharing the same years (see prepare_overview)
+        degree (int): Polynomial degree (1 = linear regression)
+
+    Returns:
+        np.ndarray: Fitted values (years x series)
+    """
+    
+    X_train : np.ndarray = group['X'][group['train']]
+    
+    low     : float = float(X_train.min())
+    high    : float = float(X_train.max())
+    
+    V : np.ndarray = np.vander((2.0 * group['X'].astype('float64') - low - high) / max(high - low, 1e-12), degree + 1, increasing=True)
+    
+    coefficients, *_ = np.linalg.lstsq(V[group['train']], group['Y'][group['train']], rcond=None)
+    
+    return V @ coefficients
 
-    df : pd.DataFrame = pd.DataFrame(list(cursor))
+def dataset_version(column : int) -> str:
+    """Version of the documents of the given column
 
-    df = df.drop(columns=['_id'])
+    Args:
+        column (int): Specific "column_order" filter
+
+    Raises:
+        HTTPException: Unknown column
+
+    Returns:
+        str: View fingerprint
+    """
     
-    df['YYYYMM'] = df['YYYYMM'].astype('int64')
+    views.refresh(CollectionName.CarbonEmissionsAnnual)
+    
+    if column not in dataset_columns(): raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f'Unknown column {column}')
+    
+    return snapshot.fingerprint(CollectionName.CarbonEmissionsAnnual, dataset_filter(column))
 
-    X = df.iloc[:, 1].values.reshape(-1, 1) # * YYYYMM
-    y = df.iloc[:, 2].values.reshape(-1, 1) # * Value
+def dataset_handle(column : int) -> datasets.DatasetHandle:
+    """Prepared dataset of the given column, shared by all requests until the collection changes
 
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    Args:
+        column (int): Specific "column_order" filter
+
+    Returns:
+        datasets.DatasetHandle: Dataset handle
+    """
     
-    # * Close
+    version : str = dataset_version(column)
+    
+    return datasets.cache.get(('regression', column), version, lambda: prepare_dataset(column, version))
+
+def overview_version() -> str:
+    """Version of the annual documents of every column
+
+    Returns:
+        str: View fingerprint
+    """
+    
+    views.refresh(CollectionName.CarbonEmissionsAnnual)
+    
+    return snapshot.fingerprint(CollectionName.CarbonEmissionsAnnual)
+
+def overview_handle() -> datasets.DatasetHandle:
+    """Prepared series of every column, shared by all requests until the collection changes
+
+    Returns:
+        datasets.DatasetHandle: Dataset handle
+    """
+    
+    version : str = overview_version()
+    
+    return datasets.cache.get(('regression', 'overview'), version, lambda: prepare_overview(version))
+
+@telemetry.span(Stage.Fetch)
+def fetch_annual(column : int, after : int | None = None) -> tuple:
+    """Annual documents of the given column newer than the given "YYYYMM", read from the source collection (index on Column_Order, YYYYMM)
+
+    Args:
+        column (int): Specific "column_order" filter
+        after (int | None, optional): Last "YYYYMM" already seen (None = every document). Defaults to None.
+
+    Returns:
+        tuple: (YYYYMM, values) sorted by "YYYYMM"
+    """
+    
+    YYYYMM : dict = { '$regex': '13$' } if after is None else { '$gt': str(after), '$regex': '13$' }
+    
+    cursor = database.get_collection(CollectionName.CarbonEmissions).find({ 'Column_Order': column, 'YYYYMM': YYYYMM }, { '_id': 0, 'YYYYMM': 1, 'Value': 1 }).sort('YYYYMM', pymongo.ASCENDING)
+    
+    documents : list = list(cursor)
     
     cursor.close()
     
-    mongo_client.close()
+    return [ int(document['YYYYMM']) for document in documents ], [ float(document['Value']) for document in documents ]
+
+def online_fit(column : int, degree : int) -> tuple:
+    """Recursive least squares fit of every annual row of a column, updated with the rows appended since the last
+    dataset version seen (no refit on the full history, nothing fetched while the version is unchanged)
+
+    Args:
+        column (int): Specific "column_order" filter
+        degree (int): Polynomial degree (1 = linear regression)
+
+    Returns:
+        tuple: (model, X) with the fit (shared, never update it) and the "YYYYMM" of the rows it was fitted on
+    """
+    
+    version : str = dataset_version(column)
+    
+    series : online.OnlineSeries = online.series(('regression', column))
+    
+    with series.lock:
+        
+        series.sync(lambda after: fetch_annual(column, after), version)
+        
+        return series.model(degree), series.X
 
 def convert_YYYYMM(YYYYMM : int) -> str:
     """Convert the "YYYYMM" collection field in a datetime string
@@ -125,6 +350,205 @@ def convert_YYYYMM(YYYYMM : int) -> str:
     
     return dt.datetime(year=int(str(YYYYMM).removesuffix("13")), month=1, day=1).strftime("%Y-%m-%d")
 
+def fit_regressor(regressor : RegressorType, handle : datasets.DatasetHandle, degree : int = 2, estimators : int = 10, components : int = 0, cached : bool = True):
+    """Fit a regressor on the training split (random forests come from the forest cache unless "cached" is False)
+
+    Args:
+        regressor (RegressorType): Regression algorithm
+        handle (datasets.DatasetHandle): Prepared dataset
+        degree (int, optional): Polynomial degree. Defaults to 2.
+        estimators (int, optional): Number of trees of the random forest. Defaults to 10.
+        components (int, optional): Nystroem components of the approximate support vector regression (0 = exact). Defaults to 0.
+        cached (bool, optional): Take random forests from the forest cache (False = plain fit, e.g. to time it). Defaults to True.
+
+    Returns:
+        RegressorMixin: Fitted model, picklable (N x 1 inputs => N or N x 1 values)
+    """
+    
+    X_train, y_train = handle.X_train, handle.y_train
+    
+    match regressor:
+        
+        case RegressorType.Linear:
+            
+            model = LinearRegression()
+        
+        case RegressorType.Polynomial:
+            
+            model = make_pipeline(PolynomialFeatures(degree=degree), LinearRegression())
+        
+        case RegressorType.SupportVector:
+            
+            if components:
+                
+                # ? Same RBF kernel ("scale" gamma = 1 on the standardized single input), C and epsilon as SVR, approximated by Nystroem features: linear in the number of rows
+                
+                nystroem = Nystroem(kernel='rbf', gamma=1.0, n_components=min(components, X_train.shape[0]), random_state=42)
+                
+                svr = make_pipeline(StandardScaler(), nystroem, LinearSVR(C=1.0, epsilon=0.1, max_iter=10000, random_state=42))
+            
+            else:
+                
+                svr = make_pipeline(StandardScaler(), SVR(kernel='rbf'))
+            
+            model = TransformedTargetRegressor(regressor=svr, transformer=StandardScaler()) # ? Scalers of X and y kept with the model
+        
+        case RegressorType.DecisionTree:
+            
+            model = DecisionTreeRegressor(random_state=42)
+        
+        case RegressorType.RandomForest:
+            
+            if cached: return forests.cache.fit((*handle.key, 'random-forest'), handle.version, lambda: RandomForestRegressor(random_state=42), X_train, y_train.ravel(), estimators)
+            
+            model = RandomForestRegressor(n_estimators=estimators, random_state=42)
+            
+            y_train = y_train.ravel()
+    
+    model.fit(X_train, y_train)
+    
+    return model
+
+def fitted_regressor(regressor : RegressorType, handle : datasets.DatasetHandle, degree : int = 2, estimators : int = 10, components : int = 0):
+    """Regressor fitted on the training split, kept by the model registry until the dataset changes
+
+    Linear and polynomial regressions are the online fits of every row instead (see online_fit), kept current by
+    recursive least squares updates.
+
+    Args:
+        regressor (RegressorType): Regression algorithm
+        handle (datasets.DatasetHandle): Prepared dataset
+        degree (int, optional): Polynomial degree. Defaults to 2.
+        estimators (int, optional): Number of trees of the random forest. Defaults to 10.
+        components (int, optional): Nystroem components of the approximate support vector regression (0 = exact). Defaults to 0.
+
+    Returns:
+        RegressorMixin: Fitted model (shared, never refit it)
+    """
+    
+    match regressor:
+        
+        case RegressorType.Linear:          return online_fit(handle.key[1], 1)[0]
+        case RegressorType.Polynomial:      return online_fit(handle.key[1], degree)[0]
+        case RegressorType.SupportVector:   params : dict = { 'components': components }
+        case RegressorType.RandomForest:    params : dict = { 'estimators': estimators }
+        case _:                             params : dict = {}
+    
+    key : tuple = (*handle.key, str(regressor), *sorted(params.items()))
+    
+    return models.registry.get(key, handle.version, lambda: fit_regressor(regressor, handle, **params))
+
+def polynomial_sweep(X_train : np.ndarray, y_train : np.ndarray, max_degree : int) -> tuple:
+    """Least squares polynomial fits of every degree up to "max_degree" from a single QR factorization
+
+    The Vandermonde matrix is factorized one column at a time (Gram-Schmidt with reorthogonalization): the fit of
+    degree d only needs the first d + 1 columns of Q and R, so each extra degree costs one column update and one
+    triangular solve. Inputs are mapped to [-1, 1] first, same polynomials as the raw YYYYMM values but well conditioned.
+
+    Args:
+        X_train (np.ndarray): Training inputs (N x 1)
+        y_train (np.ndarray): Training values (N x 1)
+        max_degree (int): Highest degree
+
+    Returns:
+        tuple: (scale, coefficients) with scale(X) => inputs in [-1, 1] and coefficients { degree: increasing powers }
+    """
+    
+    low     : float = float(X_train.min())
+    high    : float = float(X_train.max())
+    
+    scale : Callable = lambda X: (2.0 * np.ravel(X).astype('float64') - low - high) / max(high - low, 1e-12)
+    
+    t : np.ndarray = scale(X_train)
+    y : np.ndarray = np.ravel(y_train).astype('float64')
+    
+    Q   : np.ndarray = np.zeros((t.shape[0], max_degree + 1))
+    R   : np.ndarray = np.zeros((max_degree + 1, max_degree + 1))
+    qy  : np.ndarray = np.zeros(max_degree + 1)
+    
+    coefficients : dict = dict()
+    
+    power : np.ndarray = np.ones_like(t)
+    
+    for k in range(max_degree + 1):
+        
+        # >>> Orthogonalize the new column t^k against the previous ones
+        
+        v : np.ndarray = power.copy()
+        
+        for _ in range(2):
+            
+            projection : np.ndarray = Q[:, :k].T @ v
+            
+            v -= Q[:, :k] @ projection
+            
+            R[:k, k] += projection
+        
+        R[k, k] = np.linalg.norm(v)
+        
+        if R[k, k] <= 1e-10 * np.linalg.norm(power): break # ? Not enough distinct points for higher degrees
+        
+        Q[:, k] = v / R[k, k]
+        
+        qy[k] = Q[:, k] @ y
+        
+        # >>> Fit of degree k: R[:k+1, :k+1] c = Q[:, :k+1]^T y
+        
+        coefficients[k] = solve_triangular(R[: k + 1, : k + 1], qy[: k + 1])
+        
+        power = power * t
+    
+    return scale, coefficients
+
+def score_regressor(regressor : RegressorType, handle : datasets.DatasetHandle, layout : Layout, degree : int = 2, estimators : int = 10) -> dict:
+    """Fit a regressor and measure it on the test split
+
+    The fit never comes from the model registry or the forest cache, so "fit_ms" is the time of a full fit.
+
+    Args:
+        regressor (RegressorType): Regression algorithm
+        handle (datasets.DatasetHandle): Prepared dataset
+        layout (Layout): Layout of the curve points
+        degree (int, optional): Polynomial degree. Defaults to 2.
+        estimators (int, optional): Number of trees of the random forest. Defaults to 10.
+
+    Returns:
+        dict: { name, r2, mae, rmse, fit_ms, predict_ms, points }
+    """
+    
+    # * Training
+    
+    start : float = time.perf_counter()
+    
+    with telemetry.span(Stage.Fit): model = fit_regressor(regressor, handle, degree=degree, estimators=estimators, cached=False)
+    
+    fit_time : float = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    
+    with telemetry.span(Stage.Predict):
+        
+        prediction : np.ndarray = np.ravel(model.predict(handle.X_test))
+        
+        values : np.ndarray = np.ravel(model.predict(handle.X))
+    
+    predict_time : float = time.perf_counter() - start
+    
+    # * Scores
+    
+    y_test : np.ndarray = handle.y_test.ravel()
+    
+    return\
+    {
+        'name': str(regressor),
+        'r2': float(r2_score(y_test, prediction)),
+        'mae': float(mean_absolute_error(y_test, prediction)),
+        'rmse': float(np.sqrt(mean_squared_error(y_test, prediction))),
+        'fit_ms': fit_time * 1000.0,
+        'predict_ms': predict_time * 1000.0,
+        'points': responses.table(layout, x=handle.dates, y=values)
+    }
+
 # --- Router 
 
 @router.get(path="/info", response_model=InfoData)
@@ -140,146 +564,242 @@ def info():
     
     return response
 
-@router.get(path="/dataset", response_model=List[PointData])
-def dataset(column : Annotated[int | None, Query(alias='column', title='Description column >= 1')] = 1):
+@router.get(path="/dataset", response_model=List[PointData] | PointColumns, response_class=responses.FastJSONResponse, responses=responses.ndjson(PointData))
+def dataset(column : Annotated[int | None, Query(alias='column', title='Description column >= 1')] = 1,
+            layout : Annotated[Layout, Query(alias='layout', title='Response layout [rows, columns]')] = Layout.Rows,
+            stream : Annotated[bool, Query(alias='stream', title='NDJSON stream of rows')] = False):
     
     # * Retrieve data from MongoDB dataset
     
-    prepare_dataset(column=column)
+    handle : datasets.DatasetHandle = dataset_handle(column=column)
     
     # * JSON
     
-    response : list = list()
+    if stream: return responses.stream(x=handle.dates, y=handle.y)
     
-    for x_value, y_value in zip(X, y):
-        
-        response.append({ "x": convert_YYYYMM(x_value[0]), "y": float(y_value[0]) })
-    
-    return response
+    return responses.FastJSONResponse(responses.table(layout, x=handle.dates, y=handle.y))
 
-@router.get(path="/linear-regression", response_model=List[PointData])
-def linear_regression():
+@router.get(path="/linear-regression", response_model=List[PointData] | PointColumns, response_class=responses.FastJSONResponse)
+@memo.memoize(lambda column, **_: dataset_version(column))
+def linear_regression(column : Annotated[int | None, Query(alias='column', title='Description column >= 1')] = 1,
+                      layout : Annotated[Layout, Query(alias='layout', title='Response layout [rows, columns]')] = Layout.Rows):
     
-    # * Training
+    # * Training (online fit, only the rows appended since the last version)
     
-    model = LinearRegression()
-
-    model.fit(X_train, y_train)
+    with telemetry.span(Stage.Fit): model, X = online_fit(column, 1)
+    
+    with telemetry.span(Stage.Predict): values : np.ndarray = model.predict(X)
 
-    r2 = r2_score(y_test, model.predict(X_test))
+    # * JSON
+    
+    return responses.FastJSONResponse(responses.table(layout, x=[ convert_YYYYMM(value) for value in X ], y=values))
 
-    values = model.predict(X)
+@router.get(path="/polynomial-regression", response_model=List[PointData] | PointColumns, response_class=responses.FastJSONResponse)
+@memo.memoize(lambda column, **_: dataset_version(column))
+def polynomial_regression(column : Annotated[int | None, Query(alias='column', title='Description column >= 1')] = 1,
+                          degree : Annotated[int, Query(alias='degree', title='Polynomial degree [2, 15]', ge=2, le=15)] = 2,
+                          layout : Annotated[Layout, Query(alias='layout', title='Response layout [rows, columns]')] = Layout.Rows):
     
-    # * JSON
+    # * Training (online fit, only the rows appended since the last version)
     
-    response : list = list()
+    with telemetry.span(Stage.Fit): model, X = online_fit(column, degree)
     
-    for x_value, y_value in zip(X, values):
-        
-        response.append({ "x": convert_YYYYMM(x_value[0]), "y": float(y_value[0]) })
+    with telemetry.span(Stage.Predict): values : np.ndarray = model.predict(X)
+
+    # * JSON
     
-    return response
+    return responses.FastJSONResponse(responses.table(layout, x=[ convert_YYYYMM(value) for value in X ], y=values))
 
-@router.get(path="/polynomial-regression", response_model=List[PointData])
-def polynomial_regression(degree : Annotated[int | None, Query(alias='degree', title='Polynomial degree >= 2')] = 2):
+@router.get(path="/support-vector-regression", response_model=List[PointData] | PointColumns, response_class=responses.FastJSONResponse)
+@memo.memoize(lambda column, **_: dataset_version(column))
+def support_vector_regression(column : Annotated[int | None, Query(alias='column', title='Description column >= 1')] = 1,
+                              approximate : Annotated[bool, Query(alias='approximate', title='Nystroem kernel approximation for long series')] = False,
+                              components : Annotated[int, Query(alias='components', title='Nystroem components [10, 2000]', ge=10, le=2000)] = 100,
+                              layout : Annotated[Layout, Query(alias='layout', title='Response layout [rows, columns]')] = Layout.Rows):
+    
+    handle : datasets.DatasetHandle = dataset_handle(column=column)
     
     # * Training
     
-    features = PolynomialFeatures(degree=degree)
-
-    X_transformed = features.fit_transform(X_train)
-
-    model = LinearRegression()
-
-    model.fit(X_transformed, y_train)
-
-    r2 = r2_score(y_test, model.predict(features.fit_transform(X_test)))
+    with telemetry.span(Stage.Fit): model = fitted_regressor(RegressorType.SupportVector, handle, components=components if approximate else 0)
     
-    values = model.predict(features.fit_transform(X))
+    with telemetry.span(Stage.Predict): values : np.ndarray = np.ravel(model.predict(handle.X))
 
     # * JSON
     
-    response : list = list()
-    
-    for x_value, y_value in zip(X, values):
-        
-        response.append({ "x": convert_YYYYMM(x_value[0]), "y": float(y_value[0]) })
-    
-    return response
+    return responses.FastJSONResponse(responses.table(layout, x=handle.dates, y=values))
 
-@router.get(path="/support-vector-regression", response_model=List[PointData])
-def support_vector_regression():
+@router.get(path="/decision-tree-regression", response_model=List[PointData] | PointColumns, response_class=responses.FastJSONResponse)
+@memo.memoize(lambda column, **_: dataset_version(column))
+def decision_tree_regression(column : Annotated[int | None, Query(alias='column', title='Description column >= 1')] = 1,
+                             layout : Annotated[Layout, Query(alias='layout', title='Response layout [rows, columns]')] = Layout.Rows):
+    
+    handle : datasets.DatasetHandle = dataset_handle(column=column)
     
     # * Training
     
-    standard_scaler_X = StandardScaler()
-    standard_scaler_y = StandardScaler()
-
-    X_scaled = standard_scaler_X.fit_transform(X_train)
-    y_scaled = standard_scaler_y.fit_transform(y_train)
-
-    model = SVR(kernel='rbf')
-
-    model.fit(X_scaled, y_scaled.ravel())
-
-    r2 = r2_score(y_test, standard_scaler_y.inverse_transform(model.predict(standard_scaler_X.transform(X_test).reshape(-1, 1)).reshape(-1, 1)))
+    with telemetry.span(Stage.Fit): model = fitted_regressor(RegressorType.DecisionTree, handle)
     
-    values = standard_scaler_y.inverse_transform(model.predict(standard_scaler_X.transform(X).reshape(-1, 1)).reshape(-1, 1))
+    with telemetry.span(Stage.Predict): values : np.ndarray = np.ravel(model.predict(handle.X))
 
     # * JSON
     
-    response : list = list()
+    return responses.FastJSONResponse(responses.table(layout, x=handle.dates, y=values))
+
+@router.get(path="/random-forest-regression", response_model=List[PointData] | PointColumns, response_class=responses.FastJSONResponse)
+@memo.memoize(lambda column, **_: dataset_version(column))
+def random_forest_regression(column : Annotated[int | None, Query(alias='column', title='Description column >= 1')] = 1,
+                             estimators : Annotated[int | None, Query(alias='estimators', title='Number of trees >= 1')] = 10,
+                             layout : Annotated[Layout, Query(alias='layout', title='Response layout [rows, columns]')] = Layout.Rows):
     
-    for x_value, y_value in zip(X, values):
-        
-        response.append({ "x": convert_YYYYMM(x_value[0]), "y": float(y_value[0]) })
+    if estimators == 0: return list()
     
-    return response
-
-@router.get(path="/decision-tree-regression", response_model=List[PointData])
-def decision_tree_regression():
+    handle : datasets.DatasetHandle = dataset_handle(column=column)
     
     # * Training
     
-    model = DecisionTreeRegressor(random_state=42)
-
-    model.fit(X_train, y_train)
+    with telemetry.span(Stage.Fit): model = fitted_regressor(RegressorType.RandomForest, handle, estimators=estimators)
+    
+    with telemetry.span(Stage.Predict): values : np.ndarray = np.ravel(model.predict(handle.X))
 
-    r2 = r2_score(y_test, model.predict(X_test))
+    # * JSON
     
-    values = model.predict(X)
+    return responses.FastJSONResponse(responses.table(layout, x=handle.dates, y=values))
 
+@router.get(path="/leaderboard", response_model=List[ScoreData], response_class=responses.FastJSONResponse) # ? Not memoized: the timings are measured by every request
+def leaderboard(column : Annotated[int | None, Query(alias='column', title='Description column >= 1')] = 1,
+                degree : Annotated[int, Query(alias='degree', title='Polynomial degree >= 1', ge=1)] = 2,
+                estimators : Annotated[int, Query(alias='estimators', title='Number of trees >= 1', ge=1)] = 10,
+                layout : Annotated[Layout, Query(alias='layout', title='Response layout [rows, columns]')] = Layout.Rows):
+    
+    handle : datasets.DatasetHandle = dataset_handle(column=column)
+    
+    # * Training (same split for every regressor, fitted in parallel)
+    
+    futures : list = [ executor.submit(contextvars.copy_context().run, score_regressor, regressor, handle, layout, degree=degree, estimators=estimators) for regressor in RegressorType ]
+    
+    scores : list = [ future.result() for future in futures ]
+    
     # * JSON
     
-    response : list = list()
+    return responses.FastJSONResponse(sorted(scores, key=lambda score: score['r2'], reverse=True))
+
+@router.get(path="/polynomial-regression/sweep", response_model=List[DegreeData], response_class=responses.FastJSONResponse)
+@memo.memoize(lambda column, **_: dataset_version(column))
+def polynomial_regression_sweep(column : Annotated[int | None, Query(alias='column', title='Description column >= 1')] = 1,
+                                max_degree : Annotated[int, Query(alias='max_degree', title='Highest polynomial degree [2, 15]', ge=2, le=15)] = 10,
+                                layout : Annotated[Layout, Query(alias='layout', title='Response layout [rows, columns]')] = Layout.Rows):
     
-    for x_value, y_value in zip(X, values):
+    handle : datasets.DatasetHandle = dataset_handle(column=column)
+    
+    # * Training (degrees 2..max_degree from one incremental QR)
+    
+    with telemetry.span(Stage.Fit): scale, coefficients = polynomial_sweep(handle.X_train, handle.y_train, max_degree)
+    
+    with telemetry.span(Stage.Predict):
+        
+        V_test  : np.ndarray = np.vander(scale(handle.X_test), max_degree + 1, increasing=True)
+        V       : np.ndarray = np.vander(scale(handle.X), max_degree + 1, increasing=True)
         
-        response.append({ "x": convert_YYYYMM(x_value[0]), "y": float(y_value) })
+        y_test : np.ndarray = handle.y_test.ravel()
+        
+        sweep : list = list()
+        
+        for degree in range(2, max_degree + 1):
+            
+            if degree not in coefficients: break
+            
+            prediction  : np.ndarray = V_test[:, : degree + 1] @ coefficients[degree]
+            values      : np.ndarray = V[:, : degree + 1] @ coefficients[degree]
+            
+            sweep.append(
+                {
+                    'degree': degree,
+                    'r2': float(r2_score(y_test, prediction)),
+                    'mae': float(mean_absolute_error(y_test, prediction)),
+                    'rmse': float(np.sqrt(mean_squared_error(y_test, prediction))),
+                    'points': responses.table(layout, x=handle.dates, y=values)
+                })
     
-    return response
+    # * JSON
+    
+    return responses.FastJSONResponse(sweep)
 
-@router.get(path="/random-forest-regression", response_model=List[PointData])
-def random_forest_regression(estimators : Annotated[int | None, Query(alias='estimators', title='Number of trees >= 1')] = 10):
+@router.get(path="/overview", response_model=List[SeriesData], response_class=responses.FastJSONResponse)
+@memo.memoize(lambda **_: overview_version())
+def overview(degree : Annotated[int, Query(alias='degree', title='Polynomial degree [2, 15]', ge=2, le=15)] = 2,
+             layout : Annotated[Layout, Query(alias='layout', title='Response layout [rows, columns]')] = Layout.Rows):
     
-    if estimators == 0: return list()
+    handle : datasets.DatasetHandle = overview_handle()
     
-    # * Training
+    results : list = list()
     
-    model = RandomForestRegressor(n_estimators=estimators, random_state=42)
-
-    model.fit(X_train, y_train.ravel())
-
-    r2 = r2_score(y_test, model.predict(X_test))
+    for group in handle.groups:
+        
+        # * Training (every series of the group in one solve per model)
+        
+        with telemetry.span(Stage.Fit): fits : dict = { 'linear': fit_series(group, 1), 'polynomial': fit_series(group, degree) }
+        
+        # * Scores
+        
+        Y_test : np.ndarray = group['Y'][group['test']]
+        
+        scores : dict = {}
+        
+        for name, values in fits.items():
+            
+            prediction : np.ndarray = values[group['test']]
+            
+            scores[name] = (r2_score(Y_test, prediction, multioutput='raw_values'),
+                            mean_absolute_error(Y_test, prediction, multioutput='raw_values'),
+                            np.sqrt(mean_squared_error(Y_test, prediction, multioutput='raw_values')))
+        
+        for index, column in enumerate(group['columns']):
+            
+            results.append(
+                {
+                    'column': column,
+                    'description': handle.descriptions[column],
+                    **{
+                        name: {
+                            'r2': float(scores[name][0][index]),
+                            'mae': float(scores[name][1][index]),
+                            'rmse': float(scores[name][2][index]),
+                            'points': responses.table(layout, x=group['dates'], y=values[:, index])
+                        } for name, values in fits.items()
+                    }
+                })
     
-    values = model.predict(X)
-
     # * JSON
     
-    response : list = list()
+    return responses.FastJSONResponse(sorted(results, key=lambda series: series['column']))
+
+@router.get(path="/forecast", response_model=List[PointData] | PointColumns, response_class=responses.FastJSONResponse)
+def forecast(years : Annotated[List[int], Query(alias='years', title='Years to forecast (YYYY)')],
+             column : Annotated[int | None, Query(alias='column', title='Description column >= 1')] = 1,
+             regressor : Annotated[RegressorType, Query(alias='regressor', title='Regression algorithm')] = RegressorType.Linear,
+             degree : Annotated[int, Query(alias='degree', title='Polynomial degree [1, 15]', ge=1, le=15)] = 2,
+             estimators : Annotated[int, Query(alias='estimators', title='Number of trees >= 1', ge=1)] = 10,
+             approximate : Annotated[bool, Query(alias='approximate', title='Nystroem kernel approximation for long series')] = False,
+             components : Annotated[int, Query(alias='components', title='Nystroem components [10, 2000]', ge=10, le=2000)] = 100,
+             layout : Annotated[Layout, Query(alias='layout', title='Response layout [rows, columns]')] = Layout.Rows):
+    
+    if any(year < 1 or year > 9999 for year in years): raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail='Years must be in [1, 9999]')
+    
+    # * Model of the regression endpoints (linear and polynomial: online fit, others registry: memory, then disk, then fitted once)
     
-    for x_value, y_value in zip(X, values):
+    with telemetry.span(Stage.Fit):
         
-        response.append({ "x": convert_YYYYMM(x_value[0]), "y": float(y_value) })
+        match regressor:
+            
+            case RegressorType.Linear:      model, _ = online_fit(column, 1)
+            case RegressorType.Polynomial:  model, _ = online_fit(column, degree)
+            case _:                         model = fitted_regressor(regressor, dataset_handle(column=column), estimators=estimators, components=components if approximate else 0)
+    
+    X : np.ndarray = (np.asarray(years, dtype='int64') * 100 + 13).reshape(-1, 1) # ? Annual rows are "YYYY13"
+    
+    with telemetry.span(Stage.Predict): values : np.ndarray = np.ravel(model.predict(X))
+    
+    # * JSON
     
-    return response
\ No newline at end of file
+    return responses.FastJSONResponse(responses.table(layout, x=[ convert_YYYYMM(value) for value in X[:, 0] ], y=values))
@@ -1,9 +1,10 @@
 import numpy as np
 import pandas as pd
-import pymongo
 import random
 
-from common import utility
+from common import datasets, snapshot, telemetry, utility
+from common.database import CollectionName
+from common.telemetry import Stage
 
 from collections import Counter
 from fastapi import APIRouter
@@ -12,13 +13,7 @@ from typing import List
 
 # --- Params 
 
-number_rounds : int = 0
-
-number_retailers : int = 0
-
-data_frame : pd.DataFrame = None
-
-router : APIRouter = APIRouter(prefix='/machine-learning/reinforcement-learning', tags=['Machine Learning - Reinforcement Learning'])
+router : APIRouter = APIRouter(prefix='/machine-learning/reinforcement-learning', tags=['Machine Learning - Reinforcement Learning'], route_class=telemetry.TimedRoute)
 
 class Retailers(BaseModel):
     
@@ -37,32 +32,19 @@ class Result(Retailers):
 
 # --- Utility 
 
-def prepare_dataset() -> list:
+def prepare_dataset(version : str | None = None) -> dict:
     """Connect to MongoDB database "LearningAI" and extract the documents from the collection "retailers"
     
+    Args:
+        version (str | None, optional): Collection fingerprint. Defaults to None.
+    
     Returns:
-        list: [data]
+        dict: { data, number_rounds, number_retailers, rewards }
     """
     
-    global number_rounds
-    global number_retailers
-    global data_frame
-    
-    # * Read from MongoDB
-    
-    mongo_client : pymongo.MongoClient = pymongo.MongoClient(host='mongodb://localhost:27017/')
-
-    database : pymongo.database.Database = mongo_client.get_database('LearningAI')
-
-    retailers_collection : pymongo.collection.Collection = database.get_collection('retailers')
-
-    cursor = retailers_collection.find()
+    # * Read from MongoDB (local snapshot)
     
-    original_data : list = list(cursor)
-    
-    df : pd.DataFrame = pd.DataFrame(original_data)
-    
-    df = df.drop(columns=['_id'], axis=1)
+    df : pd.DataFrame = snapshot.load_dataframe(CollectionName.Retailers, version=version)
     
     df = (df > 5).astype(int) # ? 1 = Good, 0 = Bad
     
@@ -72,19 +54,22 @@ def prepare_dataset() -> list:
     
     # * Prepare dataset
     
-    number_rounds = df.shape[0]
-    
-    number_retailers = df.shape[1]
-    
-    data_frame = df
+    number_rounds : int = df.shape[0]
     
-    # * Close
+    number_retailers : int = df.shape[1]
     
-    cursor.close()
+    return dict(data=data, number_rounds=number_rounds, number_retailers=number_retailers, rewards=df.values)
+
+def dataset_handle() -> datasets.DatasetHandle:
+    """Prepared dataset, shared by all requests until the collection changes
+
+    Returns:
+        datasets.DatasetHandle: Dataset handle
+    """
     
-    mongo_client.close()
+    version : str = snapshot.fingerprint(CollectionName.Retailers)
     
-    return data
+    return datasets.cache.get(('reinforcement-learning',), version, lambda: prepare_dataset(version))
 
 # --- Router 
 
@@ -93,7 +78,7 @@ def dataset():
     
     # * Retrieve data from MongoDB dataset
     
-    data = prepare_dataset()
+    data : list = dataset_handle().data
     
     # * JSON
     
@@ -102,52 +87,59 @@ def dataset():
 @router.get(path="/upper-confidence-bound", response_model=Result)
 def upper_confidence_bound():
     
-    # * Training
+    handle : datasets.DatasetHandle = dataset_handle()
     
-    retailer_selected           : list = list()
-    number_retailer_selected    : list = [0] * number_retailers # ? N_i(n) = # times the retailer i-th was selected up to round n
-    sum_of_rewards              : list = [0] * number_retailers # ? R_i(n) = sum of rewards of retailer i-th up to round n
-
-    total_reward : int = 0
+    number_rounds       : int = handle.number_rounds
+    number_retailers    : int = handle.number_retailers
     
-    # >>> Cycle on rounds
-
-    for n in range(0, number_rounds):
-        
-        retailer    : int = 0
-        max_ucb     : float = 0.0
-        ucb         : float = 0.0 # ? Upper Confidence Bound
+    # * Training
+    
+    with telemetry.span(Stage.Fit):
         
-        # >>> Cycle on retailers to find the one with highest UCB
+        retailer_selected           : list = list()
+        number_retailer_selected    : list = [0] * number_retailers # ? N_i(n) = # times the retailer i-th was selected up to round n
+        sum_of_rewards              : list = [0] * number_retailers # ? R_i(n) = sum of rewards of retailer i-th up to round n
+
+        total_reward : int = 0
         
-        for i in range(0, number_retailers):
+        # >>> Cycle on rounds
+
+        for n in range(0, number_rounds):
             
-            if number_retailer_selected[i] > 0:
+            retailer    : int = 0
+            max_ucb     : float = 0.0
+            ucb         : float = 0.0 # ? Upper Confidence Bound
             
-                average_reward  = sum_of_rewards[i] / number_retailer_selected[i] # ? r_i(n) = R_i(n) / N_i(n)
-                delta           = np.sqrt(3 / 2 * np.log(n + 1) / number_retailer_selected[i])
-                ucb             = average_reward + delta
+            # >>> Cycle on retailers to find the one with highest UCB
             
-            else:
+            for i in range(0, number_retailers):
                 
-                ucb = 1e400
-            
-            if ucb > max_ucb:
+                if number_retailer_selected[i] > 0:
                 
-                max_ucb     = ucb
-                retailer    = i
-        
-        # >>> Update data (at first round will select "Retailer01")
-        
-        retailer_selected.append(retailer)
-        
-        number_retailer_selected[retailer] += 1
-        
-        reward : int = int(data_frame.values[n, retailer])
-        
-        sum_of_rewards[retailer] += reward
-        
-        total_reward += reward
+                    average_reward  = sum_of_rewards[i] / number_retailer_selected[i] # ? r_i(n) = R_i(n) / N_i(n)
+                    delta           = np.sqrt(3 / 2 * np.log(n + 1) / number_retailer_selected[i])
+                    ucb             = average_reward + delta
+                
+                else:
+                    
+                    ucb = 1e400
+                
+                if ucb > max_ucb:
+                    
+                    max_ucb     = ucb
+                    retailer    = i
+            
+            # >>> Update data (at first round will select "Retailer01")
+            
+            retailer_selected.append(retailer)
+            
+            number_retailer_selected[retailer] += 1
+            
+            reward : int = int(handle.rewards[n, retailer])
+            
+            sum_of_rewards[retailer] += reward
+            
+            total_reward += reward
     
     # * JSON
     
@@ -170,50 +162,57 @@ def upper_confidence_bound():
 @router.get(path="/thompson-sampling", response_model=Result)
 def thompson_sampling():
     
-    # * Training
+    handle : datasets.DatasetHandle = dataset_handle()
     
-    retailer_selected   : list = list()
-    number_of_rewards_1 : list = [0] * number_retailers # ? N_i^1(n) = # times the retailer i-th got reward 1 up to round n
-    number_of_rewards_0 : list = [0] * number_retailers # ? N_i^0(n) = # times the retailer i-th got reward 0 up to round n
-    sum_of_rewards      : list = [0] * number_retailers
-
-    total_reward : int = 0
+    number_rounds       : int = handle.number_rounds
+    number_retailers    : int = handle.number_retailers
     
-    # >>> Cycle on rounds
-
-    for n in range(0, number_rounds):
-        
-        retailer    : int = 0
-        max_theta   : float = 0.0
+    # * Training
+    
+    with telemetry.span(Stage.Fit):
         
-        # >>> Cycle on retailers to find the one with highest UCB
+        retailer_selected   : list = list()
+        number_of_rewards_1 : list = [0] * number_retailers # ? N_i^1(n) = # times the retailer i-th got reward 1 up to round n
+        number_of_rewards_0 : list = [0] * number_retailers # ? N_i^0(n) = # times the retailer i-th got reward 0 up to round n
+        sum_of_rewards      : list = [0] * number_retailers
+
+        total_reward : int = 0
         
-        for i in range(0, number_retailers):
+        # >>> Cycle on rounds
+
+        for n in range(0, number_rounds):
+            
+            retailer    : int = 0
+            max_theta   : float = 0.0
             
-            theta = random.betavariate(number_of_rewards_1[i] + 1, number_of_rewards_0[i] + 1)
+            # >>> Cycle on retailers to find the one with highest UCB
             
-            if theta > max_theta:
+            for i in range(0, number_retailers):
                 
-                max_theta   = theta
-                retailer    = i
-        
-        # >>> Update data (at first round will select "Retailer01")
-        
-        retailer_selected.append(retailer)
-        
-        reward : int = int(data_frame.values[n, retailer])
-        
-        if reward == 1:
+                theta = random.betavariate(number_of_rewards_1[i] + 1, number_of_rewards_0[i] + 1)
+                
+                if theta > max_theta:
+                    
+                    max_theta   = theta
+                    retailer    = i
             
-            number_of_rewards_1[retailer] += 1
+            # >>> Update data (at first round will select "Retailer01")
             
-        else:
+            retailer_selected.append(retailer)
             
-            number_of_rewards_0[retailer] += 1
-        
-        sum_of_rewards[retailer] += reward
-        
-        total_reward += reward
+            reward : int = int(handle.rewards[n, retailer])
+            
+            if reward == 1:
+                
+                number_of_rewards_1[retailer] += 1
+                
+            else:
+                
+                number_of_rewards_0[retailer] += 1
+            
+            sum_of_rewards[retailer] += reward
+            
+            total_reward += reward
     
     # * JSON
     
@@ -0,0 +1,16 @@
+from common import telemetry
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+# --- Params 
+
+router : APIRouter = APIRouter(tags=['Telemetry']) # ? Not a TimedRoute: scraping must not show up in the metrics
+
+# --- Router 
+
+@router.get(path='/metrics', response_class=PlainTextResponse)
+def metrics():
+    """Request, stage and event metrics in Prometheus text format"""
+    
+    return PlainTextResponse(content=telemetry.render(), media_type='text/plain; version=0.0.4; charset=utf-8')
@@ -67,7 +67,8 @@ export default function PageClassification() : any
         [
             { id: 1, value: "PrincipalComponentAnalysis"},
             { id: 2, value: "LinearDiscriminantAnalysis"},
-            { id: 3, value: "KernelPrincipalComponentAnalysis"}
+            { id: 3, value: "KernelPrincipalComponentAnalysis"},
+            { id: 4, value: "ApproximateKernelPCA"}
         ]);
 
     const [kernels, setKernels] = useState<DictInfo[]>(
@@ -247,7 +248,7 @@ export default function PageClassification() : any
 
         // * Logistic Regression
 
-        let response : any = await axios.get('http://localhost:8000/machine-learning/classification/logistic-regression', config).catch( (error : any) => { return; });
+        let response : any = await axios.get('http://localhost:8000/machine-learning/classification/logistic-regression?method=' + String(method), config).catch( (error : any) => { return; });
 
         if (response == undefined) return;
         
@@ -262,7 +263,7 @@ export default function PageClassification() : any
 
         // * K-Nearest Neighbors
 
-        response = await axios.get('http://localhost:8000/machine-learning/classification/k-nearest-neighbors?neighbors=' + String(neighbors), config).catch( (error : any) => { return; });
+        response = await axios.get('http://localhost:8000/machine-learning/classification/k-nearest-neighbors?method=' + String(method) + '&neighbors=' + String(neighbors), config).catch( (error : any) => { return; });
 
         if (response == undefined) return;
         
@@ -277,7 +278,7 @@ export default function PageClassification() : any
 
         // * Support Vector Classification
 
-        response = await axios.get('http://localhost:8000/machine-learning/classification/support-vector-classification?kernel=' + String(kernel), config).catch( (error : any) => { return; });
+        response = await axios.get('http://localhost:8000/machine-learning/classification/support-vector-classification?method=' + String(method) + '&kernel=' + String(kernel), config).catch( (error : any) => { return; });
 
         if (response == undefined) return;
         
@@ -292,7 +293,7 @@ export default function PageClassification() : any
 
         // * Naive Bayes
 
-        response = await axios.get('http://localhost:8000/machine-learning/classification/naive-bayes', config).catch( (error : any) => { return; });
+        response = await axios.get('http://localhost:8000/machine-learning/classification/naive-bayes?method=' + String(method), config).catch( (error : any) => { return; });
 
         if (response == undefined) return;
         
@@ -307,7 +308,7 @@ export default function PageClassification() : any
 
         // * Decision Tree for Classification
 
-        response = await axios.get('http://localhost:8000/machine-learning/classification/decision-tree-classification', config).catch( (error : any) => { return; });
+        response = await axios.get('http://localhost:8000/machine-learning/classification/decision-tree-classification?method=' + String(method), config).catch( (error : any) => { return; });
 
         if (response == undefined) return;
         
@@ -322,7 +323,7 @@ export default function PageClassification() : any
 
         // * Random Forest for Classification
 
-        response = await axios.get('http://localhost:8000/machine-learning/classification/random-forest-classification?estimators=' + String(estimators), config).catch( (error : any) => { return; });
+        response = await axios.get('http://localhost:8000/machine-learning/classification/random-forest-classification?method=' + String(method) + '&estimators=' + String(estimators), config).catch( (error : any) => { return; });
 
         if (response == undefined) return;
         
@@ -81,7 +81,7 @@ export default function  PageRegression({ points } :  PageRegressionProps) : any
 
         // * Linear Regression
 
-        response = await axios.get('http://localhost:8000/machine-learning/regression/linear-regression', config).catch( (error : any) => { return; });
+        response = await axios.get('http://localhost:8000/machine-learning/regression/linear-regression?column=' + String(column), config).catch( (error : any) => { return; });
 
         if (response == undefined) return;
 
@@ -91,7 +91,7 @@ export default function  PageRegression({ points } :  PageRegressionProps) : any
         
         // * Polynomial Regression
 
-        response = await axios.get('http://localhost:8000/machine-learning/regression/polynomial-regression?degree=' + String(degree), config).catch( (error : any) => { return false; }).finally( () => { return true; } );
+        response = await axios.get('http://localhost:8000/machine-learning/regression/polynomial-regression?column=' + String(column) + '&degree=' + String(degree), config).catch( (error : any) => { return false; }).finally( () => { return true; } );
 
         if (response == undefined) return;
 
@@ -101,7 +101,7 @@ export default function  PageRegression({ points } :  PageRegressionProps) : any
 
         // * Support Vector for Regression
 
-        response = await axios.get('http://localhost:8000/machine-learning/regression/support-vector-regression', config).catch( (error : any) => { return false; }).finally( () => { return true; } );
+        response = await axios.get('http://localhost:8000/machine-learning/regression/support-vector-regression?column=' + String(column), config).catch( (error : any) => { return false; }).finally( () => { return true; } );
 
         if (response == undefined) return;
 
@@ -111,7 +111,7 @@ export default function  PageRegression({ points } :  PageRegressionProps) : any
 
         // * Decision Tree for Regression
 
-        response = await axios.get('http://localhost:8000/machine-learning/regression/decision-tree-regression', config).catch( (error : any) => { return false; }).finally( () => { return true; } );
+        response = await axios.get('http://localhost:8000/machine-learning/regression/decision-tree-regression?column=' + String(column), config).catch( (error : any) => { return false; }).finally( () => { return true; } );
 
         if (response == undefined) return;
 
@@ -121,7 +121,7 @@ export default function  PageRegression({ points } :  PageRegressionProps) : any
 
         // * Random Forest for Regression
 
-        response = await axios.get('http://localhost:8000/machine-learning/regression/random-forest-regression?estimators=' + String(estimators), config).catch( (error : any) => { return false; }).finally( () => { return true; } );
+        response = await axios.get('http://localhost:8000/machine-learning/regression/random-forest-regression?column=' + String(column) + '&estimators=' + String(estimators), config).catch( (error : any) => { return false; }).finally( () => { return true; } );
 
         if (response == undefined) return;
 